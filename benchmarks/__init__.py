@@ -0,0 +1,5 @@
+"""
+Stand-alone benchmarks. Run from the repository root, e.g.:
+
+    python -m benchmarks.text_similarity
+"""
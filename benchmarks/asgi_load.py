@@ -0,0 +1,163 @@
+"""
+Load benchmark: exam retrieval through the WSGI path vs the async ASGI view.
+
+    python -m benchmarks.asgi_load --users 200 --requests 20 --threads 8
+
+Runs in-process against the configured database (a throwaway student and exam
+are created and removed again), with the same JWT auth on every request:
+
+- wsgi:  the DRF view through the WSGI handler on a pool of `--threads` threads
+         (one process worth of a threaded WSGI server)
+- asgi:  the DRF view and the async view (`/api/async/exams/<id>/`) through the
+         ASGI handler, `--users` concurrent clients on one event loop
+
+Each of the `--users` virtual students fetches the exam `--requests` times, as
+at the start of an exam. Reports throughput and latency percentiles.
+"""
+import argparse
+import asyncio
+import io
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.asgi import get_asgi_application  # noqa: E402
+from django.core.wsgi import get_wsgi_application  # noqa: E402
+from rest_framework_simplejwt.tokens import RefreshToken  # noqa: E402
+
+from core.models import Exam, ExamQuestion, Question, QuestionOption  # noqa: E402
+
+
+def make_fixture(num_questions):
+    user = User.objects.create_user(username=f'bench-{time.time_ns()}', password='bench-password')
+    exam = Exam.objects.create(title="Load benchmark", course="BENCH", duration_minutes=60)
+    for order in range(1, num_questions + 1):
+        question = Question.objects.create(text=f"Question {order}", question_type='MCQ')
+        QuestionOption.objects.bulk_create(
+            QuestionOption(question=question, text=f"Option {i}", is_correct=i == 0) for i in range(4)
+        )
+        ExamQuestion.objects.create(exam=exam, question=question, order=order)
+    return user, exam
+
+
+def drop_fixture(user, exam):
+    Question.objects.filter(exam_questions__exam=exam).delete()
+    exam.delete()
+    user.delete()
+
+
+def run_wsgi(path, token, users, requests, threads):
+    app = get_wsgi_application()
+
+    def call():
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_AUTHORIZATION': f'Bearer {token}',
+            'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO(), 'wsgi.url_scheme': 'http',
+            'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False, 'wsgi.version': (1, 0),
+        }
+        statuses = []
+        start = time.perf_counter()
+        body = app(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        b''.join(body)
+        body.close()
+        if not statuses[0].startswith('200'):
+            raise SystemExit(f"WSGI request failed: {statuses[0]}")
+        return time.perf_counter() - start
+
+    def student():
+        return [call() for _ in range(requests)]
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        start = time.perf_counter()
+        latencies = [latency for result in pool.map(lambda _: student(), range(users)) for latency in result]
+    return latencies, time.perf_counter() - start
+
+
+async def asgi_call(app, path, token):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'localhost'), (b'authorization', f'Bearer {token}'.encode())],
+        'server': ('localhost', 80), 'client': ('127.0.0.1', 50000),
+    }
+    sent = asyncio.Event()
+    messages = []
+
+    async def receive():
+        if not messages:
+            messages.append(None)
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await sent.wait()
+        return {'type': 'http.disconnect'}
+
+    status = []
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+        elif not message.get('more_body'):
+            sent.set()
+
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    if status[0] != 200:
+        raise SystemExit(f"ASGI request failed: {status[0]}")
+    return time.perf_counter() - start
+
+
+def run_asgi(path, token, users, requests):
+    app = get_asgi_application()
+
+    async def student():
+        return [await asgi_call(app, path, token) for _ in range(requests)]
+
+    async def main():
+        start = time.perf_counter()
+        results = await asyncio.gather(*(student() for _ in range(users)))
+        return [latency for result in results for latency in result], time.perf_counter() - start
+
+    return asyncio.run(main())
+
+
+def summarize(name, latencies, elapsed):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(f"{name:<34}{len(latencies) / elapsed:>10.0f}{p50:>10.2f}{p99:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200, help="Concurrent students.")
+    parser.add_argument('--requests', type=int, default=20, help="Requests per student.")
+    parser.add_argument('--threads', type=int, default=8, help="WSGI worker threads.")
+    parser.add_argument('--questions', type=int, default=30)
+    args = parser.parse_args()
+
+    user, exam = make_fixture(args.questions)
+    try:
+        token = str(RefreshToken.for_user(user).access_token)
+        print(f"{args.users} students x {args.requests} requests, exam with {args.questions} questions")
+        print(f"{'path':<34}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        # Warm the payload cache so both paths measure the steady state of an exam start
+        run_wsgi(f'/api/exams/{exam.id}/', token, 1, 1, 1)
+        summarize(f'wsgi, DRF view, {args.threads} threads',
+                  *run_wsgi(f'/api/exams/{exam.id}/', token, args.users, args.requests, args.threads))
+        summarize('asgi, DRF view, 1 event loop',
+                  *run_asgi(f'/api/exams/{exam.id}/', token, args.users, args.requests))
+        summarize('asgi, async view, 1 event loop',
+                  *run_asgi(f'/api/async/exams/{exam.id}/', token, args.users, args.requests))
+    finally:
+        drop_fixture(user, exam)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark: item analysis with per-cell Python loops vs core.item_analysis.
+
+    python -m benchmarks.item_analysis --students 50000 --items 100
+
+A synthetic response matrix (ability-driven, with 4-option MCQ items) is
+analysed both ways; the run aborts if any statistic differs.
+"""
+import argparse
+import math
+import os
+import time
+
+import django
+import numpy as np
+
+# core.item_analysis imports the models; no database connection is made
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from core.item_analysis import NO_OPTION, ResponseMatrix, analyse  # noqa: E402
+
+OPTIONS_PER_ITEM = 4
+
+
+def make_matrix(students, items, seed):
+    rng = np.random.default_rng(seed)
+    ability = rng.normal(size=(students, 1))
+    item_difficulty = rng.normal(size=(1, items))
+    probability = 1 / (1 + np.exp(item_difficulty - ability))
+    correct = (rng.random((students, items)) < probability).astype(np.float64)
+
+    # Option 0 of every item is the key; wrong answers pick a distractor, ~5% are left blank
+    option_ids = np.arange(items * OPTIONS_PER_ITEM, dtype=np.int64)
+    option_items = option_ids // OPTIONS_PER_ITEM
+    option_correct = option_ids % OPTIONS_PER_ITEM == 0
+    distractor = rng.integers(1, OPTIONS_PER_ITEM, size=(students, items))
+    choices = (np.arange(items) * OPTIONS_PER_ITEM + np.where(correct == 1, 0, distractor)).astype(np.int32)
+    blank = (correct == 0) & (rng.random((students, items)) < 0.05)
+    choices[blank] = NO_OPTION
+
+    scores = correct.mean(axis=1) * 100
+    return ResponseMatrix(
+        exam_id=0, question_ids=np.arange(items), question_types=['MCQ'] * items, scores=scores,
+        correct=correct, option_ids=option_ids, option_items=option_items,
+        option_correct=option_correct, choices=choices,
+    )
+
+
+def baseline(matrix):
+    """The straightforward per-cell loops the analysis would otherwise need."""
+    rows = matrix.correct.tolist()
+    choices = matrix.choices.tolist()
+    scores = matrix.scores.tolist()
+    n, k = len(rows), len(rows[0])
+
+    def pearson(a, b):
+        mean_a, mean_b = sum(a) / n, sum(b) / n
+        cov = sum((x - mean_a) * (y - mean_b) for x, y in zip(a, b)) / n
+        var_a = sum((x - mean_a) ** 2 for x in a) / n
+        var_b = sum((y - mean_b) ** 2 for y in b) / n
+        return cov / math.sqrt(var_a * var_b) if var_a and var_b else float('nan')
+
+    totals = [sum(row) for row in rows]
+    difficulty, discrimination, item_rest, item_variances = [], [], [], []
+    for column in range(k):
+        item = [row[column] for row in rows]
+        p = sum(item) / n
+        difficulty.append(p)
+        item_variances.append(p * (1 - p))
+        discrimination.append(pearson(item, scores))
+        item_rest.append(pearson(item, [total - x for total, x in zip(totals, item)]))
+    mean_total = sum(totals) / n
+    total_variance = sum((t - mean_total) ** 2 for t in totals) / n
+    alpha = k / (k - 1) * (1 - sum(item_variances) / total_variance)
+
+    counts = [0] * len(matrix.option_ids)
+    score_sums = [0.0] * len(matrix.option_ids)
+    for row, score in zip(choices, scores):
+        for option in row:
+            if option != NO_OPTION:
+                counts[option] += 1
+                score_sums[option] += score
+    return {
+        'difficulty': difficulty,
+        'discrimination': discrimination,
+        'item_rest_correlation': item_rest,
+        'cronbach_alpha': alpha,
+        'option_counts': counts,
+        'option_mean_scores': [s / c if c else float('nan') for s, c in zip(score_sums, counts)],
+    }
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=50000)
+    parser.add_argument('--items', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    matrix = make_matrix(args.students, args.items, args.seed)
+    expected, base_time = timed(baseline, matrix)
+    result, elapsed = timed(analyse, matrix)
+    for name, values in expected.items():
+        if not np.allclose(result[name], values, equal_nan=True):
+            raise SystemExit(f"Mismatch in '{name}'")
+
+    print(f"{args.students} students x {args.items} items, alpha={result['cronbach_alpha']:.3f}")
+    print(f"{'strategy':<28}{'seconds':>10}{'speedup':>10}")
+    print(f"{'python loops':<28}{base_time:>10.3f}{1.0:>9.1f}x")
+    print(f"{'numpy (core.item_analysis)':<28}{elapsed:>10.3f}{base_time / elapsed:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
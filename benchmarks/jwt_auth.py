@@ -0,0 +1,76 @@
+"""
+Benchmark: per-request JWT authentication, simplejwt's JWTAuthentication vs
+core.authentication.StatelessJWTAuthentication.
+
+    python -m benchmarks.jwt_auth --requests 5000
+
+Authenticates the same Bearer token `--requests` times against the configured
+database (a throwaway user is created and removed again) and reports time and
+database queries per request. The stateless class queries once to fill its
+status cache; the baseline queries on every request.
+"""
+import argparse
+import os
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from rest_framework.request import Request  # noqa: E402
+from rest_framework_simplejwt.authentication import JWTAuthentication  # noqa: E402
+from rest_framework_simplejwt.tokens import RefreshToken  # noqa: E402
+
+from core.authentication import StatelessJWTAuthentication, invalidate_user_status  # noqa: E402
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    return label, elapsed, result
+
+
+def run(backend, requests):
+    def authenticate_all():
+        with CaptureQueriesContext(connection) as ctx:
+            user_ids = {backend.authenticate(Request(request))[0].id for request in requests}
+        return user_ids, len(ctx.captured_queries)
+    return authenticate_all
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    user = User.objects.create_user(username=f'bench-{time.time_ns()}', password='bench-password')
+    try:
+        token = str(RefreshToken.for_user(user).access_token)
+        factory = RequestFactory()
+        requests = [factory.get('/api/exams/', HTTP_AUTHORIZATION=f'Bearer {token}') for _ in range(args.requests)]
+        invalidate_user_status(user.id)
+
+        results = [
+            timed('JWTAuthentication (baseline)', run(JWTAuthentication(), requests)),
+            timed('StatelessJWTAuthentication', run(StatelessJWTAuthentication(), requests)),
+        ]
+        (_, base_time, (base_ids, _)) = results[0]
+        print(f"{args.requests} authenticated requests")
+        print(f"{'backend':<32}{'total s':>10}{'us/req':>10}{'queries':>10}")
+        for label, elapsed, (user_ids, queries) in results:
+            if {str(user_id) for user_id in user_ids} != {str(user_id) for user_id in base_ids}:
+                raise SystemExit(f"{label} authenticated a different user")
+            print(f"{label:<32}{elapsed:>10.3f}{elapsed / args.requests * 1e6:>10.1f}{queries:>10}")
+        print(f"speed-up: {base_time / results[1][1]:.1f}x")
+    finally:
+        user.delete()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+"""
+Load test: the full student lifecycle against the API.
+
+    python -m benchmarks.lifecycle --exams 20 --questions 30 --students 200 --concurrency 16 \\
+        --output results.json [--baseline baseline.json --max-regression 20]
+
+Seeds `--exams` exams of `--questions` questions (a mix of MCQ and TEXT) into
+the configured database, then runs `--students` virtual students, `--concurrency`
+at a time, through
+
+    register -> login -> list exams -> retrieve exam -> submit -> my-submissions
+
+Requests go through the WSGI handler in-process by default, or over HTTP to a
+running server with `--url http://127.0.0.1:8000` (the server must use the
+same database, since the exams are seeded through the ORM). Everything the run
+creates is deleted afterwards unless `--keep` is given. Without PostgreSQL, run
+it (and `manage.py migrate` first) with `DB_ENGINE=sqlite`: see config/settings.py.
+
+Reported per endpoint: requests, errors, throughput, p50/p95/p99/mean latency
+and database queries per request (from the `X-DB-Query-Count` header of
+`core.middleware.QueryInstrumentationMiddleware`; needs `REQUEST_DB_HEADERS`).
+`--output` saves the run as JSON; `--baseline` compares against a saved run and,
+with `--max-regression PCT`, exits non-zero when an endpoint's p95 grew by more
+than PCT percent or it makes more queries per request than before.
+
+Password hashing dominates register/login; `--fast-passwords` switches to a
+cheap hasher for in-process runs so the other endpoints stand out.
+"""
+import argparse
+import io
+import json
+import math
+import os
+import platform
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.wsgi import get_wsgi_application  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+
+from core.models import Exam, ExamQuestion, Question, QuestionOption  # noqa: E402
+
+ENDPOINTS = ('register', 'login', 'list_exams', 'retrieve_exam', 'submit', 'my_submissions')
+PASSWORD = 'bench-password-123'
+WORDS = "index query table row page cache join plan scan hash tree lock commit replica vacuum".split()
+
+
+# Fixtures
+
+def seed(tag, num_exams, num_questions, num_options, text_ratio, rng):
+    """Create the exams with bulk inserts; return their ids."""
+    exams = Exam.objects.bulk_create(
+        Exam(title=f"Benchmark exam {i}", course=tag, duration_minutes=60) for i in range(num_exams)
+    )
+    questions, links = [], []
+    for exam in exams:
+        for order in range(1, num_questions + 1):
+            if rng.random() < text_ratio:
+                question = Question(text=f"Explain {rng.choice(WORDS)}", question_type='TEXT',
+                                    expected_answer=" ".join(rng.choices(WORDS, k=12)))
+            else:
+                question = Question(text=f"Pick the {rng.choice(WORDS)}", question_type='MCQ')
+            questions.append(question)
+            links.append((exam, question, order))
+    Question.objects.bulk_create(questions, batch_size=1000)
+    ExamQuestion.objects.bulk_create(
+        (ExamQuestion(exam=exam, question=question, order=order) for exam, question, order in links), batch_size=1000
+    )
+    QuestionOption.objects.bulk_create(
+        (
+            QuestionOption(question=question, text=f"Option {i}", is_correct=i == 0)
+            for question in questions if question.question_type == 'MCQ'
+            for i in range(num_options)
+        ),
+        batch_size=1000,
+    )
+    return [exam.id for exam in exams]
+
+
+def cleanup(tag):
+    Question.objects.filter(exam_questions__exam__course=tag).delete()
+    Exam.objects.filter(course=tag).delete()
+    User.objects.filter(username__startswith=f'{tag}-').delete()
+
+
+# Clients: (method, path, body, token) -> (status, headers, body bytes)
+
+class InProcessClient:
+    def __init__(self):
+        self.app = get_wsgi_application()
+
+    def request(self, method, path, body=None, token=None):
+        data = json.dumps(body).encode() if body is not None else b''
+        path, _, query = path.partition('?')
+        environ = {
+            'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': query, 'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(data)), 'wsgi.input': io.BytesIO(data), 'wsgi.errors': io.StringIO(),
+            'wsgi.url_scheme': 'http', 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+            'wsgi.run_once': False, 'wsgi.version': (1, 0),
+        }
+        if token:
+            environ['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        started = []
+        result = self.app(environ, lambda status, headers, exc_info=None: started.append((status, headers)))
+        try:
+            content = b''.join(result)
+        finally:
+            result.close()
+        status, headers = started[0]
+        return int(status.split()[0]), {name.lower(): value for name, value in headers}, content
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, body=None, token=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method)
+        request.add_header('Content-Type', 'application/json')
+        if token:
+            request.add_header('Authorization', f'Bearer {token}')
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, {k.lower(): v for k, v in response.headers.items()}, response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, {k.lower(): v for k, v in error.headers.items()}, error.read()
+
+
+# Load
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)  # endpoint -> [(latency, ok, queries)]
+
+    def call(self, client, endpoint, method, path, body=None, token=None, expect=(200,)):
+        start = time.perf_counter()
+        status, headers, content = client.request(method, path, body, token)
+        latency = time.perf_counter() - start
+        queries = headers.get('x-db-query-count')
+        with self.lock:
+            self.samples[endpoint].append((latency, status in expect, int(queries) if queries else None))
+        if status not in expect:
+            raise RuntimeError(f"{endpoint}: HTTP {status} {content[:200]!r}")
+        return json.loads(content) if content else None
+
+
+def answers_for(exam, rng):
+    answers = []
+    for question in exam['questions']:
+        if question['question_type'] == 'MCQ' and question['options']:
+            answers.append({'question_id': question['id'], 'selected_option_id': rng.choice(question['options'])['id']})
+        else:
+            answers.append({'question_id': question['id'], 'text_answer': " ".join(rng.choices(WORDS, k=12))})
+    return answers
+
+
+def student_flow(client, recorder, tag, index, exam_ids, seed_value):
+    rng = random.Random(seed_value + index)
+    username = f'{tag}-{index}'
+    recorder.call(client, 'register', 'POST', '/api/auth/register/',
+                  {'username': username, 'password': PASSWORD}, expect=(201,))
+    token = recorder.call(client, 'login', 'POST', '/api/auth/login/',
+                          {'username': username, 'password': PASSWORD})['access']
+    recorder.call(client, 'list_exams', 'GET', '/api/exams/', token=token)
+    exam = recorder.call(client, 'retrieve_exam', 'GET', f'/api/exams/{rng.choice(exam_ids)}/', token=token)
+    recorder.call(client, 'submit', 'POST', '/api/submit/',
+                  {'exam_id': exam['id'], 'answers': answers_for(exam, rng)}, token=token, expect=(201, 202))
+    recorder.call(client, 'my_submissions', 'GET', '/api/my-submissions/', token=token)
+
+
+def percentile(ordered, fraction):
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize(samples, elapsed):
+    ordered = sorted(latency for latency, _, _ in samples)
+    queries = [count for _, _, count in samples if count is not None]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, ok, _ in samples if not ok),
+        'rps': round(len(samples) / elapsed, 2),
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 2),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 2),
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+def run(args, client, exam_ids, tag):
+    recorder = Recorder()
+    failures = []
+
+    def flow(index):
+        try:
+            student_flow(client, recorder, tag, index, exam_ids, args.seed)
+        except RuntimeError as error:
+            failures.append(str(error))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(flow, range(args.students)))
+    elapsed = time.perf_counter() - start
+
+    endpoints = {name: summarize(recorder.samples[name], elapsed) for name in ENDPOINTS if recorder.samples[name]}
+    everything = [sample for name in ENDPOINTS for sample in recorder.samples[name]]
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'database': connection.vendor,
+            'target': args.url or 'in-process',
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            **{key: getattr(args, key) for key in ('exams', 'questions', 'options', 'students', 'concurrency', 'seed')},
+        },
+        'elapsed_s': round(elapsed, 3),
+        'total': summarize(everything, elapsed),
+        'endpoints': endpoints,
+        'failures': failures[:20],
+    }
+
+
+# Reporting
+
+def print_results(results):
+    print(f"{results['meta']['students']} students, concurrency {results['meta']['concurrency']}, "
+          f"{results['meta']['database']} / {results['meta']['target']}: {results['elapsed_s']}s")
+    print(f"{'endpoint':<16}{'reqs':>7}{'errors':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}")
+    for name, row in [*results['endpoints'].items(), ('total', results['total'])]:
+        queries = '-' if row['queries_per_request'] is None else f"{row['queries_per_request']:.1f}"
+        print(f"{name:<16}{row['requests']:>7}{row['errors']:>7}{row['rps']:>9.1f}"
+              f"{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['p99_ms']:>9.2f}{queries:>9}")
+    for failure in results['failures']:
+        print(f"  failed: {failure}")
+
+
+def compare(results, baseline, max_regression):
+    """Print the change against `baseline`; return the endpoints that regressed beyond the limits."""
+    print(f"\nvs baseline from {baseline['meta']['timestamp']}:")
+    print(f"{'endpoint':<16}{'p95 ms':>18}{'change':>9}{'req/s change':>14}{'queries':>14}")
+    regressions = []
+    for name, row in results['endpoints'].items():
+        before = baseline['endpoints'].get(name)
+        if before is None:
+            continue
+        change = (row['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0.0
+        rps_change = (row['rps'] - before['rps']) / before['rps'] * 100 if before['rps'] else 0.0
+        queries_before, queries_now = before['queries_per_request'], row['queries_per_request']
+        print(f"{name:<16}{before['p95_ms']:>9.2f} -> {row['p95_ms']:<6.2f}{change:>+8.1f}%{rps_change:>+13.1f}%"
+              f"{str(queries_before):>7} -> {queries_now}")
+        if max_regression is not None:
+            if change > max_regression:
+                regressions.append(f"{name}: p95 +{change:.1f}%")
+            if queries_before is not None and queries_now is not None and queries_now > queries_before:
+                regressions.append(f"{name}: {queries_before} -> {queries_now} queries per request")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--exams', type=int, default=20)
+    parser.add_argument('--questions', type=int, default=30, help="Questions per exam.")
+    parser.add_argument('--options', type=int, default=4, help="Options per MCQ question.")
+    parser.add_argument('--text-ratio', type=float, default=0.2, help="Share of TEXT questions.")
+    parser.add_argument('--students', type=int, default=200, help="Virtual students, one lifecycle each.")
+    parser.add_argument('--concurrency', type=int, default=16, help="Students running at the same time.")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--url', help="Base URL of a running server (default: in-process WSGI).")
+    parser.add_argument('--fast-passwords', action='store_true', help="Use a cheap password hasher (in-process only).")
+    parser.add_argument('--output', help="Write the results as JSON to this file.")
+    parser.add_argument('--baseline', help="Compare against results saved with --output.")
+    parser.add_argument('--max-regression', type=float, help="With --baseline: fail above this p95 increase (%%).")
+    parser.add_argument('--keep', action='store_true', help="Keep the seeded exams and students.")
+    args = parser.parse_args()
+    if args.fast_passwords and args.url:
+        parser.error("--fast-passwords only applies to in-process runs")
+
+    tag = f'bench-{time.time_ns()}'
+    client = HttpClient(args.url) if args.url else InProcessClient()
+    hasher = override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+    if args.fast_passwords:
+        hasher.enable()
+    try:
+        exam_ids = seed(tag, args.exams, args.questions, args.options, args.text_ratio, random.Random(args.seed))
+        results = run(args, client, exam_ids, tag)
+    finally:
+        if not args.keep:
+            cleanup(tag)
+        if args.fast_passwords:
+            hasher.disable()
+
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(results, out, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            print("\nregressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+    if results['failures']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
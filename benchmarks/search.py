@@ -0,0 +1,148 @@
+"""
+Benchmark: question-bank / exam search vs `icontains` scans.
+
+    python -m benchmarks.search --questions 200000 --exams 20000 --queries 50
+
+Seeds a synthetic question bank and tagged exams into the configured database,
+then times, per query term:
+
+- questions: an admin-style `text__icontains` changelist (count + first page)
+  against `core.search.search_questions` (ranked first page);
+- exams: a tag match on the serialized `metadata` against
+  `core.search.search_exams(tags=...)` (jsonb containment).
+
+Full-text search and the GIN indexes exist on PostgreSQL only; on other
+backends both sides are scans and the numbers only check that the code runs.
+Everything the run creates is deleted afterwards unless `--keep` is given.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.db.models.fields.json import KT  # noqa: E402
+
+from core.models import Exam, Question  # noqa: E402
+from core.search import search_exams, search_questions  # noqa: E402
+
+PAGE = 20
+DIFFICULTIES = ('easy', 'medium', 'hard')
+STEMS = "alpha beta gamma delta sigma omega theta kappa lambda zeta".split()
+TOPICS = "graph matrix vector tensor proof limit integral series prime group ring field lattice".split()
+
+
+def vocabulary(size):
+    """Synthetic words: distinct tokens so a term matches a small share of the bank."""
+    return [f"{STEMS[i % len(STEMS)]}{TOPICS[i % len(TOPICS)]}{i}" for i in range(size)]
+
+
+def seed(tag, num_questions, num_exams, words, rng):
+    """Bulk-insert the bank (exams under `course=tag`); returns the first and last question id."""
+    first = last = None
+    batch = []
+    for i in range(num_questions):
+        batch.append(Question(
+            text=f"Explain how {rng.choice(words)} relates to {rng.choice(words)} in {rng.choice(TOPICS)} problems",
+            question_type='TEXT' if i % 3 == 0 else 'MCQ',
+            expected_answer=" ".join(rng.choices(words, k=6)) if i % 3 == 0 else '',
+        ))
+        if len(batch) == 5000 or i == num_questions - 1:
+            created = Question.objects.bulk_create(batch)
+            first = created[0].id if first is None else first
+            last = created[-1].id
+            batch = []
+    Exam.objects.bulk_create((
+        Exam(
+            title=f"{rng.choice(TOPICS).title()} exam {i}", course=tag, duration_minutes=60,
+            description=f"Covers {rng.choice(words)} and {rng.choice(words)}",
+            metadata={'difficulty': rng.choice(DIFFICULTIES), 'tags': rng.sample(words[:200], 3)},
+        )
+        for i in range(num_exams)
+    ), batch_size=5000)
+    return first, last
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def report(name, baseline_ms, search_ms):
+    def row(label, samples):
+        samples = sorted(samples)
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        return f"  {label:<26}{statistics.mean(samples):>10.2f}{p95:>10.2f}"
+    print(name)
+    print(f"  {'strategy':<26}{'mean ms':>10}{'p95 ms':>10}")
+    print(row('icontains scan', baseline_ms))
+    print(row('indexed search', search_ms))
+    print(f"  speedup {statistics.mean(baseline_ms) / statistics.mean(search_ms):.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, default=200000)
+    parser.add_argument('--exams', type=int, default=20000)
+    parser.add_argument('--vocabulary', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--keep', action='store_true', help="Keep the seeded data.")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    words = vocabulary(args.vocabulary)
+    tag = f"bench-{time.time_ns()}"
+    started = time.perf_counter()
+    first, last = seed(tag, args.questions, args.exams, words, rng)
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE core_question")
+            cursor.execute("ANALYZE core_exam")
+    print(f"Seeded {args.questions} questions and {args.exams} exams in {time.perf_counter() - started:.1f}s "
+          f"({connection.vendor})")
+
+    try:
+        terms = rng.sample(words, args.queries)
+        baseline, indexed = [], []
+        for term in terms:
+            def scan():
+                matches = Question.objects.filter(text__icontains=term).order_by('-id')
+                return matches.count(), list(matches[:PAGE])
+            (count, _), ms = timed(scan)
+            baseline.append(ms)
+            results, ms = timed(lambda: list(search_questions(term)[:PAGE]))
+            indexed.append(ms)
+            if count and not results:
+                raise SystemExit(f"Search found nothing for '{term}' ({count} scan matches)")
+        report(f"Question search, {args.queries} terms", baseline, indexed)
+
+        tags = rng.sample(words[:200], min(args.queries, 200))
+        baseline, indexed = [], []
+        for tag_name in tags:
+            def scan():
+                return list(
+                    Exam.objects.annotate(tags_json=KT('metadata__tags'))
+                    .filter(tags_json__contains=f'"{tag_name}"', metadata__difficulty='hard').order_by('-id')[:PAGE]
+                )
+            _, ms = timed(scan)
+            baseline.append(ms)
+            _, ms = timed(lambda: list(search_exams(tags=[tag_name], difficulty='hard')[:PAGE]))
+            indexed.append(ms)
+        report(f"Exam tag filter, {len(tags)} tags", baseline, indexed)
+    finally:
+        if not args.keep:
+            Exam.objects.filter(course=tag).delete()
+            if first is not None:
+                Question.objects.filter(id__gte=first, id__lte=last).delete()
+
+
+if __name__ == '__main__':
+    main()
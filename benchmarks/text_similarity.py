@@ -0,0 +1,87 @@
+"""
+Benchmark: TEXT grading with the original difflib loop vs core.similarity.
+
+    python -m benchmarks.text_similarity --answers 5000 --workers 4
+
+Verdicts from every strategy are compared against the original rule
+(`SequenceMatcher(...).ratio() > 0.8`) and the run aborts on any mismatch.
+"""
+import argparse
+import os
+import random
+import time
+from difflib import SequenceMatcher
+
+from core.similarity import DEFAULT_THRESHOLD, TextSimilarityEngine
+
+WORDS = (
+    "a data structure index improve retrieval speed table rows query planner "
+    "b-tree hash lookup column scan cost memory disk page cache join order"
+).split()
+
+
+def make_pairs(num_answers, num_questions, seed):
+    rng = random.Random(seed)
+    expected = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 120))) for _ in range(num_questions)]
+    pairs = []
+    for _ in range(num_answers):
+        key = rng.choice(expected)
+        roll = rng.random()
+        if roll < 0.3:
+            # Near-copy: a few words changed
+            words = key.split()
+            for _ in range(rng.randint(0, 4)):
+                words[rng.randrange(len(words))] = rng.choice(WORDS)
+            answer = " ".join(words)
+        elif roll < 0.6:
+            # Short answer: rejected by the length bound
+            answer = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 10)))
+        else:
+            # Long essay-style answer on the topic
+            answer = " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 400)))
+        pairs.append((answer.upper() if rng.random() < 0.1 else answer, key))
+    return pairs
+
+
+def baseline(pairs):
+    return [
+        SequenceMatcher(None, answer.lower(), expected.lower()).ratio() > DEFAULT_THRESHOLD
+        for answer, expected in pairs
+    ]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--answers', type=int, default=3000)
+    parser.add_argument('--questions', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    pairs = make_pairs(args.answers, args.questions, args.seed)
+    expected, base_time = timed(baseline, pairs)
+    print(f"{len(pairs)} answers, {args.questions} questions, {sum(expected)} correct")
+    print(f"{'strategy':<28}{'seconds':>10}{'speedup':>10}")
+    print(f"{'difflib loop (original)':<28}{base_time:>10.3f}{1.0:>9.1f}x")
+
+    strategies = [('engine, inline', TextSimilarityEngine(max_workers=0))]
+    if args.workers > 1:
+        strategies.append((f'engine, {args.workers} processes',
+                           TextSimilarityEngine(max_workers=args.workers, parallel_min_batch=1)))
+
+    for name, engine in strategies:
+        engine.match_many(pairs[:10])  # warm up the pool
+        verdicts, elapsed = timed(engine.match_many, pairs)
+        if verdicts != expected:
+            raise SystemExit(f"Verdict mismatch for strategy '{name}'")
+        print(f"{name:<28}{elapsed:>10.3f}{base_time / elapsed:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
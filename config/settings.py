@@ -5,7 +5,9 @@ Generated by 'django-admin startproject' using Django 6.0.
 """
 
 from pathlib import Path
+from importlib.util import find_spec
 import os
+import warnings
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -46,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -86,8 +89,51 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
         'PORT': os.getenv('DB_PORT'),
+        # Persistent connections: skip the connect handshake on every request
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
+        'OPTIONS': {},
     }
 }
+if os.getenv('DB_ENGINE') == 'sqlite':
+    # Local runs and benchmarks without PostgreSQL: a SQLite file (DB_NAME, default db.sqlite3).
+    # WAL lets reads run alongside the single writer; IMMEDIATE transactions take the write lock up
+    # front and wait up to DB_SQLITE_TIMEOUT seconds for it, so concurrent submits queue up instead
+    # of failing with "database is locked".
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('DB_NAME') or BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'OPTIONS': {
+            'timeout': int(os.getenv('DB_SQLITE_TIMEOUT', 30)),
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+        },
+    }
+elif os.getenv('DB_POOL_MAX_SIZE') and not (find_spec('psycopg') and find_spec('psycopg_pool')):
+    # Django would refuse to connect ("Pooling requires psycopg >= 3"): keep persistent connections instead
+    warnings.warn("DB_POOL_MAX_SIZE is ignored: connection pooling needs psycopg 3 with psycopg_pool (psycopg[pool]).")
+elif os.getenv('DB_POOL_MAX_SIZE'):
+    # psycopg 3 connection pool (needs `psycopg[pool]`); replaces persistent connections
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.getenv('DB_POOL_MAX_SIZE')),
+        'timeout': int(os.getenv('DB_POOL_TIMEOUT', 10)),
+    }
+
+# Read replica for read-only API views (core/routers.py). Without DB_REPLICA_HOST it is a stand-in
+# pointing at the primary; tests mirror it onto the test database.
+DATABASES['replica'] = {
+    **DATABASES['default'],
+    'HOST': os.getenv('DB_REPLICA_HOST') or DATABASES['default'].get('HOST'),
+    'PORT': os.getenv('DB_REPLICA_PORT') or DATABASES['default'].get('PORT'),
+    'OPTIONS': {**DATABASES['default']['OPTIONS']},
+    'TEST': {'MIRROR': 'default'},
+}
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+# Reads stay on the primary this long after a user's own writes (read-your-writes)
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
 
 
 # Password validation
@@ -130,7 +176,7 @@ STATIC_URL = 'static/'
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.StatelessJWTAuthentication',
     ),
 }
 
@@ -173,5 +219,97 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# Cached user status for StatelessJWTAuthentication (core/authentication.py): per process / shared cache.
+AUTH_STATUS_LOCAL_TIMEOUT = float(os.getenv('AUTH_STATUS_LOCAL_TIMEOUT', 5))
+AUTH_STATUS_CACHE_TIMEOUT = int(os.getenv('AUTH_STATUS_CACHE_TIMEOUT', 300))
+
 # User Model (Using default for now, can be extended if needed)
 # AUTH_USER_MODEL = 'core.User' # Only if we create a custom user model
+
+# Grading
+# 'sync'  -> SubmitExamView grades inline and returns 201 with the score.
+# 'async' -> SubmitExamView enqueues a GradingJob and returns 202; run `manage.py grade_worker`.
+GRADING_MODE = os.getenv('GRADING_MODE', 'sync')
+GRADING_WORKER_BATCH_SIZE = int(os.getenv('GRADING_WORKER_BATCH_SIZE', 50))
+GRADING_WORKER_CONCURRENCY = int(os.getenv('GRADING_WORKER_CONCURRENCY', 1))
+GRADING_WORKER_POLL_INTERVAL = float(os.getenv('GRADING_WORKER_POLL_INTERVAL', 1.0))
+GRADING_WORKER_MAX_ATTEMPTS = int(os.getenv('GRADING_WORKER_MAX_ATTEMPTS', 5))
+GRADING_WORKER_BACKOFF_SECONDS = float(os.getenv('GRADING_WORKER_BACKOFF_SECONDS', 5))
+GRADING_WORKER_STALE_AFTER_SECONDS = int(os.getenv('GRADING_WORKER_STALE_AFTER_SECONDS', 300))
+
+# Exam-wide re-grading (core/regrade.py): grading processes (0 = inline) and submissions per chunk/transaction
+REGRADE_WORKERS = int(os.getenv('REGRADE_WORKERS', 2))
+REGRADE_CHUNK_SIZE = int(os.getenv('REGRADE_CHUNK_SIZE', 2000))
+
+# Autosaved drafts (core/drafts.py): buffered in the cache, flushed to Answer rows once per interval
+DRAFT_FLUSH_INTERVAL = int(os.getenv('DRAFT_FLUSH_INTERVAL', 10))
+DRAFT_BUFFER_TIMEOUT = int(os.getenv('DRAFT_BUFFER_TIMEOUT', 6 * 60 * 60))
+
+# Deadlines (core/deadlines.py): `manage.py sweep_deadlines` submits IN_PROGRESS attempts
+# once deadline_at + grace has passed, in locked batches
+DEADLINE_GRACE_SECONDS = int(os.getenv('DEADLINE_GRACE_SECONDS', 30))
+DEADLINE_SWEEP_BATCH_SIZE = int(os.getenv('DEADLINE_SWEEP_BATCH_SIZE', 500))
+DEADLINE_SWEEP_POLL_INTERVAL = float(os.getenv('DEADLINE_SWEEP_POLL_INTERVAL', 1.0))
+
+# TEXT answer similarity engine (core/similarity.py)
+# Worker processes for large TEXT batches (0/1 = grade inline).
+TEXT_GRADING_WORKERS = int(os.getenv('TEXT_GRADING_WORKERS', 0))
+TEXT_GRADING_PARALLEL_MIN_BATCH = int(os.getenv('TEXT_GRADING_PARALLEL_MIN_BATCH', 200))
+
+# Cache (answer keys, rendered exam payloads, exam content versions)
+# Defaults to per-process memory for development. With more than one worker process it must be
+# shared (e.g. CACHE_BACKEND=django.core.cache.backends.redis.RedisCache, CACHE_LOCATION=redis://localhost:6379/0)
+# so invalidation reaches every worker; the core.E001 system check refuses to start otherwise.
+# WEB_CONCURRENCY is the number of web worker processes (the variable gunicorn reads).
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 1))
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'mini-assessment-engine'),
+    }
+}
+ANSWER_KEY_CACHE_TIMEOUT = int(os.getenv('ANSWER_KEY_CACHE_TIMEOUT', 60 * 60))
+EXAM_PAYLOAD_CACHE_TIMEOUT = int(os.getenv('EXAM_PAYLOAD_CACHE_TIMEOUT', 60 * 60))
+
+# Pagination (keyset, see core/pagination.py). Clients may pass ?page_size= up to MAX_PAGE_SIZE.
+EXAM_PAGE_SIZE = int(os.getenv('EXAM_PAGE_SIZE', 20))
+SUBMISSION_PAGE_SIZE = int(os.getenv('SUBMISSION_PAGE_SIZE', 20))
+SEARCH_PAGE_SIZE = int(os.getenv('SEARCH_PAGE_SIZE', 20))
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 100))
+
+# Bulk submission uploads (POST /api/submit/bulk/)
+BULK_SUBMIT_CHUNK_SIZE = int(os.getenv('BULK_SUBMIT_CHUNK_SIZE', 500))
+BULK_SUBMIT_ANSWER_BATCH_SIZE = int(os.getenv('BULK_SUBMIT_ANSWER_BATCH_SIZE', 5000))
+
+# Results export (server-side cursor fetch size)
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 2000))
+
+# Exam statistics (core/stats.py): scores at or above this count as a pass
+PASS_MARK = float(os.getenv('PASS_MARK', 50))
+
+# Item analysis (core/item_analysis.py): answer rows fetched per server-side cursor round trip
+ITEM_ANALYSIS_CHUNK_SIZE = int(os.getenv('ITEM_ANALYSIS_CHUNK_SIZE', 10000))
+
+# Exam import (manage.py import_exams): questions validated and written per chunk
+EXAM_IMPORT_CHUNK_SIZE = int(os.getenv('EXAM_IMPORT_CHUNK_SIZE', 5000))
+
+# Per-request DB instrumentation (core/middleware.py)
+REQUEST_DB_HEADERS = os.getenv('REQUEST_DB_HEADERS', 'True') == 'True'
+REQUEST_QUERY_COUNT_WARNING = int(os.getenv('REQUEST_QUERY_COUNT_WARNING', 50))
+# INFO logs one JSON line per request; the default only logs requests above the query-count threshold
+REQUEST_LOG_LEVEL = os.getenv('REQUEST_LOG_LEVEL', 'WARNING')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.requests': {'handlers': ['console'], 'level': REQUEST_LOG_LEVEL, 'propagate': False},
+    },
+}
+
+# Async views (core/async_views.py): threads grading submissions off the event loop
+# (0 grades in the request's own sync thread, e.g. for SQLite)
+ASYNC_GRADING_THREADS = int(os.getenv('ASYNC_GRADING_THREADS', 4))
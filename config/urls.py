@@ -6,7 +6,11 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
-from core.views import RegisterView, ExamViewSet, SubmitExamView, MySubmissionsView
+from core.views import (
+    RegisterView, ExamViewSet, ExamDraftView, SubmitExamView, BulkSubmitView, MySubmissionsView, ExamSearchView,
+    QuestionSearchView,
+)
+from core import async_views
 
 router = DefaultRouter()
 router.register(r'exams', ExamViewSet)
@@ -21,8 +25,16 @@ urlpatterns = [
     
     # Core
     path('api/', include(router.urls)),
+    path('api/exams/<int:exam_id>/draft/', ExamDraftView.as_view(), name='exam_draft'),
     path('api/submit/', SubmitExamView.as_view(), name='submit_exam'),
+    path('api/submit/bulk/', BulkSubmitView.as_view(), name='bulk_submit'),
     path('api/my-submissions/', MySubmissionsView.as_view(), name='my_submissions'),
+    path('api/search/exams/', ExamSearchView.as_view(), name='exam_search'),
+    path('api/search/questions/', QuestionSearchView.as_view(), name='question_search'),
+
+    # Async (ASGI) student hot path
+    path('api/async/exams/<int:pk>/', async_views.exam_detail, name='async_exam_detail'),
+    path('api/async/submit/', async_views.submit_exam, name='async_submit_exam'),
     
     # Docs
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
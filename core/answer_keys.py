@@ -0,0 +1,115 @@
+"""
+Compiled answer keys.
+
+An exam's answer key never changes between submissions, so it is derived
+once from ExamQuestion/Question/QuestionOption, stored in Django's cache
+under the exam's content version (see `core.caching`) and reused by every
+grading run. Model signals in `core.signals` bump the version on change.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .caching import aget_exam_versions, get_exam_versions
+from .models import ExamQuestion, QuestionOption
+
+ANSWER_KEY_CACHE_KEY = 'answer-key:{}:{}'
+
+
+class AnswerKey:
+    """
+    Compact, picklable answer key for one exam.
+
+    `mcq`  maps question id -> frozenset of correct option ids
+    `text` maps question id -> normalized (lowercased) expected answer
+    """
+    __slots__ = ('exam_id', 'mcq', 'text')
+
+    def __init__(self, exam_id, mcq, text):
+        self.exam_id = exam_id
+        self.mcq = mcq
+        self.text = text
+
+    def __getstate__(self):
+        return (self.exam_id, self.mcq, self.text)
+
+    def __setstate__(self, state):
+        self.exam_id, self.mcq, self.text = state
+
+    @property
+    def total_questions(self):
+        return len(self.mcq) + len(self.text)
+
+    def is_option_correct(self, question_id, option_id):
+        return option_id is not None and option_id in self.mcq.get(question_id, ())
+
+
+def build_answer_keys(exam_ids):
+    """Compile answer keys straight from the database (two queries for any number of exams)."""
+    mcq = {exam_id: {} for exam_id in exam_ids}
+    text = {exam_id: {} for exam_id in exam_ids}
+
+    rows = ExamQuestion.objects.filter(exam_id__in=exam_ids).values_list(
+        'exam_id', 'question_id', 'question__question_type', 'question__expected_answer'
+    )
+    question_exams = {}
+    for exam_id, question_id, question_type, expected_answer in rows:
+        question_exams.setdefault(question_id, []).append(exam_id)
+        if question_type == 'MCQ':
+            mcq[exam_id][question_id] = set()
+        elif question_type == 'TEXT':
+            text[exam_id][question_id] = expected_answer.lower()
+        else:
+            # Unknown types still count towards the total but can never be correct.
+            mcq[exam_id][question_id] = set()
+
+    correct_options = QuestionOption.objects.filter(
+        is_correct=True, question_id__in=list(question_exams)
+    ).values_list('question_id', 'id')
+    for question_id, option_id in correct_options:
+        for exam_id in question_exams[question_id]:
+            if question_id in mcq[exam_id]:
+                mcq[exam_id][question_id].add(option_id)
+
+    return {
+        exam_id: AnswerKey(
+            exam_id,
+            {question_id: frozenset(options) for question_id, options in mcq[exam_id].items()},
+            text[exam_id],
+        )
+        for exam_id in exam_ids
+    }
+
+
+def get_answer_keys(exam_ids):
+    """Return {exam_id: AnswerKey}, served from cache when the exam's version is unchanged."""
+    exam_ids = list(set(exam_ids))
+    if not exam_ids:
+        return {}
+    versions = get_exam_versions(exam_ids)
+    cache_keys = {ANSWER_KEY_CACHE_KEY.format(exam_id, versions[exam_id]): exam_id for exam_id in exam_ids}
+    cached = cache.get_many(cache_keys)
+    keys = {cache_keys[cache_key]: answer_key for cache_key, answer_key in cached.items()}
+
+    missing = [exam_id for exam_id in exam_ids if exam_id not in keys]
+    if missing:
+        built = build_answer_keys(missing)
+        cache.set_many(
+            {ANSWER_KEY_CACHE_KEY.format(exam_id, versions[exam_id]): built[exam_id] for exam_id in missing},
+            timeout=settings.ANSWER_KEY_CACHE_TIMEOUT,
+        )
+        keys.update(built)
+    return keys
+
+
+def get_answer_key(exam_id):
+    return get_answer_keys([exam_id])[exam_id]
+
+
+async def aget_answer_key(exam_id):
+    """Async `get_answer_key`: cache reads are awaited, only a miss hops to a thread to build the key."""
+    version = (await aget_exam_versions([exam_id]))[exam_id]
+    answer_key = await cache.aget(ANSWER_KEY_CACHE_KEY.format(exam_id, version))
+    if answer_key is None:
+        answer_key = await sync_to_async(get_answer_key)(exam_id)
+    return answer_key
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import checks, middleware, schema, signals  # noqa: F401  (connect receivers, register checks and extensions)
@@ -0,0 +1,146 @@
+"""
+Async (ASGI) versions of the hottest student endpoints: exam retrieve and submit.
+
+Served under ASGI these run on the event loop instead of occupying a thread
+per request. Cache reads (exam versions, rendered payloads, answer keys) and
+reads through the async ORM are awaited; work that is inherently synchronous
+hops to a thread only when needed: rendering a payload on a cache miss, the
+submission write (one transaction, which the async ORM cannot span) and
+grading, which runs on a dedicated thread pool (`ASYNC_GRADING_THREADS`) so
+CPU-heavy TEXT grading never blocks the loop.
+
+Authentication is the same stateless JWT check as the DRF views
+(`core.authentication`): no auth query once the user's status is cached.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections
+from django.http import Http404, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from .authentication import StatelessJWTAuthentication, aget_user_status, check_user_status, token_user_id
+from .caching import aget_exam_versions, apeek_exam_version
+from .drafts import DraftClosed
+from .models import Exam, Submission
+from .answer_keys import aget_answer_key
+from .payloads import aget_exam_payload, exam_etag
+from .routers import apin_to_primary
+from .serializers import ExamSerializer, SubmissionCreateSerializer, SubmissionSerializer
+from .services import MockGradingService, SubmissionService, SubmissionValidationError
+from .views import _cached_json_response, _etag_matches, _not_modified, exam_question_prefetches
+
+_jwt = StatelessJWTAuthentication()
+_grading_executor = None
+
+
+def get_grading_executor():
+    global _grading_executor
+    if _grading_executor is None:
+        _grading_executor = ThreadPoolExecutor(max_workers=settings.ASYNC_GRADING_THREADS, thread_name_prefix='grading')
+    return _grading_executor
+
+
+def _grade(submission_id):
+    try:
+        return MockGradingService.grade_submission(submission_id)
+    finally:
+        # Pool threads live outside the request cycle; honour CONN_MAX_AGE / broken connections here
+        close_old_connections()
+
+
+async def grade_submission(submission_id):
+    """Grade off the event loop: on the grading pool, or in the request's own thread when the pool is disabled."""
+    if settings.ASYNC_GRADING_THREADS > 0:
+        return await sync_to_async(_grade, thread_sensitive=False, executor=get_grading_executor())(submission_id)
+    return await sync_to_async(MockGradingService.grade_submission)(submission_id)
+
+
+async def authenticate(request):
+    """Return the active user id for the request's JWT, or None."""
+    header = _jwt.get_header(request)
+    raw_token = _jwt.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        return None
+    try:
+        user_id = token_user_id(_jwt.get_validated_token(raw_token))
+        check_user_status(await aget_user_status(user_id))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    return user_id
+
+
+def _unauthorized():
+    return JsonResponse({"detail": "Authentication credentials were not provided or are invalid."}, status=401)
+
+
+@require_GET
+async def exam_detail(request, pk):
+    if await authenticate(request) is None:
+        return _unauthorized()
+    version = await apeek_exam_version(pk)
+    if version is None:
+        # Same as ExamViewSet.retrieve: unknown ids are a 404 and get no version
+        if not await Exam.objects.filter(id=pk).aexists():
+            raise Http404
+        version = (await aget_exam_versions([pk]))[pk]
+    etag = exam_etag(pk, version)
+    if _etag_matches(request, etag):
+        return _not_modified(etag)
+
+    queryset = Exam.objects.defer('search_vector').prefetch_related(*exam_question_prefetches())
+    payload = await aget_exam_payload(pk, version, queryset, ExamSerializer)
+    if payload is None:
+        raise Http404
+    return _cached_json_response(payload, etag)
+
+
+@csrf_exempt
+@require_POST
+async def submit_exam(request):
+    student_id = await authenticate(request)
+    if student_id is None:
+        return _unauthorized()
+    try:
+        body = JSONParser().parse(request)
+    except ParseError as exc:
+        return JsonResponse({"detail": str(exc.detail)}, status=400)
+    serializer = SubmissionCreateSerializer(data=body)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+    data = serializer.validated_data
+
+    if not await Exam.objects.filter(id=data['exam_id']).aexists():
+        return JsonResponse({"detail": "No Exam matches the given query."}, status=404)
+    try:
+        new_answers = SubmissionService.build_answers(
+            data['exam_id'], data['answers'],
+            answer_key=await aget_answer_key(data['exam_id']),
+            option_questions=await SubmissionService.aload_option_questions([data['answers']]),
+        )
+    except SubmissionValidationError as exc:
+        return JsonResponse(exc.data, status=exc.status_code)
+
+    grading_async = settings.GRADING_MODE == 'async'
+    try:
+        submission = await sync_to_async(SubmissionService.store_submission)(
+            student_id, data['exam_id'], new_answers, enqueue=grading_async
+        )
+    except IntegrityError:
+        if await Submission.objects.filter(student_id=student_id, exam_id=data['exam_id']).aexists():
+            return JsonResponse({"error": "You have already submitted this exam."}, status=409)
+        raise
+    except DraftClosed as exc:
+        return JsonResponse({"error": exc.message}, status=409)
+    await apin_to_primary(student_id)
+
+    if grading_async:
+        return JsonResponse(SubmissionSerializer(submission).data, status=202)
+    submission.score = await grade_submission(submission.id)
+    submission.status = 'GRADED'
+    return JsonResponse(SubmissionSerializer(submission).data, status=201)
@@ -0,0 +1,160 @@
+"""
+Stateless JWT authentication.
+
+simplejwt's `JWTAuthentication` loads the `User` row on every request just to
+check that it still exists and is active. `StatelessJWTAuthentication` takes
+the user id from the (signed) token and only looks up the user's status flags
+(`is_active`, `is_staff`, `is_superuser`), which are cached:
+
+- in process, for `AUTH_STATUS_LOCAL_TIMEOUT` seconds (no cache round trip at all),
+- in the shared cache, for `AUTH_STATUS_CACHE_TIMEOUT` seconds. This level is
+  skipped when the default cache is per-process (LocMemCache, see
+  `core.checks.cache_is_shared`): other processes could not see its
+  invalidation, so the status is read from the database instead.
+
+`request.user` is a `TokenUser` carrying those flags, so views that only need
+`request.user.id` (or `is_staff` for permissions) run without any auth query.
+Saving or deleting a user invalidates their entry (see `core.signals`), so a
+deactivation or demotion takes effect at once in this process and within
+`AUTH_STATUS_LOCAL_TIMEOUT` seconds everywhere else. `queryset.update()` bypasses
+the signals; call `invalidate_user_status` after such updates.
+"""
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .checks import cache_is_shared
+
+STATUS_KEY = 'auth-status:{}'
+LOCAL_MAX_ENTRIES = 10000
+
+UserStatus = namedtuple('UserStatus', ['is_active', 'is_staff', 'is_superuser'])
+
+# user id -> (expires_at, UserStatus or None)
+_local = {}
+
+_MISSING = 'missing'  # cached marker for deleted users
+
+
+def _remember(user_id, status):
+    if len(_local) >= LOCAL_MAX_ENTRIES:
+        _local.clear()
+    _local[user_id] = (time.monotonic() + settings.AUTH_STATUS_LOCAL_TIMEOUT, status)
+
+
+def _from_local(user_id):
+    entry = _local.get(user_id)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry
+    return None
+
+
+def _decode(cached):
+    return None if cached == _MISSING else UserStatus(*cached)
+
+
+def _encode(status):
+    return _MISSING if status is None else tuple(status)
+
+
+def _load_status(user_id):
+    row = get_user_model().objects.filter(pk=user_id).values_list(*UserStatus._fields).first()
+    return UserStatus(*row) if row else None
+
+
+def get_user_status(user_id):
+    """Return the user's `UserStatus`, or None if the user does not exist."""
+    entry = _from_local(user_id)
+    if entry is not None:
+        return entry[1]
+
+    if not cache_is_shared():
+        # A per-process cache would hide invalidations made by other processes
+        status = _load_status(user_id)
+    else:
+        key = STATUS_KEY.format(user_id)
+        cached = cache.get(key)
+        if cached is None:
+            status = _load_status(user_id)
+            cache.set(key, _encode(status), timeout=settings.AUTH_STATUS_CACHE_TIMEOUT)
+        else:
+            status = _decode(cached)
+    _remember(user_id, status)
+    return status
+
+
+async def _aload_status(user_id):
+    row = await get_user_model().objects.filter(pk=user_id).values_list(*UserStatus._fields).afirst()
+    return UserStatus(*row) if row else None
+
+
+async def aget_user_status(user_id):
+    """Async `get_user_status` (for the ASGI views)."""
+    entry = _from_local(user_id)
+    if entry is not None:
+        return entry[1]
+
+    if not cache_is_shared():
+        # A per-process cache would hide invalidations made by other processes
+        status = await _aload_status(user_id)
+    else:
+        key = STATUS_KEY.format(user_id)
+        cached = await cache.aget(key)
+        if cached is None:
+            status = await _aload_status(user_id)
+            await cache.aset(key, _encode(status), timeout=settings.AUTH_STATUS_CACHE_TIMEOUT)
+        else:
+            status = _decode(cached)
+    _remember(user_id, status)
+    return status
+
+
+def invalidate_user_status(*user_ids):
+    for user_id in user_ids:
+        _local.pop(user_id, None)
+    cache.delete_many([STATUS_KEY.format(user_id) for user_id in user_ids])
+
+
+def token_user_id(validated_token):
+    """The token's user id as a primary key value; raises InvalidToken."""
+    try:
+        return get_user_model()._meta.pk.to_python(validated_token[jwt_settings.USER_ID_CLAIM])
+    except (KeyError, ValidationError):
+        raise InvalidToken("Token contained no recognizable user identification")
+
+
+def check_user_status(status):
+    if status is None:
+        raise AuthenticationFailed("User not found", code='user_not_found')
+    if jwt_settings.CHECK_USER_IS_ACTIVE and not status.is_active:
+        raise AuthenticationFailed("User is inactive", code='user_inactive')
+
+
+class StatelessUser(TokenUser):
+    """A `TokenUser` whose flags come from the cached user status, not from token claims."""
+
+    def __init__(self, token, user_id, status):
+        super().__init__(token)
+        self.id = user_id
+        self.is_active = status.is_active
+        self.is_staff = status.is_staff
+        self.is_superuser = status.is_superuser
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if jwt_settings.CHECK_REVOKE_TOKEN:
+            # Revocation compares against the password hash, which is not cached
+            return super().get_user(validated_token)
+        user_id = token_user_id(validated_token)
+        status = get_user_status(user_id)
+        check_user_status(status)
+        return StatelessUser(validated_token, user_id, status)
@@ -0,0 +1,342 @@
+"""
+Bulk submission ingestion for proctored centres / offline sync.
+
+The request body (a JSON array or NDJSON, one submission per line) is parsed
+incrementally, processed in fixed-size chunks and answered with one NDJSON
+result line per item, so memory stays bounded by the chunk size no matter
+how large the upload is.
+
+Per chunk: one query each for exams, students, options and existing
+submissions, then one transaction with a bulk INSERT for submissions, one
+(batched) for answers and one for their grading jobs. In sync mode the jobs
+are created claimed and the chunk is graded set-based right after the commit;
+a grading failure leaves them queued for `grade_worker` like any other job.
+A chunk that fails is reported as `error` items and the stream goes on, so it
+always ends with the summary line.
+"""
+import codecs
+import json
+import logging
+import os
+import re
+import socket
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .answer_keys import get_answer_keys
+from .models import Answer, Exam, GradingJob, Submission
+from .routers import pin_to_primary
+from .serializers import BulkSubmissionItemSerializer
+from .services import GradingQueue, SubmissionService, SubmissionValidationError
+
+logger = logging.getLogger(__name__)
+
+
+class BulkPayloadError(ValueError):
+    pass
+
+
+# Characters that change the nesting depth or open a string, outside strings
+_STRUCTURAL = re.compile(r'[{}\[\]"]')
+# Characters that end or escape inside a string
+_STRING_SPECIAL = re.compile(r'["\\]')
+# A top-level number or literal runs up to the next delimiter
+_SCALAR = re.compile(r'[^\s,{}\[\]"]*')
+
+
+def iter_json_items(stream, read_size=64 * 1024, max_item_size=8 * 1024 * 1024):
+    """
+    Yield objects from a byte stream holding either a JSON array of objects
+    or concatenated/NDJSON objects, reading `read_size` bytes at a time.
+    A single value larger than `max_item_size` characters is rejected so a
+    malformed body cannot make the buffer grow without bound.
+
+    Each value is first scanned for its end (nesting depth and string state
+    carry over between reads, so no character is scanned twice) and then
+    decoded once: the cost is linear in the body size however the values are
+    split across reads. Array items must be separated by commas.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer, pos = '', 0
+    consumed = 0  # characters dropped from the front of `buffer`, for error positions
+    in_array = None
+    after_item = False  # in an array: the next character must be ',' or ']'
+    seen_item = False
+    eof = False
+
+    def read_more():
+        nonlocal buffer, pos, consumed, eof
+        # Drop what has been consumed (at most once per value: `pos` is the value's start)
+        if pos:
+            consumed += pos
+            buffer, pos = buffer[pos:], 0
+        block = stream.read(read_size)
+        if block:
+            buffer += utf8.decode(block)
+        else:
+            eof = True
+            buffer += utf8.decode(b'', final=True)
+
+    while True:
+        while pos < len(buffer) and buffer[pos].isspace():
+            pos += 1
+        if pos == len(buffer):
+            if not eof:
+                read_more()
+                continue
+            if in_array:
+                raise BulkPayloadError("Unterminated JSON array")
+            return
+
+        char = buffer[pos]
+        if in_array is None:
+            in_array = char == '['
+            if in_array:
+                pos += 1
+                continue
+        if in_array:
+            if char == ']' and (after_item or not seen_item):
+                return
+            if after_item:
+                if char != ',':
+                    raise BulkPayloadError(f"Expected ',' or ']' at character {consumed + pos}")
+                pos += 1
+                after_item = False
+                continue
+
+        state = [0, 0, False]
+        while _value_end(buffer, pos, state) is None and not eof:
+            if len(buffer) - pos > max_item_size:
+                raise BulkPayloadError(f"Item exceeds {max_item_size} characters")
+            read_more()
+        try:
+            obj, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as exc:
+            raise BulkPayloadError(f"Malformed JSON at character {consumed + exc.pos}: {exc.msg}")
+        yield obj
+        after_item = in_array
+        seen_item = True
+
+
+def _value_end(buffer, start, state):
+    """
+    Index just past the JSON value starting at `buffer[start]`, or None if the
+    buffer ends first. `state` ([offset from start, depth, in string]) keeps the
+    scan position between calls, so a value arriving over many reads is scanned
+    once. Only finds where the value ends; the decoder validates it.
+    """
+    offset, depth, in_string = state
+    index, size = start + offset, len(buffer)
+    if buffer[start] not in '{["':
+        end = _SCALAR.match(buffer, index).end()
+        if end < size:
+            return end
+        state[0] = end - start
+        return None
+    while index < size:
+        if in_string:
+            match = _STRING_SPECIAL.search(buffer, index)
+            if match is None:
+                index = size
+            elif match.group() == '\\':
+                if match.end() == size:
+                    index = match.start()  # the escaped character has not arrived yet
+                    break
+                index = match.end() + 1
+            else:
+                in_string, index = False, match.end()
+                if not depth:
+                    return index
+        else:
+            match = _STRUCTURAL.search(buffer, index)
+            if match is None:
+                index = size
+                break
+            char, index = match.group(), match.end()
+            if char == '"':
+                in_string = True
+            elif char in '{[':
+                depth += 1
+            else:
+                depth -= 1
+                if not depth:
+                    return index
+    state[:] = [index - start, depth, in_string]
+    return None
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class BulkSubmissionProcessor:
+    """Turns a stream of raw submission dicts into a stream of per-item result dicts."""
+
+    def __init__(self, chunk_size=None, grading_mode=None):
+        self.chunk_size = chunk_size or settings.BULK_SUBMIT_CHUNK_SIZE
+        self.grading_mode = grading_mode or settings.GRADING_MODE
+        self.totals = {'created': 0, 'duplicate': 0, 'invalid': 0, 'error': 0}
+
+    def process(self, items):
+        payload_errors = []
+
+        def until_malformed():
+            # Items parsed before a syntax error are still processed; the error is reported last.
+            try:
+                yield from items
+            except BulkPayloadError as exc:
+                payload_errors.append(exc)
+
+        for chunk in _chunks(enumerate(until_malformed()), self.chunk_size):
+            totals = dict(self.totals)
+            try:
+                results = self.process_chunk(chunk)
+            except Exception:
+                logger.exception("Bulk submission chunk of %d items failed", len(chunk))
+                self.totals = totals
+                # Submissions already created by this chunk are reported as duplicates when resent
+                results = [
+                    self._result(index, 'error', errors={'non_field_errors': ["Processing failed, please resend."]})
+                    for index, _ in chunk
+                ]
+            yield from results
+        for exc in payload_errors:
+            yield self._result(None, 'invalid', errors={'body': [str(exc)]})
+
+    def _result(self, index, status, **extra):
+        self.totals[status] += 1
+        return {'index': index, 'status': status, **extra}
+
+    def process_chunk(self, chunk):
+        results = {}
+        valid = []
+        for index, raw in chunk:
+            serializer = BulkSubmissionItemSerializer(data=raw) if isinstance(raw, dict) else None
+            if serializer is None or not serializer.is_valid():
+                errors = serializer.errors if serializer is not None else {'non_field_errors': ["Expected an object."]}
+                results[index] = self._result(index, 'invalid', errors=errors)
+            else:
+                valid.append((index, serializer.validated_data))
+
+        exam_ids = {data['exam_id'] for _, data in valid}
+        student_ids = {data['student_id'] for _, data in valid}
+        existing_exams = set(Exam.objects.filter(id__in=exam_ids).values_list('id', flat=True))
+        active_students = set(User.objects.filter(id__in=student_ids, is_active=True).values_list('id', flat=True))
+        answer_keys = get_answer_keys(existing_exams)
+        option_questions = SubmissionService.load_option_questions(data['answers'] for _, data in valid)
+        already_submitted = set(
+            Submission.objects.filter(student_id__in=student_ids, exam_id__in=exam_ids)
+            .values_list('student_id', 'exam_id')
+        )
+
+        now = timezone.now()
+        # Earlier chunks are committed, so `already_submitted` covers them; this covers repeats within the chunk.
+        seen = set()
+        pending = []  # (index, Submission, [Answer])
+        for index, data in valid:
+            pair = (data['student_id'], data['exam_id'])
+            if data['exam_id'] not in existing_exams:
+                results[index] = self._result(index, 'invalid', errors={'exam_id': [f"Exam {data['exam_id']} does not exist"]})
+                continue
+            if data['student_id'] not in active_students:
+                results[index] = self._result(index, 'invalid', errors={'student_id': [f"Student {data['student_id']} does not exist"]})
+                continue
+            if pair in already_submitted or pair in seen:
+                results[index] = self._result(index, 'duplicate', errors={'non_field_errors': ["Already submitted."]})
+                continue
+            try:
+                answers = SubmissionService.build_answers(
+                    data['exam_id'], data['answers'],
+                    answer_key=answer_keys[data['exam_id']], option_questions=option_questions,
+                )
+            except SubmissionValidationError as exc:
+                results[index] = self._result(index, 'invalid', errors={'answers': [exc.message]})
+                continue
+            seen.add(pair)
+            submission = Submission(
+                student_id=data['student_id'],
+                exam_id=data['exam_id'],
+                status='SUBMITTED',
+                submitted_at=data.get('submitted_at') or now,
+            )
+            pending.append((index, submission, answers))
+
+        created, jobs = self._insert(pending, results)
+        if created:
+            submission_ids = [submission.id for _, submission, _ in created]
+            pin_to_primary(*{submission.student_id for _, submission, _ in created})
+            scores = {}
+            if self.grading_mode != 'async':
+                GradingQueue.process(jobs)
+                scores = dict(
+                    Submission.objects.filter(id__in=submission_ids, status='GRADED').values_list('id', 'score')
+                )
+            for index, submission, _ in created:
+                results[index] = self._result(
+                    index, 'created', submission_id=submission.id, score=scores.get(submission.id),
+                    submission_status='GRADED' if submission.id in scores else 'SUBMITTED',
+                )
+
+        return [results[index] for index, _ in chunk]
+
+    def _insert(self, pending, results):
+        """
+        Insert the chunk and its grading jobs in one transaction; on a constraint race fall back
+        to per-item savepoints. Returns the created entries and their jobs.
+        """
+        if not pending:
+            return [], []
+        try:
+            with transaction.atomic():
+                return pending, self._bulk_insert(pending)
+        except IntegrityError:
+            pass
+
+        created, jobs = [], []
+        for entry in pending:
+            index, submission, answers = entry
+            # Forget ids assigned by the rolled-back attempt
+            submission.pk = None
+            for answer in answers:
+                answer.pk = None
+            try:
+                with transaction.atomic():
+                    jobs += self._bulk_insert([entry])
+                created.append(entry)
+            except IntegrityError:
+                results[index] = self._result(index, 'duplicate', errors={'non_field_errors': ["Already submitted."]})
+        return created, jobs
+
+    def _bulk_insert(self, pending):
+        Submission.objects.bulk_create([submission for _, submission, _ in pending])
+        answers = []
+        for _, submission, submission_answers in pending:
+            for answer in submission_answers:
+                answer.submission = submission
+                answers.append(answer)
+        Answer.objects.bulk_create(answers, batch_size=settings.BULK_SUBMIT_ANSWER_BATCH_SIZE)
+        if self.grading_mode == 'async':
+            jobs = [GradingJob(submission_id=submission.id) for _, submission, _ in pending]
+        else:
+            # Claimed at creation, as GradingQueue.claim would: graded by this request right after the commit
+            locked_at, locked_by = timezone.now(), _worker_id()
+            jobs = [
+                GradingJob(submission_id=submission.id, status='RUNNING', attempts=1, locked_at=locked_at, locked_by=locked_by)
+                for _, submission, _ in pending
+            ]
+        return GradingJob.objects.bulk_create(jobs)
+
+
+def _worker_id():
+    return f"bulk:{socket.gethostname()}:{os.getpid()}"
@@ -0,0 +1,77 @@
+"""
+Per-exam content versions.
+
+Anything derived from an exam's content (answer keys, rendered payloads) is
+cached under a key that embeds the exam's current version. Changing the
+content bumps the version, so stale entries are never read again and simply
+age out of the cache - no key enumeration or explicit deletes are needed.
+
+Versions are random-ish tokens (nanosecond timestamps) rather than counters so
+that a version key evicted from the cache can never be re-created with a value
+that collides with an older, still-cached entry.
+
+Only existing exams get a version: views that take an exam id from the URL
+check `peek_exam_version` first and the database on a miss, and deleting an
+exam drops its version.
+"""
+import time
+
+from django.core.cache import cache
+
+VERSION_KEY = 'exam-version:{}'
+
+
+def _new_version():
+    return str(time.time_ns())
+
+
+def get_exam_versions(exam_ids):
+    """Return {exam_id: version} for `exam_ids`, creating versions for unseen exams."""
+    keys = {VERSION_KEY.format(exam_id): exam_id for exam_id in exam_ids}
+    found = cache.get_many(keys)
+    versions = {keys[key]: version for key, version in found.items()}
+
+    for key, exam_id in keys.items():
+        if exam_id not in versions:
+            # add() is atomic: if another process created the version first, use theirs.
+            cache.add(key, _new_version(), timeout=None)
+            versions[exam_id] = cache.get(key)
+    return versions
+
+
+def get_exam_version(exam_id):
+    return get_exam_versions([exam_id])[exam_id]
+
+
+def peek_exam_version(exam_id):
+    """The exam's cached version, or None; never creates one."""
+    return cache.get(VERSION_KEY.format(exam_id))
+
+
+async def apeek_exam_version(exam_id):
+    return await cache.aget(VERSION_KEY.format(exam_id))
+
+
+async def aget_exam_versions(exam_ids):
+    """Async `get_exam_versions` (for the ASGI views)."""
+    keys = {VERSION_KEY.format(exam_id): exam_id for exam_id in exam_ids}
+    found = await cache.aget_many(keys)
+    versions = {keys[key]: version for key, version in found.items()}
+
+    for key, exam_id in keys.items():
+        if exam_id not in versions:
+            await cache.aadd(key, _new_version(), timeout=None)
+            versions[exam_id] = await cache.aget(key)
+    return versions
+
+
+def bump_exam_versions(exam_ids):
+    """Invalidate everything cached for these exams."""
+    if exam_ids:
+        version = _new_version()
+        cache.set_many({VERSION_KEY.format(exam_id): version for exam_id in exam_ids}, timeout=None)
+
+
+def forget_exam_versions(exam_ids):
+    """Drop the versions of deleted exams (their cached content ages out)."""
+    cache.delete_many([VERSION_KEY.format(exam_id) for exam_id in exam_ids])
@@ -0,0 +1,49 @@
+"""
+System checks for deployment settings the code relies on.
+
+Answer keys and rendered payloads are cached under per-exam content versions
+that are themselves kept in the cache (core/caching.py). A content change bumps
+the exam's version (core/signals.py); nothing is deleted, so every process must
+share the version counters. With a per-process cache (LocMemCache) the bump
+only reaches the process that made it; every other worker keeps its own version
+and serves the stale exam and answer key until that entry is evicted. Autosaved
+drafts (core/drafts.py) live only in the cache until the `sweep_deadlines`
+process flushes them, so that process must see the web processes' cache too.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+PER_PROCESS_CACHES = (LocMemCache, DummyCache)
+
+
+def cache_is_shared(alias='default'):
+    """Whether every process sees the same entries in this cache (Redis, Memcached, database, ...)."""
+    return not isinstance(caches[alias], PER_PROCESS_CACHES)
+
+
+@register(Tags.caches)
+def check_cache_is_shared(app_configs, **kwargs):
+    if settings.WEB_CONCURRENCY <= 1 or cache_is_shared():
+        return []
+    return [Error(
+        f"CACHES['default'] uses the per-process {settings.CACHES['default']['BACKEND']} with "
+        f"WEB_CONCURRENCY={settings.WEB_CONCURRENCY} workers: a bumped exam version would only reach one of them.",
+        hint="Set CACHE_BACKEND/CACHE_LOCATION to a shared cache, e.g. "
+             "django.core.cache.backends.redis.RedisCache and redis://localhost:6379/0.",
+        id='core.E001',
+    )]
+
+
+@register(Tags.caches, deploy=True)
+def check_draft_cache_is_shared(app_configs, **kwargs):
+    if cache_is_shared():
+        return []
+    return [Error(
+        f"CACHES['default'] uses the per-process {settings.CACHES['default']['BACKEND']}: autosaved drafts "
+        "are flushed by the sweep_deadlines process, which cannot see them, and would be lost.",
+        hint="Set CACHE_BACKEND/CACHE_LOCATION to a cache shared by the web and sweep_deadlines processes.",
+        id='core.E002',
+    )]
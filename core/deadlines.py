@@ -0,0 +1,89 @@
+"""
+Exam deadlines.
+
+The first autosave (core/drafts.py) creates the student's `IN_PROGRESS`
+submission with `deadline_at = now + Exam.duration_minutes`. Requests never
+check for expired attempts on their own: saves and submits are refused once
+the deadline (plus `DEADLINE_GRACE_SECONDS` for in-flight requests) has
+passed, and `manage.py sweep_deadlines` closes whatever is left:
+
+1. Lock up to `batch_size` open attempts past the cutoff, oldest deadline first
+   (`SELECT ... FOR UPDATE SKIP LOCKED` on the partial
+   `submission_open_deadline_idx`, so parallel sweepers split the work).
+2. Flush their buffered drafts with one batched upsert, flip them to SUBMITTED
+   (submitted at the deadline) with one UPDATE and insert their grading jobs
+   with one INSERT - all in the same transaction, so no attempt can be left
+   SUBMITTED without a job.
+3. In async mode the jobs are PENDING for `grade_worker`. In sync mode they
+   are inserted already claimed by the sweeper (RUNNING), which grades the batch
+   set-based right away through `GradingQueue.process`; if the sweeper dies
+   before that, `grade_worker` requeues them as stale.
+
+Batches repeat until nothing is left, so a whole cohort expiring in the same
+second costs a handful of queries per `batch_size` attempts.
+"""
+import os
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .drafts import discard_draft, read_drafts, write_drafts
+from .models import GradingJob, Submission
+from .services import GradingQueue
+
+
+def sweep_expired(batch_size=None, now=None):
+    """Submit and grade every attempt past its deadline; returns the number of attempts closed."""
+    batch_size = batch_size or settings.DEADLINE_SWEEP_BATCH_SIZE
+    total = 0
+    while True:
+        closed = sweep_batch(batch_size, now)
+        total += closed
+        if closed < batch_size:
+            return total
+
+
+def sweep_batch(batch_size, now=None):
+    """Close one batch of expired attempts (see the module docstring); returns its size."""
+    cutoff = (now or timezone.now()) - timedelta(seconds=settings.DEADLINE_GRACE_SECONDS)
+    grading_async = settings.GRADING_MODE == 'async'
+    with transaction.atomic():
+        rows = list(
+            Submission.objects.select_for_update(skip_locked=True)
+            .filter(status='IN_PROGRESS', deadline_at__lte=cutoff)
+            .order_by('deadline_at', 'id')
+            .values_list('id', 'student_id', 'exam_id')[:batch_size]
+        )
+        if not rows:
+            return 0
+        submission_ids = [submission_id for submission_id, _, _ in rows]
+        pairs = [(student_id, exam_id) for _, student_id, exam_id in rows]
+
+        # The rows are locked and IN_PROGRESS: their buffered answers go out with the status flip
+        write_drafts(pairs, read_drafts(pairs), set(submission_ids))
+        Submission.objects.filter(id__in=submission_ids).update(status='SUBMITTED', submitted_at=F('deadline_at'))
+        if grading_async:
+            jobs = [GradingJob(submission_id=submission_id) for submission_id in submission_ids]
+        else:
+            # Claimed at creation, as GradingQueue.claim would: nobody else grades them meanwhile
+            locked_at, locked_by = timezone.now(), _worker_id()
+            jobs = [
+                GradingJob(submission_id=submission_id, status='RUNNING', attempts=1, locked_at=locked_at, locked_by=locked_by)
+                for submission_id in submission_ids
+            ]
+        jobs = GradingJob.objects.bulk_create(jobs)
+
+    for pair in pairs:
+        discard_draft(*pair)
+    if not grading_async:
+        # Failures are retried with backoff by `grade_worker`; the attempts are closed either way
+        GradingQueue.process(jobs)
+    return len(rows)
+
+
+def _worker_id():
+    return f"sweeper:{socket.gethostname()}:{os.getpid()}"
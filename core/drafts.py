@@ -0,0 +1,238 @@
+"""
+Autosave of in-progress answers (drafts).
+
+`PUT /api/exams/<id>/draft/` stores the student's current answers while the
+exam is running. The first save creates the student's `IN_PROGRESS`
+submission; after that, saves only touch the cache:
+
+- The draft (submission id + {question_id: [option_id, text]}) lives in the
+  cache under `draft:<student>:<exam>` for `DRAFT_BUFFER_TIMEOUT` seconds and is
+  merged in place by every save, so any number of saves costs no row writes.
+- A draft that becomes dirty is registered once in the current time bucket
+  (`DRAFT_FLUSH_INTERVAL` seconds wide) through an atomic `incr` slot counter.
+- Once a bucket is over (plus one bucket of grace for in-flight saves), the
+  background loop of `manage.py sweep_deadlines` claims it with `cache.add` and
+  flushes every draft in it with one batched upsert (`INSERT ... ON CONFLICT
+  (submission, question) DO UPDATE`). Saves never write rows themselves.
+
+So each student causes at most one round of answer writes per interval,
+batched with everyone else's. Final submit upserts the latest buffered answers
+together with the submitted ones, flips the status and grades
+(`SubmissionService.store_submission`). If the cache loses a draft, the answers
+flushed so far are read back from the database.
+
+The web processes and the sweeper must share the cache (Redis, Memcached): a
+per-process LocMemCache is invisible to the sweeper and evicts drafts, dirty
+marks and bucket slots past its `MAX_ENTRIES`. `manage.py check --deploy`
+fails on such a cache (core.E002).
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Answer, Exam, Submission
+
+DRAFT_KEY = 'draft:{}:{}'
+DIRTY_KEY = 'draft-dirty:{}:{}'
+BUCKET_COUNT_KEY = 'draft-bucket:{}'
+BUCKET_SLOT_KEY = 'draft-bucket:{}:{}'
+FLUSH_CLAIM_KEY = 'draft-flush:{}'
+FLUSH_CURSOR_KEY = 'draft-flush-cursor'
+
+# Buckets that can still be flushed late (after a quiet period); older dirty marks expire
+MAX_FLUSH_LOOKBACK = 360
+UPSERT_BATCH_SIZE = 1000
+
+
+class DraftClosed(Exception):
+    """The attempt can no longer be changed: already submitted, or past its deadline."""
+
+    def __init__(self, message="You have already submitted this exam."):
+        super().__init__(message)
+        self.message = message
+
+
+def is_expired(draft, now=None):
+    """Past the attempt's deadline plus `DEADLINE_GRACE_SECONDS` (the sweeper closes it from then on)."""
+    deadline = draft.get('deadline')
+    return deadline is not None and (now or time.time()) > deadline + settings.DEADLINE_GRACE_SECONDS
+
+
+def _bucket():
+    return int(time.time() // settings.DRAFT_FLUSH_INTERVAL)
+
+
+def _horizon():
+    return settings.DRAFT_FLUSH_INTERVAL * (MAX_FLUSH_LOOKBACK + 2)
+
+
+def _store(student_id, exam_id, draft):
+    cache.set(DRAFT_KEY.format(student_id, exam_id), draft, timeout=settings.DRAFT_BUFFER_TIMEOUT)
+
+
+def get_cached_draft(student_id, exam_id):
+    return cache.get(DRAFT_KEY.format(student_id, exam_id))
+
+
+def find_draft(student_id, exam_id):
+    """The student's draft for the exam, from the cache or else the database; None if there is none."""
+    draft = get_cached_draft(student_id, exam_id)
+    if draft is not None:
+        return draft
+    row = (
+        Submission.objects.filter(student_id=student_id, exam_id=exam_id, status='IN_PROGRESS')
+        .values_list('id', 'deadline_at').first()
+    )
+    if row is None:
+        return None
+    submission_id, deadline_at = row
+    rows = Answer.objects.filter(submission_id=submission_id).values_list(
+        'question_id', 'selected_option_id', 'text_answer'
+    )
+    draft = _new_draft(submission_id, deadline_at)
+    draft['answers'] = {question_id: [option, text] for question_id, option, text in rows}
+    _store(student_id, exam_id, draft)
+    return draft
+
+
+def _new_draft(submission_id, deadline_at):
+    return {'submission': submission_id, 'deadline': deadline_at.timestamp() if deadline_at else None, 'answers': {}}
+
+
+def save_draft(student_id, exam_id, answers):
+    """
+    Merge validated, unsaved `Answer`s into the student's draft. Creates the
+    IN_PROGRESS submission (deadline: now + the exam's duration) on the first save;
+    raises DraftClosed once submitted or past the deadline.
+    """
+    draft = find_draft(student_id, exam_id)
+    if draft is None:
+        duration = Exam.objects.filter(id=exam_id).values_list('duration_minutes', flat=True).get()
+        now = timezone.now()
+        submission, _ = Submission.objects.get_or_create(
+            student_id=student_id, exam_id=exam_id,
+            defaults={'status': 'IN_PROGRESS', 'deadline_at': now + timedelta(minutes=duration)},
+        )
+        if submission.status != 'IN_PROGRESS':
+            raise DraftClosed()
+        draft = _new_draft(submission.id, submission.deadline_at)
+    if is_expired(draft):
+        raise DraftClosed("The time for this exam is over.")
+
+    for answer in answers:
+        draft['answers'][answer.question_id] = [answer.selected_option_id, answer.text_answer]
+    _store(student_id, exam_id, draft)
+    _mark_dirty(student_id, exam_id)
+    return draft
+
+
+def discard_draft(student_id, exam_id):
+    cache.delete_many([DRAFT_KEY.format(student_id, exam_id), DIRTY_KEY.format(student_id, exam_id)])
+
+
+def draft_answers(draft):
+    """Unsaved `Answer`s for everything in the draft."""
+    return [
+        Answer(submission_id=draft['submission'], question_id=question_id, selected_option_id=option, text_answer=text)
+        for question_id, (option, text) in draft['answers'].items()
+    ]
+
+
+def upsert_answers(answers):
+    """Insert or update answers on the unique (submission, question) pair."""
+    return Answer.objects.bulk_create(
+        answers, batch_size=UPSERT_BATCH_SIZE,
+        update_conflicts=True, unique_fields=['submission', 'question'],
+        update_fields=['selected_option', 'text_answer'],
+    )
+
+
+def _mark_dirty(student_id, exam_id):
+    bucket = _bucket()
+    # add() succeeds only on the clean -> dirty transition: one registration per flush round
+    if cache.add(DIRTY_KEY.format(student_id, exam_id), bucket, timeout=_horizon()):
+        count_key = BUCKET_COUNT_KEY.format(bucket)
+        cache.add(count_key, 0, timeout=_horizon())
+        slot = cache.incr(count_key)
+        cache.set(BUCKET_SLOT_KEY.format(bucket, slot), (student_id, exam_id), timeout=_horizon())
+
+
+def flush_due_drafts():
+    """
+    Flush every finished bucket nobody has claimed yet; returns the number of drafts written.
+    Called by the `sweep_deadlines` loop; concurrent callers split the buckets between them.
+    """
+    due = _bucket() - 2  # the previous bucket may still receive in-flight registrations
+    cursor = cache.get(FLUSH_CURSOR_KEY)
+    start = due if cursor is None else max(cursor + 1, due - MAX_FLUSH_LOOKBACK + 1)
+    if start > due:
+        return 0
+    cache.set(FLUSH_CURSOR_KEY, due, timeout=None)
+
+    flushed = 0
+    for bucket in range(start, due + 1):
+        if cache.add(FLUSH_CLAIM_KEY.format(bucket), 1, timeout=_horizon()):
+            flushed += flush_bucket(bucket)
+    return flushed
+
+
+def flush_bucket(bucket):
+    count = cache.get(BUCKET_COUNT_KEY.format(bucket)) or 0
+    if not count:
+        return 0
+    slots = cache.get_many([BUCKET_SLOT_KEY.format(bucket, slot) for slot in range(1, count + 1)])
+    return flush_drafts(slots.values())
+
+
+def flush_drafts(pairs):
+    """
+    Write the buffered drafts of these (student_id, exam_id) pairs in one batched upsert.
+
+    The submissions are locked and only those still IN_PROGRESS are written, so a draft
+    read just before a final submit cannot overwrite the submitted answers.
+    """
+    pairs = set(pairs)
+    drafts = read_drafts(pairs)
+    with transaction.atomic():
+        open_ids = set(
+            Submission.objects.select_for_update()
+            .filter(id__in=[draft['submission'] for draft in drafts.values()], status='IN_PROGRESS')
+            .order_by('id').values_list('id', flat=True)
+        ) if drafts else set()
+        return write_drafts(pairs, drafts, open_ids)
+
+
+def read_drafts(pairs):
+    return cache.get_many([DRAFT_KEY.format(*pair) for pair in pairs])
+
+
+def write_drafts(pairs, drafts, open_ids):
+    """
+    Upsert the `drafts` read for `pairs` whose submission is in `open_ids`, IN_PROGRESS
+    rows the caller has locked in its transaction. The dirty marks are cleared once that
+    transaction commits (see `_mark_flushed`); returns the number of drafts written.
+    """
+    drafts_to_write = [draft for draft in drafts.values() if draft['submission'] in open_ids]
+    answers = [answer for draft in drafts_to_write for answer in draft_answers(draft)]
+    if answers:
+        upsert_answers(answers)
+    transaction.on_commit(lambda: _mark_flushed(pairs, drafts))
+    return len(drafts_to_write)
+
+
+def _mark_flushed(pairs, flushed):
+    """
+    Clear the dirty marks of a committed flush. A save racing with it found its draft
+    still marked and did not register it, so drafts that changed since they were read
+    are registered again for the next round.
+    """
+    cache.delete_many([DIRTY_KEY.format(*pair) for pair in pairs])
+    current = cache.get_many([DRAFT_KEY.format(*pair) for pair in pairs])
+    for pair in pairs:
+        key = DRAFT_KEY.format(*pair)
+        if key in current and current[key] != flushed.get(key):
+            _mark_dirty(*pair)
@@ -0,0 +1,361 @@
+"""
+Bulk exam import/export (question banks, platform migrations).
+
+File format: JSON lines. The first line is a header,
+`{"format": "mini-assessment-exams", "version": 1}`; every following line is
+one exam with its questions inline:
+
+    {"title": "...", "course": "...", "description": "", "duration_minutes": 30,
+     "metadata": {}, "questions": [
+        {"ref": "q1", "text": "...", "question_type": "MCQ", "expected_answer": "",
+         "order": 1, "options": [{"text": "...", "is_correct": true}]},
+        {"ref": "q7", "order": 2}]}
+
+A question with a `ref` can be reused by later exams with just `{"ref", "order"}`;
+refs only need to be unique within one file. The importer streams the input
+twice: the first pass validates every line without writing anything (errors
+name the failing line), the second loads it in chunks of about
+`EXAM_IMPORT_CHUNK_SIZE` questions and resolves all foreign keys in memory.
+Unseekable input (stdin) is spooled to a temporary file first. Each chunk is
+written in its own transaction with one `bulk_create` per table, or on
+PostgreSQL with `COPY` after reserving the exam/question ids from their
+sequences. So an invalid file imports nothing, but a database error during the
+second pass leaves the chunks before it committed; the error names the first
+line that was not imported, and re-running the whole file would duplicate the
+exams before it.
+"""
+import csv
+import io
+import json
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from .bulk import BulkPayloadError, iter_json_items
+from .caching import bump_exam_versions
+from .models import Exam, ExamQuestion, Question, QuestionOption
+
+FORMAT_NAME = 'mini-assessment-exams'
+FORMAT_VERSION = 1
+METHODS = ('auto', 'bulk', 'copy')
+# Unseekable input is spooled in memory up to this size, then to a temporary file
+SPOOL_MEMORY_SIZE = 16 * 1024 * 1024
+
+
+class ExamImportError(ValueError):
+    pass
+
+
+def _text(data, field, where, max_length=None, required=True):
+    value = data.get(field, '')
+    if not isinstance(value, str) or (required and not value.strip()):
+        raise ExamImportError(f"{where}: '{field}' must be a non-empty string")
+    if max_length and len(value) > max_length:
+        raise ExamImportError(f"{where}: '{field}' is longer than {max_length} characters")
+    return value
+
+
+def _positive_int(data, field, where, default=None):
+    value = data.get(field, default)
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise ExamImportError(f"{where}: '{field}' must be a positive integer")
+    return value
+
+
+class ExamImporter:
+    def __init__(self, chunk_size=None, method='auto', progress=None):
+        if method not in METHODS:
+            raise ExamImportError(f"method must be one of {METHODS}")
+        if method == 'copy' and connection.vendor != 'postgresql':
+            raise ExamImportError("COPY loading requires PostgreSQL")
+        if method == 'auto':
+            method = 'copy' if connection.vendor == 'postgresql' else 'bulk'
+        self.method = method
+        self.chunk_size = chunk_size or settings.EXAM_IMPORT_CHUNK_SIZE
+        self.progress = progress
+        self.question_refs = {}  # ref -> question id, for questions already written
+        self._defined_refs = set()  # every ref seen so far (validated, maybe not written yet)
+        self.totals = {'exams': 0, 'questions': 0, 'options': 0}
+
+    def run(self, stream):
+        """Validate the whole stream, then load it (see the module docstring); returns the totals."""
+        source = _rewindable(stream)
+        try:
+            start = source.tell()
+            self._read(source, load=False)
+            source.seek(start)
+            self._defined_refs = set()
+            self._read(source, load=True)
+        finally:
+            if source is not stream:
+                source.close()
+        return self.totals
+
+    def _read(self, stream, load):
+        items = iter_json_items(stream)
+        try:
+            self._check_header(next(items, None))
+            chunk, pending_questions = [], 0
+            for number, raw in enumerate(items, start=1):
+                # The header is line 1
+                exam = self._parse_exam(raw, f"Exam #{number} (line {number + 1})")
+                if not load:
+                    continue
+                chunk.append(exam)
+                pending_questions += len(exam['questions'])
+                if pending_questions >= self.chunk_size:
+                    self._load_chunk(chunk, first_line=number + 2 - len(chunk))
+                    chunk, pending_questions = [], 0
+            if chunk:
+                self._load_chunk(chunk, first_line=number + 2 - len(chunk))
+        except BulkPayloadError as exc:
+            raise ExamImportError(str(exc))
+
+    @staticmethod
+    def _check_header(header):
+        if not isinstance(header, dict) or header.get('format') != FORMAT_NAME:
+            raise ExamImportError(f"Missing '{FORMAT_NAME}' header line")
+        if header.get('version') != FORMAT_VERSION:
+            raise ExamImportError(f"Unsupported format version {header.get('version')!r} (expected {FORMAT_VERSION})")
+
+    def _parse_exam(self, raw, where):
+        if not isinstance(raw, dict):
+            raise ExamImportError(f"{where}: expected an object")
+        metadata = raw.get('metadata', {})
+        if not isinstance(metadata, dict):
+            raise ExamImportError(f"{where}: 'metadata' must be an object")
+        questions = raw.get('questions', [])
+        if not isinstance(questions, list):
+            raise ExamImportError(f"{where}: 'questions' must be a list")
+        exam = {
+            'title': _text(raw, 'title', where, max_length=255),
+            'course': _text(raw, 'course', where, max_length=255),
+            'description': _text(raw, 'description', where, required=False),
+            'duration_minutes': _positive_int(raw, 'duration_minutes', where),
+            'metadata': metadata,
+            'questions': [],
+        }
+        used_refs = set()
+        for position, question in enumerate(questions, start=1):
+            parsed = self._parse_question(question, f"{where}, question #{position}", position)
+            ref = parsed['ref']
+            if ref is not None:
+                if ref in used_refs:
+                    raise ExamImportError(f"{where}: question '{ref}' is listed twice")
+                used_refs.add(ref)
+            exam['questions'].append(parsed)
+        return exam
+
+    def _parse_question(self, raw, where, position):
+        if not isinstance(raw, dict):
+            raise ExamImportError(f"{where}: expected an object")
+        ref = raw.get('ref')
+        if ref is not None and not isinstance(ref, str):
+            raise ExamImportError(f"{where}: 'ref' must be a string")
+        order = _positive_int(raw, 'order', where, default=position)
+        if 'text' not in raw:
+            # Reference to a question defined earlier in the file
+            if ref is None or ref not in self._defined_refs:
+                raise ExamImportError(f"{where}: unknown question ref {ref!r}")
+            return {'ref': ref, 'order': order, 'new': False}
+
+        if ref is not None and ref in self._defined_refs:
+            raise ExamImportError(f"{where}: question ref '{ref}' is defined twice")
+        question_type = raw.get('question_type')
+        if question_type not in dict(Question.QUESTION_TYPES):
+            raise ExamImportError(f"{where}: 'question_type' must be one of {list(dict(Question.QUESTION_TYPES))}")
+        options = raw.get('options', [])
+        if not isinstance(options, list):
+            raise ExamImportError(f"{where}: 'options' must be a list")
+        parsed_options = []
+        for option in options:
+            if not isinstance(option, dict) or not isinstance(option.get('is_correct', False), bool):
+                raise ExamImportError(f"{where}: options must be objects with 'text' and boolean 'is_correct'")
+            parsed_options.append((_text(option, 'text', where, max_length=255), option.get('is_correct', False)))
+        if ref is not None:
+            self._defined_refs.add(ref)
+        return {
+            'ref': ref,
+            'order': order,
+            'new': True,
+            'text': _text(raw, 'text', where),
+            'question_type': question_type,
+            'expected_answer': _text(raw, 'expected_answer', where, required=False),
+            'options': parsed_options,
+        }
+
+    def _load_chunk(self, chunk, first_line):
+        new_questions = [q for exam in chunk for q in exam['questions'] if q['new']]
+        try:
+            with transaction.atomic():
+                if self.method == 'copy':
+                    exam_ids, question_ids = self._write_copy(chunk, new_questions)
+                else:
+                    exam_ids, question_ids = self._write_bulk(chunk, new_questions)
+                transaction.on_commit(lambda: bump_exam_versions(exam_ids))
+        except DatabaseError as exc:
+            raise ExamImportError(
+                f"Writing the exams from line {first_line} on failed ({exc}); the {self.totals['exams']} "
+                f"exams before line {first_line} were imported"
+            ) from exc
+
+        self.totals['exams'] += len(chunk)
+        self.totals['questions'] += len(new_questions)
+        self.totals['options'] += sum(len(q['options']) for q in new_questions)
+        if self.progress:
+            self.progress(self.totals)
+
+    def _links(self, chunk, exam_ids, new_questions, question_ids):
+        """
+        Record the chunk's new refs, then return (exam_id, question_id, order)
+        link rows and (question_id, text, is_correct) option rows.
+        """
+        new_ids = {id(question): question_id for question, question_id in zip(new_questions, question_ids)}
+        for question, question_id in zip(new_questions, question_ids):
+            if question['ref'] is not None:
+                self.question_refs[question['ref']] = question_id
+        links = []
+        for exam, exam_id in zip(chunk, exam_ids):
+            for question in exam['questions']:
+                question_id = new_ids[id(question)] if question['new'] else self.question_refs[question['ref']]
+                links.append((exam_id, question_id, question['order']))
+        options = [
+            (question_id, text, is_correct)
+            for question, question_id in zip(new_questions, question_ids)
+            for text, is_correct in question['options']
+        ]
+        return links, options
+
+    def _write_bulk(self, chunk, new_questions):
+        exams = Exam.objects.bulk_create(
+            Exam(**{field: exam[field] for field in ('title', 'course', 'description', 'duration_minutes', 'metadata')})
+            for exam in chunk
+        )
+        questions = Question.objects.bulk_create(
+            Question(text=q['text'], question_type=q['question_type'], expected_answer=q['expected_answer'])
+            for q in new_questions
+        )
+        exam_ids, question_ids = [e.id for e in exams], [q.id for q in questions]
+        links, options = self._links(chunk, exam_ids, new_questions, question_ids)
+        ExamQuestion.objects.bulk_create(
+            ExamQuestion(exam_id=exam_id, question_id=question_id, order=order) for exam_id, question_id, order in links
+        )
+        QuestionOption.objects.bulk_create(
+            QuestionOption(question_id=question_id, text=text, is_correct=is_correct)
+            for question_id, text, is_correct in options
+        )
+        return exam_ids, question_ids
+
+    def _write_copy(self, chunk, new_questions):
+        exam_ids = _reserve_ids(Exam, len(chunk))
+        question_ids = _reserve_ids(Question, len(new_questions))
+        now = timezone.now().isoformat()
+        _copy(Exam, ('id', 'title', 'course', 'description', 'duration_minutes', 'metadata', 'created_at'), (
+            (exam_id, e['title'], e['course'], e['description'], e['duration_minutes'], json.dumps(e['metadata']), now)
+            for e, exam_id in zip(chunk, exam_ids)
+        ))
+        _copy(Question, ('id', 'text', 'question_type', 'expected_answer'), (
+            (question_id, q['text'], q['question_type'], q['expected_answer'])
+            for q, question_id in zip(new_questions, question_ids)
+        ))
+        links, options = self._links(chunk, exam_ids, new_questions, question_ids)
+        _copy(ExamQuestion, ('exam_id', 'question_id', 'order'), links)
+        _copy(QuestionOption, ('question_id', 'text', 'is_correct'), options)
+        return exam_ids, question_ids
+
+
+def _rewindable(stream):
+    """The stream itself if it can seek back, otherwise a spooled copy of it (stdin, pipes)."""
+    if getattr(stream, 'seekable', lambda: False)():
+        return stream
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_SIZE)
+    shutil.copyfileobj(stream, spooled)
+    spooled.seek(0)
+    return spooled
+
+
+def _reserve_ids(model, count):
+    """Draw `count` ids from the table's sequence so rows can be COPYed with known keys (PostgreSQL)."""
+    if not count:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+            [model._meta.db_table, count],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _copy(model, columns, rows):
+    buffer = io.StringIO()
+    # Quote everything: in COPY's CSV format an unquoted empty value means NULL, "" an empty string
+    csv.writer(buffer, quoting=csv.QUOTE_ALL).writerows(rows)
+    if not buffer.tell():
+        return
+    buffer.seek(0)
+    quoted = ', '.join(connection.ops.quote_name(column) for column in columns)
+    sql = f"COPY {connection.ops.quote_name(model._meta.db_table)} ({quoted}) FROM STDIN WITH (FORMAT csv)"
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):  # psycopg2
+            raw.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+
+def export_exams(exam_ids=None, chunk_size=None):
+    """Yield the JSON lines of an export (header first). Three queries per chunk of exams."""
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    yield json.dumps({'format': FORMAT_NAME, 'version': FORMAT_VERSION}) + '\n'
+
+    exams = Exam.objects.order_by('id')
+    if exam_ids is not None:
+        exams = exams.filter(id__in=exam_ids)
+    rows = exams.values_list('id', 'title', 'course', 'description', 'duration_minutes', 'metadata')
+    emitted = set()  # questions already written in full; later exams reference them
+    chunk = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield from _export_chunk(chunk, emitted)
+            chunk = []
+    if chunk:
+        yield from _export_chunk(chunk, emitted)
+
+
+def _export_chunk(chunk, emitted):
+    exam_ids = [row[0] for row in chunk]
+    links = {}
+    for exam_id, question_id, order in (
+        ExamQuestion.objects.filter(exam_id__in=exam_ids).order_by('exam_id', 'order', 'id')
+        .values_list('exam_id', 'question_id', 'order')
+    ):
+        links.setdefault(exam_id, []).append((question_id, order))
+    new_ids = {question_id for exam_links in links.values() for question_id, _ in exam_links} - emitted
+    questions = {
+        question_id: {'text': text, 'question_type': question_type, 'expected_answer': expected_answer, 'options': []}
+        for question_id, text, question_type, expected_answer in Question.objects.filter(id__in=new_ids)
+        .values_list('id', 'text', 'question_type', 'expected_answer')
+    }
+    for question_id, text, is_correct in (
+        QuestionOption.objects.filter(question_id__in=new_ids).order_by('id')
+        .values_list('question_id', 'text', 'is_correct')
+    ):
+        questions[question_id]['options'].append({'text': text, 'is_correct': is_correct})
+
+    for exam_id, title, course, description, duration_minutes, metadata in chunk:
+        exam_questions = []
+        for question_id, order in links.get(exam_id, []):
+            entry = {'ref': f'q{question_id}', 'order': order}
+            if question_id not in emitted:
+                entry.update(questions[question_id])
+                emitted.add(question_id)
+            exam_questions.append(entry)
+        yield json.dumps({
+            'title': title, 'course': course, 'description': description,
+            'duration_minutes': duration_minutes, 'metadata': metadata, 'questions': exam_questions,
+        }) + '\n'
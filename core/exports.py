@@ -0,0 +1,111 @@
+"""
+Streaming export of exam results (gradebooks).
+
+Rows are read with server-side cursors (`.iterator(chunk_size=...)`) as plain
+tuples, rendered to CSV or NDJSON and optionally gzip-compressed on the fly,
+all as generators. Memory stays constant whatever the number of submissions
+and the first bytes go out as soon as the first chunk is fetched.
+Used by the staff export endpoint and `manage.py export_results`.
+"""
+import csv
+import io
+import json
+import zlib
+
+from django.conf import settings
+
+from .models import Answer, Submission
+
+FORMATS = ('csv', 'ndjson')
+LEVELS = ('submissions', 'answers')
+
+# (output column, ORM path)
+SUBMISSION_COLUMNS = (
+    ('submission_id', 'id'),
+    ('student_id', 'student_id'),
+    ('username', 'student__username'),
+    ('exam_id', 'exam_id'),
+    ('status', 'status'),
+    ('score', 'score'),
+    ('started_at', 'started_at'),
+    ('submitted_at', 'submitted_at'),
+)
+ANSWER_COLUMNS = (
+    ('submission_id', 'submission_id'),
+    ('student_id', 'submission__student_id'),
+    ('username', 'submission__student__username'),
+    ('question_id', 'question_id'),
+    ('question_type', 'question__question_type'),
+    ('selected_option_id', 'selected_option_id'),
+    ('text_answer', 'text_answer'),
+    ('is_correct', 'is_correct'),
+)
+
+# Flush rendered rows in blocks of roughly this many bytes
+BLOCK_SIZE = 64 * 1024
+
+
+def iter_result_rows(exam_id, level='submissions', chunk_size=None):
+    """Return (header, row iterator) for an exam's submissions or per-question answers."""
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    if level == 'answers':
+        columns = ANSWER_COLUMNS
+        queryset = Answer.objects.filter(submission__exam_id=exam_id).order_by('submission_id', 'id')
+    else:
+        columns = SUBMISSION_COLUMNS
+        queryset = Submission.objects.filter(exam_id=exam_id).order_by('id')
+    header = [name for name, _ in columns]
+    rows = queryset.values_list(*[path for _, path in columns]).iterator(chunk_size=chunk_size)
+    return header, rows
+
+
+def _format_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def render_csv(header, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow([_format_value(value) for value in row])
+        if buffer.tell() >= BLOCK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def render_ndjson(header, rows):
+    block = []
+    size = 0
+    for row in rows:
+        line = json.dumps(dict(zip(header, map(_format_value, row)))) + '\n'
+        block.append(line)
+        size += len(line)
+        if size >= BLOCK_SIZE:
+            yield ''.join(block).encode()
+            block, size = [], 0
+    yield ''.join(block).encode()
+
+
+def gzip_stream(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_results(exam_id, output='csv', level='submissions', compress=False, chunk_size=None):
+    """Byte chunks of the rendered export."""
+    header, rows = iter_result_rows(exam_id, level, chunk_size)
+    chunks = render_ndjson(header, rows) if output == 'ndjson' else render_csv(header, rows)
+    return gzip_stream(chunks) if compress else chunks
+
+
+def export_filename(exam_id, output='csv', level='submissions', compress=False):
+    return f"exam-{exam_id}-{level}.{output}" + ('.gz' if compress else '')
@@ -0,0 +1,228 @@
+"""
+Classical item analysis (question quality) for an exam.
+
+The graded responses are loaded with `values_list` in server-side cursor
+chunks straight into dense NumPy arrays - a students x questions matrix of
+0/1 verdicts plus the selected option per cell - and every statistic is
+computed with whole-array operations:
+
+- difficulty: share of students answering the item correctly (p-value)
+- discrimination: point-biserial correlation of the item with Submission.score
+- item-rest correlation: the same against the raw total without the item itself
+- Cronbach's alpha for the whole exam
+- distractor analysis: how often each MCQ option was picked and the mean
+  score of the students who picked it
+
+Unanswered questions count as incorrect. Used by `manage.py item_analysis`
+and the staff `GET /api/exams/{id}/item-analysis/` endpoint.
+"""
+import math
+
+import numpy as np
+from django.conf import settings
+
+from .models import Answer, ExamQuestion, QuestionOption, Submission
+
+NO_OPTION = -1
+
+
+class ResponseMatrix:
+    """
+    Dense response data for one exam.
+
+    `question_ids`    (k,) question ids in exam order
+    `question_types`  list of k question types
+    `scores`          (n,) Submission.score of every graded submission
+    `correct`         (n, k) 1.0 where the answer was correct, else 0.0
+    `option_ids`      (m,) ids of the options of the exam's MCQ questions
+    `option_items`    (m,) column of each option's question
+    `option_correct`  (m,) whether the option is a correct one
+    `choices`         (n, k) index into `option_ids` of the picked option, or -1
+    """
+    __slots__ = (
+        'exam_id', 'question_ids', 'question_types', 'scores', 'correct',
+        'option_ids', 'option_items', 'option_correct', 'choices',
+    )
+
+    def __init__(self, exam_id, question_ids, question_types, scores, correct,
+                 option_ids, option_items, option_correct, choices):
+        self.exam_id = exam_id
+        self.question_ids = question_ids
+        self.question_types = question_types
+        self.scores = scores
+        self.correct = correct
+        self.option_ids = option_ids
+        self.option_items = option_items
+        self.option_correct = option_correct
+        self.choices = choices
+
+
+def _lookup(sorted_ids, values):
+    """Positions of `values` in the sorted id array and a mask of which were found."""
+    positions = np.searchsorted(sorted_ids, values)
+    positions = np.minimum(positions, max(len(sorted_ids) - 1, 0))
+    found = sorted_ids[positions] == values if len(sorted_ids) else np.zeros(len(values), dtype=bool)
+    return positions, found
+
+
+def load_response_matrix(exam_id, chunk_size=None):
+    """Build the ResponseMatrix of an exam's GRADED submissions in four queries."""
+    chunk_size = chunk_size or settings.ITEM_ANALYSIS_CHUNK_SIZE
+
+    items = list(
+        ExamQuestion.objects.filter(exam_id=exam_id).order_by('order', 'id')
+        .values_list('question_id', 'question__question_type')
+    )
+    question_ids = np.array([question_id for question_id, _ in items], dtype=np.int64)
+    question_types = [question_type for _, question_type in items]
+    # Sorted view of the columns for vectorized id -> column lookups
+    column_order = np.argsort(question_ids, kind='stable')
+    sorted_question_ids = question_ids[column_order]
+
+    graded = Submission.objects.filter(exam_id=exam_id, status='GRADED')
+    submissions = np.array(list(graded.order_by('id').values_list('id', 'score')), dtype=np.float64).reshape(-1, 2)
+    submission_ids = submissions[:, 0].astype(np.int64)
+    scores = np.nan_to_num(submissions[:, 1])
+
+    options = np.array(
+        list(
+            QuestionOption.objects.filter(question_id__in=question_ids.tolist(), question__question_type='MCQ')
+            .order_by('id').values_list('id', 'question_id', 'is_correct')
+        ),
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    option_ids = options[:, 0]
+    option_columns, _ = _lookup(sorted_question_ids, options[:, 1])
+    option_items = column_order[option_columns]
+    option_correct = options[:, 2].astype(bool)
+
+    n, k = len(submission_ids), len(question_ids)
+    correct = np.zeros((n, k), dtype=np.float64)
+    choices = np.full((n, k), NO_OPTION, dtype=np.int32)
+    if n and k:
+        rows = (
+            Answer.objects.filter(submission__exam_id=exam_id, submission__status='GRADED')
+            .values_list('submission_id', 'question_id', 'is_correct', 'selected_option_id')
+            .iterator(chunk_size=chunk_size)
+        )
+        block = []
+        for row in rows:
+            block.append(row)
+            if len(block) >= chunk_size:
+                _fill(block, submission_ids, sorted_question_ids, column_order, option_ids, correct, choices)
+                block = []
+        if block:
+            _fill(block, submission_ids, sorted_question_ids, column_order, option_ids, correct, choices)
+
+    return ResponseMatrix(
+        exam_id, question_ids, question_types, scores, correct,
+        option_ids, option_items, option_correct, choices,
+    )
+
+
+def _fill(block, submission_ids, sorted_question_ids, column_order, option_ids, correct, choices):
+    # None (ungraded verdict / no option) becomes NaN in the float array
+    data = np.array(block, dtype=np.float64)
+    row_index, row_found = _lookup(submission_ids, data[:, 0].astype(np.int64))
+    column_index, column_found = _lookup(sorted_question_ids, data[:, 1].astype(np.int64))
+    keep = row_found & column_found  # answers to questions since removed from the exam are ignored
+    rows, columns = row_index[keep], column_order[column_index[keep]]
+    correct[rows, columns] = np.nan_to_num(data[keep, 2])
+
+    selected = data[keep, 3]
+    has_option = ~np.isnan(selected)
+    option_index, option_found = _lookup(option_ids, np.nan_to_num(selected[has_option]).astype(np.int64))
+    picked = np.flatnonzero(has_option)[option_found]
+    choices[rows[picked], columns[picked]] = option_index[option_found]
+
+
+def _correlation(covariance, variance_a, variance_b):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return covariance / np.sqrt(variance_a * variance_b)
+
+
+def analyse(matrix):
+    """Every item statistic of a ResponseMatrix, computed vectorized. NaN marks undefined values."""
+    correct, scores = matrix.correct, matrix.scores
+    n, k = correct.shape
+
+    difficulty = correct.mean(axis=0) if n else np.full(k, np.nan)
+    item_variance = difficulty * (1 - difficulty)
+    centered = correct - difficulty
+
+    # Point-biserial = Pearson correlation of the 0/1 item with the score
+    score_centered = scores - scores.mean() if n else scores
+    score_variance = score_centered @ score_centered / n if n else np.nan
+    score_covariance = centered.T @ score_centered / n if n else np.full(k, np.nan)
+    discrimination = _correlation(score_covariance, item_variance, score_variance)
+
+    # Item-rest: correlate with (total - item) without materialising k rest vectors
+    totals = correct.sum(axis=1)
+    total_centered = totals - totals.mean() if n else totals
+    total_variance = total_centered @ total_centered / n if n else np.nan
+    total_covariance = centered.T @ total_centered / n if n else np.full(k, np.nan)
+    rest_variance = total_variance + item_variance - 2 * total_covariance
+    item_rest = _correlation(total_covariance - item_variance, item_variance, rest_variance)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        alpha = k / (k - 1) * (1 - item_variance.sum() / total_variance) if k > 1 else np.nan
+
+    # Distractors: bincount the picked cells per option (and their scores for the mean)
+    m = len(matrix.option_ids)
+    picker_rows, picked_columns = np.nonzero(matrix.choices != NO_OPTION)
+    picks = matrix.choices[picker_rows, picked_columns]
+    option_counts = np.bincount(picks, minlength=m)
+    score_totals = np.bincount(picks, weights=scores[picker_rows], minlength=m)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        option_mean_scores = score_totals / option_counts
+
+    return {
+        'difficulty': difficulty,
+        'discrimination': discrimination,
+        'item_rest_correlation': item_rest,
+        'cronbach_alpha': alpha,
+        'option_counts': option_counts,
+        'option_share': option_counts / n if n else np.full(m, np.nan),
+        'option_mean_scores': option_mean_scores,
+    }
+
+
+def _number(value):
+    value = float(value)
+    return None if math.isnan(value) or math.isinf(value) else round(value, 6)
+
+
+def item_analysis_payload(exam_id, chunk_size=None):
+    """JSON-ready item analysis of an exam."""
+    matrix = load_response_matrix(exam_id, chunk_size)
+    stats = analyse(matrix)
+    options_by_item = {}
+    for index, column in enumerate(matrix.option_items.tolist()):
+        options_by_item.setdefault(column, []).append({
+            'option_id': int(matrix.option_ids[index]),
+            'is_correct': bool(matrix.option_correct[index]),
+            'count': int(stats['option_counts'][index]),
+            'share': _number(stats['option_share'][index]),
+            'mean_score': _number(stats['option_mean_scores'][index]),
+        })
+
+    questions = []
+    for column, question_id in enumerate(matrix.question_ids.tolist()):
+        entry = {
+            'question_id': question_id,
+            'question_type': matrix.question_types[column],
+            'difficulty': _number(stats['difficulty'][column]),
+            'discrimination': _number(stats['discrimination'][column]),
+            'item_rest_correlation': _number(stats['item_rest_correlation'][column]),
+        }
+        if matrix.question_types[column] == 'MCQ':
+            entry['options'] = options_by_item.get(column, [])
+        questions.append(entry)
+
+    return {
+        'exam_id': exam_id,
+        'students': len(matrix.scores),
+        'items': len(questions),
+        'cronbach_alpha': _number(stats['cronbach_alpha']),
+        'questions': questions,
+    }
@@ -0,0 +1,35 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand
+
+from core.exam_io import export_exams
+
+
+class Command(BaseCommand):
+    help = "Export exams and their questions as JSON lines (the format read by import_exams)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam', dest='exam_ids', type=int, nargs='+', help="Exam ids (default: every exam).")
+        parser.add_argument('--output', '-o', dest='path', help="File to write (default: stdout; '.gz' compresses).")
+        parser.add_argument('--chunk-size', type=int, default=None, help="Exams fetched per round trip.")
+
+    def handle(self, *args, **options):
+        lines = export_exams(options['exam_ids'], options['chunk_size'])
+        if not options['path']:
+            out = getattr(self.stdout._out, 'buffer', sys.stdout.buffer)
+            count = self._write(lines, out)
+        else:
+            opener = gzip.open if options['path'].endswith('.gz') else open
+            with opener(options['path'], 'wb') as out:
+                count = self._write(lines, out)
+            self.stderr.write(f"Wrote {count} exams to {options['path']}")
+
+    @staticmethod
+    def _write(lines, out):
+        count = -1  # the header line is not an exam
+        for line in lines:
+            out.write(line.encode())
+            count += 1
+        out.flush()
+        return count
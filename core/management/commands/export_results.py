@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.exports import FORMATS, LEVELS, export_results
+from core.models import Exam
+
+
+class Command(BaseCommand):
+    help = "Stream an exam's results (submissions or per-question answers) as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_id', type=int)
+        parser.add_argument('--format', dest='output', choices=FORMATS, default='csv')
+        parser.add_argument('--level', choices=LEVELS, default='submissions')
+        parser.add_argument('--gzip', action='store_true', help="Gzip-compress the output.")
+        parser.add_argument('--output', '-o', dest='path', help="File to write (default: stdout).")
+        parser.add_argument('--chunk-size', type=int, default=None, help="Rows fetched per server-side cursor round trip.")
+
+    def handle(self, *args, **options):
+        exam_id = options['exam_id']
+        if not Exam.objects.filter(id=exam_id).exists():
+            raise CommandError(f"Exam {exam_id} does not exist.")
+
+        chunks = export_results(
+            exam_id, options['output'], options['level'], options['gzip'], options['chunk_size']
+        )
+        if options['path']:
+            with open(options['path'], 'wb') as out:
+                written = self._write(chunks, out)
+            self.stderr.write(f"Wrote {written} bytes to {options['path']}")
+        else:
+            self._write(chunks, getattr(self.stdout._out, 'buffer', sys.stdout.buffer))
+
+    @staticmethod
+    def _write(chunks, out):
+        written = 0
+        for chunk in chunks:
+            out.write(chunk)
+            written += len(chunk)
+        out.flush()
+        return written
@@ -0,0 +1,105 @@
+import os
+import socket
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from core.regrade import ExamRegrader, claim_pending_run
+from core.services import GradingQueue
+
+
+class Command(BaseCommand):
+    help = "Claim queued grading jobs (SKIP LOCKED) and grade them in batches; run queued re-grades when idle."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.GRADING_WORKER_BATCH_SIZE)
+        parser.add_argument('--concurrency', type=int, default=settings.GRADING_WORKER_CONCURRENCY,
+                            help="Number of worker threads, each with its own DB connection.")
+        parser.add_argument('--poll-interval', type=float, default=settings.GRADING_WORKER_POLL_INTERVAL,
+                            help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--max-attempts', type=int, default=settings.GRADING_WORKER_MAX_ATTEMPTS)
+        parser.add_argument('--backoff', type=float, default=settings.GRADING_WORKER_BACKOFF_SECONDS,
+                            help="Base retry delay in seconds (doubled on each attempt).")
+        parser.add_argument('--stale-after', type=int, default=settings.GRADING_WORKER_STALE_AFTER_SECONDS,
+                            help="Requeue RUNNING jobs locked for longer than this many seconds.")
+        parser.add_argument('--once', action='store_true',
+                            help="Drain the currently due jobs and exit instead of polling forever.")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.totals = {'done': 0, 'failed': 0}
+
+        requeued = GradingQueue.requeue_stale(options['stale_after'])
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale job(s).")
+
+        concurrency = max(1, options['concurrency'])
+        base_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        if concurrency == 1:
+            try:
+                self.run_loop(f"{base_id}:0")
+            except KeyboardInterrupt:
+                pass
+        else:
+            threads = [
+                threading.Thread(target=self.run_thread, args=(f"{base_id}:{i}",), daemon=True)
+                for i in range(concurrency)
+            ]
+            for thread in threads:
+                thread.start()
+            try:
+                while any(thread.is_alive() for thread in threads):
+                    for thread in threads:
+                        thread.join(timeout=0.5)
+            except KeyboardInterrupt:
+                self.stop.set()
+                for thread in threads:
+                    thread.join()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Graded {self.totals['done']} submission(s), {self.totals['failed']} failure(s)."
+        ))
+
+    def run_thread(self, worker_id):
+        try:
+            self.run_loop(worker_id)
+        finally:
+            # Each thread owns its own connection; don't leak it.
+            connection.close()
+
+    def run_loop(self, worker_id):
+        options = self.options
+        while not self.stop.is_set():
+            if not connection.in_atomic_block:
+                close_old_connections()
+            jobs = GradingQueue.claim(options['batch_size'], worker_id=worker_id)
+
+            if not jobs:
+                # Idle: pick up a re-grade queued through the API (POST /api/exams/{id}/regrade/)
+                run = claim_pending_run()
+                if run is not None:
+                    try:
+                        ExamRegrader(run).execute()
+                        self.stdout.write(f"[{worker_id}] finished regrade run {run.id} for exam {run.exam_id}")
+                    except Exception:
+                        # Logged and marked FAILED by the regrader; resume with `regrade_exam --resume`
+                        self.stderr.write(f"[{worker_id}] regrade run {run.id} failed")
+                    continue
+                if options['once']:
+                    break
+                self.stop.wait(options['poll_interval'])
+                continue
+
+            done, failed = GradingQueue.process(
+                jobs, max_attempts=options['max_attempts'], backoff_seconds=options['backoff']
+            )
+            with self.lock:
+                self.totals['done'] += done
+                self.totals['failed'] += failed
+            if options['verbosity'] >= 2:
+                self.stdout.write(f"[{worker_id}] graded {done}, failed {failed}")
@@ -0,0 +1,52 @@
+import gzip
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.exam_io import METHODS, ExamImporter, ExamImportError
+
+
+class Command(BaseCommand):
+    help = "Import exams and their questions from a JSON-lines file (see core/exam_io.py for the format)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to read ('-' for stdin; '.gz' files are decompressed).")
+        parser.add_argument(
+            '--method', choices=METHODS, default='auto',
+            help="'copy' uses PostgreSQL COPY, 'bulk' uses bulk_create; 'auto' picks COPY when available.",
+        )
+        parser.add_argument('--chunk-size', type=int, default=None, help="Questions written per transaction.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def progress(totals):
+            elapsed = time.perf_counter() - started
+            self.stderr.write(
+                f"{totals['exams']} exams, {totals['questions']} questions, {totals['options']} options "
+                f"({totals['questions'] / elapsed:,.0f} questions/s)"
+            )
+
+        try:
+            importer = ExamImporter(options['chunk_size'], options['method'], progress)
+            with self._open(options['path']) as stream:
+                totals = importer.run(stream)
+        except ExamImportError as exc:
+            raise CommandError(str(exc))
+        except OSError as exc:
+            raise CommandError(f"Cannot read {options['path']}: {exc}")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Imported {totals['exams']} exams, {totals['questions']} questions and {totals['options']} options "
+            f"in {elapsed:.1f}s using {importer.method}."
+        )
+
+    @staticmethod
+    def _open(path):
+        if path == '-':
+            return open(sys.stdin.fileno(), 'rb', closefd=False)
+        if path.endswith('.gz'):
+            return gzip.open(path, 'rb')
+        return open(path, 'rb')
@@ -0,0 +1,22 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.item_analysis import item_analysis_payload
+from core.models import Exam
+
+
+class Command(BaseCommand):
+    help = "Classical item analysis of an exam: difficulty, discrimination, Cronbach's alpha and distractors."
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_id', type=int)
+        parser.add_argument('--chunk-size', type=int, default=None, help="Answer rows fetched per round trip.")
+        parser.add_argument('--indent', type=int, default=2, help="JSON indentation (0 for one line).")
+
+    def handle(self, *args, **options):
+        exam_id = options['exam_id']
+        if not Exam.objects.filter(id=exam_id).exists():
+            raise CommandError(f"Exam {exam_id} does not exist.")
+        payload = item_analysis_payload(exam_id, options['chunk_size'])
+        self.stdout.write(json.dumps(payload, indent=options['indent'] or None))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Exam
+from core.stats import diff_exam_stats, rebuild_exam_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute exam/question statistics from scratch, or verify the incrementally maintained ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam', dest='exam_ids', type=int, nargs='+', help="Exam ids (default: every exam).")
+        parser.add_argument(
+            '--verify', action='store_true',
+            help="Only compare stored stats with a full recomputation; exit non-zero on any mismatch.",
+        )
+
+    def handle(self, *args, **options):
+        exam_ids = options['exam_ids'] or list(Exam.objects.order_by('id').values_list('id', flat=True))
+        missing = set(exam_ids) - set(Exam.objects.filter(id__in=exam_ids).values_list('id', flat=True))
+        if missing:
+            raise CommandError(f"Exam(s) {sorted(missing)} do not exist.")
+
+        problems = []
+        for exam_id in exam_ids:
+            if not options['verify']:
+                rebuild_exam_stats(exam_id)
+            problems += diff_exam_stats(exam_id)
+
+        for problem in problems:
+            self.stderr.write(problem)
+        if problems:
+            raise CommandError(f"{len(problems)} statistics mismatch(es).")
+        action = "Verified" if options['verify'] else "Rebuilt"
+        self.stdout.write(f"{action} statistics for {len(exam_ids)} exam(s).")
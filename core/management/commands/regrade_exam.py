@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Exam, RegradeRun
+from core.regrade import ExamRegrader, RegradeError, claim_pending_run, start_regrade
+
+
+class Command(BaseCommand):
+    help = "Re-grade an exam's graded submissions against its current answer key (resumable, see core/regrade.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_id', type=int, nargs='?', help="Start a new run for this exam.")
+        parser.add_argument('--question', dest='question_ids', type=int, action='append', default=[],
+                            help="Only re-grade answers to this question (repeatable; default: every question).")
+        parser.add_argument('--resume', dest='run_id', type=int, help="Resume an interrupted or failed run.")
+        parser.add_argument('--pending', action='store_true', help="Run every queued run (e.g. from the API).")
+        parser.add_argument('--workers', type=int, default=None, help="Grading processes (0 grades inline).")
+        parser.add_argument('--chunk-size', type=int, default=None, help="Submissions per chunk/transaction.")
+
+    def handle(self, *args, **options):
+        if sum(bool(x) for x in (options['exam_id'], options['run_id'], options['pending'])) != 1:
+            raise CommandError("Give exactly one of: an exam id, --resume RUN_ID or --pending.")
+
+        if options['pending']:
+            count = 0
+            while (run := claim_pending_run()) is not None:
+                self.execute_run(run, options)
+                count += 1
+            self.stdout.write(f"Finished {count} queued run(s).")
+            return
+
+        if options['run_id']:
+            try:
+                run = RegradeRun.objects.get(id=options['run_id'])
+            except RegradeRun.DoesNotExist:
+                raise CommandError(f"Regrade run {options['run_id']} does not exist.")
+        else:
+            if not Exam.objects.filter(id=options['exam_id']).exists():
+                raise CommandError(f"Exam {options['exam_id']} does not exist.")
+            try:
+                run = start_regrade(options['exam_id'], options['question_ids'])
+            except RegradeError as exc:
+                raise CommandError(str(exc))
+        self.execute_run(run, options)
+
+    def execute_run(self, run, options):
+        started = time.perf_counter()
+
+        def progress(run):
+            elapsed = time.perf_counter() - started
+            self.stderr.write(
+                f"run {run.id}: {run.processed_submissions}/{run.total_submissions} submissions, "
+                f"{run.changed_answers} answers changed ({run.processed_submissions / elapsed:,.0f} submissions/s)"
+            )
+
+        try:
+            ExamRegrader(run, options['workers'], options['chunk_size'], progress).execute()
+        except RegradeError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(
+            f"Regrade run {run.id} (exam {run.exam_id}): {run.processed_submissions} submissions checked, "
+            f"{run.changed_answers} answers changed, {run.rescored_submissions} submissions rescored "
+            f"in {time.perf_counter() - started:.1f}s."
+        )
@@ -0,0 +1,48 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.checks import cache_is_shared
+from core.deadlines import sweep_expired
+from core.drafts import flush_due_drafts
+
+
+class Command(BaseCommand):
+    help = (
+        "Flush autosaved drafts to the database once per DRAFT_FLUSH_INTERVAL (see core/drafts.py) and submit "
+        "and grade IN_PROGRESS attempts past their deadline, in locked batches (see core/deadlines.py)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.DEADLINE_SWEEP_BATCH_SIZE,
+                            help="Attempts locked and closed per transaction.")
+        parser.add_argument('--poll-interval', type=float, default=settings.DEADLINE_SWEEP_POLL_INTERVAL,
+                            help="Seconds to sleep between sweeps.")
+        parser.add_argument('--once', action='store_true',
+                            help="Flush the due drafts, close the expired attempts and exit instead of polling forever.")
+
+    def handle(self, *args, **options):
+        if not cache_is_shared():
+            self.stderr.write(
+                "The default cache is per-process: drafts saved by the web processes are not visible here (core.E002)."
+            )
+        total = 0
+        try:
+            while True:
+                close_old_connections()
+                flushed = flush_due_drafts()
+                if flushed and options['verbosity'] >= 2:
+                    self.stdout.write(f"Flushed {flushed} draft(s).")
+                started = time.perf_counter()
+                closed = sweep_expired(options['batch_size'])
+                total += closed
+                if closed and options['verbosity'] >= 1:
+                    self.stdout.write(f"Closed {closed} expired attempt(s) in {time.perf_counter() - started:.2f}s.")
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Closed {total} expired attempt(s)."))
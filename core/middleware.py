@@ -0,0 +1,120 @@
+"""
+Per-request database instrumentation.
+
+Every database connection gets an execute wrapper (installed as it connects)
+that charges each query to the current request's `QueryStats`, found through a
+context variable. That works with DEBUG off, on every alias, and under ASGI
+too, where the ORM runs in `sync_to_async` threads that inherit the request's
+context. Each response can thus report how many queries it ran, how long they
+took and whether it had to open a new database connection instead of reusing
+a persistent/pooled one.
+
+The numbers are added as response headers (`X-DB-Query-Count`, `X-DB-Time-Ms`,
+`X-DB-Connections-Opened`, `Server-Timing`) and logged as one JSON line per
+request on the `core.requests` logger, keyed by view name and route so query-count
+regressions can be spotted per endpoint. Requests above
+`REQUEST_QUERY_COUNT_WARNING` queries are logged at WARNING.
+
+Streaming responses are measured up to the point the stream is returned.
+"""
+import contextvars
+import json
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger('core.requests')
+
+_current_stats = contextvars.ContextVar('request_query_stats', default=None)
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.opened = 0
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.duration += time.perf_counter() - start
+        stats.count += 1
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        # Front of the list: `execute_wrapper()` blocks that are open right now pop from the end
+        connection.execute_wrappers.insert(0, record_query)
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.opened += 1
+
+
+class QueryInstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = QueryStats()
+        token = _current_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        self.report(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats = QueryStats()
+        token = _current_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        self.report(request, response, stats, time.perf_counter() - start)
+        return response
+
+    @staticmethod
+    def report(request, response, stats, elapsed):
+        db_ms = stats.duration * 1000
+        total_ms = elapsed * 1000
+        if settings.REQUEST_DB_HEADERS:
+            response['X-DB-Query-Count'] = str(stats.count)
+            response['X-DB-Time-Ms'] = f'{db_ms:.2f}'
+            response['X-DB-Connections-Opened'] = str(stats.opened)
+            response['Server-Timing'] = f'db;dur={db_ms:.2f}, total;dur={total_ms:.2f}'
+
+        match = request.resolver_match
+        record = {
+            'method': request.method,
+            'view': match.view_name if match else None,
+            'route': match.route if match else None,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': stats.count,
+            'db_ms': round(db_ms, 2),
+            'duration_ms': round(total_ms, 2),
+            'connections_opened': stats.opened,
+        }
+        level = logging.WARNING if stats.count > settings.REQUEST_QUERY_COUNT_WARNING else logging.INFO
+        logger.log(level, json.dumps(record))
@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 10:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['submission', 'question'], name='answer_submission_question_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='examquestion',
+            index=models.Index(fields=['exam', 'order'], include=('question',), name='examquestion_exam_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['exam', 'status'], include=('score',), name='submission_exam_status_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.0 on 2026-10-18 15:30
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def drop_duplicate_answers(apps, schema_editor):
+    # Keep the latest answer per (submission, question); earlier duplicates could only come from
+    # clients posting a question twice and were double-counted by the grader.
+    Answer = apps.get_model('core', 'Answer')
+    duplicates = (
+        Answer.objects.values('submission_id', 'question_id')
+        .annotate(count=Count('id'), keep=Max('id'))
+        .filter(count__gt=1)
+    )
+    for row in duplicates.iterator():
+        Answer.objects.filter(submission_id=row['submission_id'], question_id=row['question_id']).exclude(
+            id=row['keep']
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_regraderun'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_answers, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='answer',
+            constraint=models.UniqueConstraint(fields=('submission', 'question'), name='answer_submission_question_uniq'),
+        ),
+        # The constraint's unique index covers the same lookups
+        migrations.RemoveIndex(
+            model_name='answer',
+            name='answer_submission_question_idx',
+        ),
+    ]
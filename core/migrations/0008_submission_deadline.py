@@ -0,0 +1,38 @@
+# Generated by Django 6.0 on 2026-10-18 16:40
+
+import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_deadlines(apps, schema_editor):
+    # Open attempts get started_at + duration, one UPDATE per exam
+    Exam = apps.get_model('core', 'Exam')
+    Submission = apps.get_model('core', 'Submission')
+    exams = Exam.objects.filter(submissions__status='IN_PROGRESS').distinct().values_list('id', 'duration_minutes')
+    for exam_id, duration in exams:
+        Submission.objects.filter(exam_id=exam_id, status='IN_PROGRESS').update(
+            deadline_at=models.F('started_at') + datetime.timedelta(minutes=duration)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_answer_unique_question'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='deadline_at',
+            field=models.DateTimeField(blank=True, help_text='started_at + exam duration for IN_PROGRESS attempts (see sweep_deadlines)', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(condition=models.Q(('status', 'IN_PROGRESS')), fields=['deadline_at', 'id'], name='submission_open_deadline_idx'),
+        ),
+        migrations.RunPython(backfill_deadlines, migrations.RunPython.noop),
+    ]
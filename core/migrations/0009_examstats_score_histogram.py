@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-18 17:20
+
+from django.db import migrations, models
+
+# core.stats.HISTOGRAM_BUCKETS at the time of this migration
+HISTOGRAM_BUCKETS = 100
+
+
+def backfill_histograms(apps, schema_editor):
+    # One pass over the graded scores; later grading keeps the histograms up to date
+    ExamStats = apps.get_model('core', 'ExamStats')
+    Submission = apps.get_model('core', 'Submission')
+    histograms = {}
+    scores = Submission.objects.filter(status='GRADED', score__isnull=False).values_list('exam_id', 'score')
+    for exam_id, score in scores.iterator():
+        histogram = histograms.setdefault(exam_id, [0] * HISTOGRAM_BUCKETS)
+        histogram[max(0, min(int(score * HISTOGRAM_BUCKETS // 100), HISTOGRAM_BUCKETS - 1))] += 1
+    for exam_id, histogram in histograms.items():
+        ExamStats.objects.filter(exam_id=exam_id).update(score_histogram=histogram)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_submission_deadline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examstats',
+            name='score_histogram',
+            field=models.JSONField(blank=True, default=list, help_text='Graded submissions per fixed-width score bucket (see core/stats.py)'),
+        ),
+        migrations.RunPython(backfill_histograms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,120 @@
+# Generated by Django 6.0 on 2026-10-18 18:10
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+SEARCH_INDEXES = [
+    ('exam', django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='exam_search_gin')),
+    ('exam', django.contrib.postgres.indexes.GinIndex(fields=['metadata'], name='exam_metadata_gin', opclasses=['jsonb_path_ops'])),
+    ('question', django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='question_search_gin')),
+]
+
+# The vectors are built by the database on every insert/update (including COPY imports, core/exam_io.py),
+# so no code path can forget to maintain them. Weights: A = title/text, B = course/tags/expected answer,
+# C = description. The 'english' configuration must match core.search.SEARCH_CONFIG.
+CREATE_SQL = [
+    """
+    CREATE OR REPLACE FUNCTION core_question_search_vector(text, text) RETURNS tsvector
+    LANGUAGE sql IMMUTABLE AS $$
+        SELECT setweight(to_tsvector('english', coalesce($1, '')), 'A')
+            || setweight(to_tsvector('english', coalesce($2, '')), 'B')
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION core_exam_search_vector(text, text, text, jsonb) RETURNS tsvector
+    LANGUAGE sql IMMUTABLE AS $$
+        SELECT setweight(to_tsvector('english', coalesce($1, '')), 'A')
+            || setweight(to_tsvector('english', coalesce($2, '')), 'B')
+            || setweight(jsonb_to_tsvector('english', coalesce($4 -> 'tags', '[]'::jsonb), '["string"]'), 'B')
+            || setweight(to_tsvector('english', coalesce($3, '')), 'C')
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION core_question_search_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.search_vector := core_question_search_vector(NEW.text, NEW.expected_answer);
+        RETURN NEW;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION core_exam_search_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.search_vector := core_exam_search_vector(NEW.title, NEW.course, NEW.description, NEW.metadata);
+        RETURN NEW;
+    END
+    $$
+    """,
+    """
+    CREATE TRIGGER core_question_search_update BEFORE INSERT OR UPDATE OF text, expected_answer
+    ON core_question FOR EACH ROW EXECUTE FUNCTION core_question_search_trigger()
+    """,
+    """
+    CREATE TRIGGER core_exam_search_update BEFORE INSERT OR UPDATE OF title, course, description, metadata
+    ON core_exam FOR EACH ROW EXECUTE FUNCTION core_exam_search_trigger()
+    """,
+    "UPDATE core_question SET search_vector = core_question_search_vector(text, expected_answer)",
+    "UPDATE core_exam SET search_vector = core_exam_search_vector(title, course, description, metadata)",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS core_exam_search_update ON core_exam",
+    "DROP TRIGGER IF EXISTS core_question_search_update ON core_question",
+    "DROP FUNCTION IF EXISTS core_exam_search_trigger()",
+    "DROP FUNCTION IF EXISTS core_question_search_trigger()",
+    "DROP FUNCTION IF EXISTS core_exam_search_vector(text, text, text, jsonb)",
+    "DROP FUNCTION IF EXISTS core_question_search_vector(text, text)",
+]
+
+
+def create_search_support(apps, schema_editor):
+    # Full-text search and jsonb containment are PostgreSQL features; other backends
+    # (e.g. SQLite in local tests) fall back to plain lookups in core/search.py.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in CREATE_SQL:
+        schema_editor.execute(statement)
+    for model_name, index in SEARCH_INDEXES:
+        schema_editor.add_index(apps.get_model('core', model_name), index)
+
+
+def drop_search_support(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name, index in SEARCH_INDEXES:
+        schema_editor.remove_index(apps.get_model('core', model_name), index)
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_examstats_score_histogram'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='exam',
+            index=models.Index(fields=['course'], name='exam_course_idx'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name=model_name, index=index) for model_name, index in SEARCH_INDEXES
+            ],
+            database_operations=[
+                migrations.RunPython(create_search_support, drop_search_support),
+            ],
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.utils import timezone
 
 class Exam(models.Model):
     title = models.CharField(max_length=255)
@@ -8,6 +11,18 @@ class Exam(models.Model):
     duration_minutes = models.PositiveIntegerField()
     metadata = models.JSONField(default=dict, blank=True, help_text="Extra settings like difficulty, tags")
     created_at = models.DateTimeField(auto_now_add=True)
+    # Maintained by a PostgreSQL trigger from title, course, description and metadata tags (core/search.py)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination on the exam list (core/pagination.py)
+            models.Index(fields=['created_at', 'id'], name='exam_created_id_idx'),
+            models.Index(fields=['course'], name='exam_course_idx'),
+            # Search (core/search.py); created on PostgreSQL only, see migration 0010
+            GinIndex(fields=['search_vector'], name='exam_search_gin'),
+            GinIndex(fields=['metadata'], opclasses=['jsonb_path_ops'], name='exam_metadata_gin'),
+        ]
 
     def __str__(self):
         return f"{self.course}: {self.title}"
@@ -23,6 +38,14 @@ class Question(models.Model):
     # expected_answer is mainly for TEXT or simple matching. 
     # For MCQ, the correctness is in QuestionOption.
     expected_answer = models.TextField(blank=True, help_text="For TEXT questions or fallback")
+    # Maintained by a PostgreSQL trigger from text and expected_answer (core/search.py)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Search (core/search.py); created on PostgreSQL only, see migration 0010
+            GinIndex(fields=['search_vector'], name='question_search_gin'),
+        ]
 
     def __str__(self):
         return self.text[:50]
@@ -43,6 +66,10 @@ class ExamQuestion(models.Model):
     class Meta:
         unique_together = ('exam', 'question')
         ordering = ['order']
+        indexes = [
+            # Ordered question list per exam; INCLUDE lets validation/answer-key reads skip the heap (PostgreSQL)
+            models.Index(fields=['exam', 'order'], include=['question'], name='examquestion_exam_order_idx'),
+        ]
 
 class Submission(models.Model):
     STATUS_CHOICES = (
@@ -57,12 +84,25 @@ class Submission(models.Model):
     score = models.FloatField(null=True, blank=True)
     started_at = models.DateTimeField(auto_now_add=True)
     submitted_at = models.DateTimeField(null=True, blank=True)
+    deadline_at = models.DateTimeField(
+        null=True, blank=True, help_text="started_at + exam duration for IN_PROGRESS attempts (see sweep_deadlines)"
+    )
 
     class Meta:
         # Enforce one submission per exam per student (as per security requirements)
         # Note: In a real app we might want 'attempts', but 'Mini Assessment' usually implies single shot.
         # We can relax this if multiple attempts are needed, but this constraint is solid for "Secure".
         unique_together = ('student', 'exam')
+        indexes = [
+            # Keyset pagination on a student's history (MySubmissionsView)
+            models.Index(fields=['student', 'started_at', 'id'], name='submission_student_started_idx'),
+            # Per-exam status scans (grading backlog, results export, statistics)
+            models.Index(fields=['exam', 'status'], include=['score'], name='submission_exam_status_idx'),
+            # Deadline sweep: open attempts ordered by deadline (partial, so closed attempts cost nothing)
+            models.Index(
+                fields=['deadline_at', 'id'], condition=models.Q(status='IN_PROGRESS'), name='submission_open_deadline_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.student.username} - {self.exam.title}"
@@ -76,5 +116,108 @@ class Answer(models.Model):
     text_answer = models.TextField(blank=True)
     is_correct = models.BooleanField(null=True)
 
+    class Meta:
+        constraints = [
+            # One answer per question per submission: drafts are upserted on this key (core/drafts.py).
+            # Its index also serves the per-submission lookups (grading, validation, re-grading).
+            models.UniqueConstraint(fields=['submission', 'question'], name='answer_submission_question_uniq'),
+        ]
+
     def __str__(self):
         return f"Ans: {self.question.id} by {self.submission.student.username}"
+
+class GradingJob(models.Model):
+    """
+    Database-backed grading queue entry.
+    Workers claim PENDING rows with SELECT ... FOR UPDATE SKIP LOCKED (see `grade_worker`).
+    """
+    STATUS_CHOICES = (
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    )
+
+    submission = models.OneToOneField(Submission, related_name='grading_job', on_delete=models.CASCADE)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now, help_text="Earliest time a worker may claim this job (retry backoff)")
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=255, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Claim query: status = 'PENDING' AND run_after <= now() ORDER BY run_after, id
+            models.Index(fields=['status', 'run_after'], name='gradingjob_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"GradingJob {self.id} ({self.status}) for Submission {self.submission_id}"
+
+class ExamStats(models.Model):
+    """
+    Running aggregates over an exam's GRADED submissions, maintained incrementally
+    by the grading service (see core/stats.py). Rebuild with `manage.py rebuild_stats`.
+    """
+    exam = models.OneToOneField(Exam, related_name='stats', on_delete=models.CASCADE, primary_key=True)
+    graded_count = models.PositiveIntegerField(default=0)
+    score_sum = models.FloatField(default=0)
+    score_sq_sum = models.FloatField(default=0, help_text="Sum of squared scores (for the standard deviation)")
+    pass_count = models.PositiveIntegerField(default=0)
+    score_histogram = models.JSONField(
+        default=list, blank=True, help_text="Graded submissions per fixed-width score bucket (see core/stats.py)"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Stats for Exam {self.exam_id}"
+
+class QuestionStats(models.Model):
+    exam = models.ForeignKey(Exam, related_name='question_stats', on_delete=models.CASCADE)
+    question = models.ForeignKey(Question, related_name='stats', on_delete=models.CASCADE)
+    answered_count = models.PositiveIntegerField(default=0)
+    correct_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('exam', 'question')
+
+    def __str__(self):
+        return f"Stats for Question {self.question_id} in Exam {self.exam_id}"
+
+class RegradeRun(models.Model):
+    """
+    An exam-wide re-grade after an answer key change (see core/regrade.py).
+    Submissions are processed in id order; `last_submission_id` is the resume point.
+    """
+    STATUS_CHOICES = (
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    )
+
+    exam = models.ForeignKey(Exam, related_name='regrade_runs', on_delete=models.CASCADE)
+    question_ids = models.JSONField(default=list, blank=True, help_text="Changed questions; empty means all")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    requested_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    last_submission_id = models.BigIntegerField(default=0)
+    total_submissions = models.PositiveIntegerField(default=0)
+    processed_submissions = models.PositiveIntegerField(default=0)
+    changed_answers = models.PositiveIntegerField(default=0)
+    rescored_submissions = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['exam', 'created_at'], name='regraderun_exam_created_idx'),
+            models.Index(fields=['status'], name='regraderun_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"RegradeRun {self.id} ({self.status}) for Exam {self.exam_id}"
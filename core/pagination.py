@@ -0,0 +1,182 @@
+"""
+Keyset (seek) pagination.
+
+Pages are addressed by the (timestamp, id) of the row at the page boundary,
+never by OFFSET, so fetching page 10,000 costs the same index range scan as
+page 1. The `id` tie-breaker keeps ordering total when timestamps collide
+(e.g. rows created by bulk imports).
+"""
+import base64
+import json
+from collections import OrderedDict
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    # (timestamp field, 'id'); prefix with '-' for newest first. Both fields share a direction.
+    ordering = ('created_at', 'id')
+    page_size_setting = None
+    page_size_query_param = 'page_size'
+    max_page_size_setting = 'MAX_PAGE_SIZE'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        page_size = getattr(settings, self.page_size_setting)
+        max_page_size = getattr(settings, self.max_page_size_setting)
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+            if requested > 0:
+                page_size = requested
+        except (KeyError, ValueError):
+            pass
+        return min(page_size, max_page_size)
+
+    @property
+    def descending(self):
+        return self.ordering[0].startswith('-')
+
+    @property
+    def position_field(self):
+        return self.ordering[0].lstrip('-')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        backwards = bool(cursor and cursor['r'])
+
+        # Walking backwards = same seek in the opposite direction, then flip the page.
+        descending = self.descending != backwards
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(f'{prefix}{self.position_field}', f'{prefix}id')
+        if cursor:
+            queryset = queryset.filter(self._seek(cursor['p'], descending))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if backwards:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.page = results
+        return results
+
+    def _seek(self, position, descending):
+        value, pk = position
+        field = self.position_field
+        op = 'lt' if descending else 'gt'
+        bound = 'lte' if descending else 'gte'
+        # The redundant bound lets the (field, id) index range-scan instead of filtering the OR.
+        return Q(**{f'{field}__{bound}': value}) & (
+            Q(**{f'{field}__{op}': value}) | Q(**{field: value, f'id__{op}': pk})
+        )
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii'))
+            value, pk = data['p']
+            return {'p': (self.parse_position(value), int(pk)), 'r': bool(data.get('r'))}
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def parse_position(self, value):
+        return datetime.fromisoformat(value)
+
+    def format_position(self, value):
+        return value.isoformat()
+
+    def encode_cursor(self, item, backwards):
+        position = [self.format_position(getattr(item, self.position_field)), item.pk]
+        data = json.dumps({'p': position, 'r': int(backwards)}, separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(data.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            # Walked back past the start of an empty page: restart from the first page.
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[-1], backwards=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], backwards=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results to return per page.',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+
+class ExamPagination(KeysetPagination):
+    ordering = ('created_at', 'id')
+    page_size_setting = 'EXAM_PAGE_SIZE'
+
+
+class SubmissionPagination(KeysetPagination):
+    # Most recent attempts first
+    ordering = ('-started_at', '-id')
+    page_size_setting = 'SUBMISSION_PAGE_SIZE'
+
+
+class SearchPagination(KeysetPagination):
+    # Best match first; `rank` is annotated by core/search.py
+    ordering = ('-rank', '-id')
+    page_size_setting = 'SEARCH_PAGE_SIZE'
+
+    def parse_position(self, value):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(value)
+        return float(value)
+
+    def format_position(self, value):
+        return value
@@ -0,0 +1,80 @@
+"""
+Pre-rendered exam payloads.
+
+Exam content is effectively read-only during an exam window, so each exam's
+JSON is rendered once and cached as bytes under the exam's content version
+(see `core.caching`). Retrieve serves the cached bytes as-is; list stitches
+the cached per-exam fragments into a JSON array without re-serializing.
+The version doubles as the ETag, so unchanged exams answer 304 without
+touching the database.
+"""
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+
+from .caching import get_exam_versions
+
+EXAM_PAYLOAD_CACHE_KEY = 'exam-payload:{}:{}:{}'
+
+
+def exam_etag(exam_id, version):
+    return f'"exam-{exam_id}-{version}"'
+
+
+def exam_list_etag(versions, kind='full', links=()):
+    fingerprint = '|'.join([
+        kind,
+        ','.join(f'{exam_id}:{version}' for exam_id, version in versions.items()),
+        *(link or '' for link in links),
+    ])
+    digest = hashlib.sha1(fingerprint.encode()).hexdigest()
+    return f'"exams-{digest}"'
+
+
+def get_exam_payloads(exam_ids, queryset, serializer_class, versions=None, kind='full'):
+    """
+    Return ({exam_id: rendered JSON bytes}, versions) for `exam_ids`.
+
+    `kind` separates differently shaped renderings of the same exam (e.g. 'summary').
+    Cache misses are serialized together from `queryset` in one pass.
+    Ids that no longer exist are left out of the result.
+    """
+    if versions is None:
+        versions = get_exam_versions(exam_ids)
+    cache_keys = {EXAM_PAYLOAD_CACHE_KEY.format(kind, exam_id, versions[exam_id]): exam_id for exam_id in exam_ids}
+    payloads = {cache_keys[key]: payload for key, payload in cache.get_many(cache_keys).items()}
+
+    missing = [exam_id for exam_id in exam_ids if exam_id not in payloads]
+    if missing:
+        renderer = JSONRenderer()
+        exams = list(queryset.filter(id__in=missing))
+        rendered = {
+            exam.id: renderer.render(data)
+            for exam, data in zip(exams, serializer_class(exams, many=True).data)
+        }
+        cache.set_many(
+            {EXAM_PAYLOAD_CACHE_KEY.format(kind, exam_id, versions[exam_id]): payload for exam_id, payload in rendered.items()},
+            timeout=settings.EXAM_PAYLOAD_CACHE_TIMEOUT,
+        )
+        payloads.update(rendered)
+    return payloads, versions
+
+
+async def aget_exam_payload(exam_id, version, queryset, serializer_class, kind='full'):
+    """Async single-exam `get_exam_payloads`; returns None for unknown exams."""
+    payload = await cache.aget(EXAM_PAYLOAD_CACHE_KEY.format(kind, exam_id, version))
+    if payload is None:
+        # Rendering (serializer + prefetches) is synchronous; it only runs on a miss
+        payloads, _ = await sync_to_async(get_exam_payloads)(
+            [exam_id], queryset, serializer_class, {exam_id: version}, kind
+        )
+        payload = payloads.get(exam_id)
+    return payload
+
+
+def join_payloads(fragments):
+    """Assemble pre-rendered JSON objects into a JSON array."""
+    return b'[' + b','.join(fragments) + b']'
@@ -0,0 +1,220 @@
+"""
+Exam-wide re-grading after an answer key change.
+
+Fixing a wrong `QuestionOption.is_correct` flag or a TEXT question's
+`expected_answer` only affects submissions graded from then on. A
+`RegradeRun` re-grades the exam's GRADED submissions against the current key:
+
+1. Submissions are walked in id order, `chunk_size` at a time (keyset on id).
+2. For each chunk only the answers to the changed questions are loaded
+   (`values_list`, one query) and re-judged on a process pool; workers get
+   plain tuples plus the relevant part of the key and return the answers whose
+   verdict flipped.
+3. Flipped verdicts are written with a chunked `bulk_update`, and the scores of
+   the affected submissions are recomputed with one aggregate `UPDATE ...
+   SET score = (SELECT count(*) ...)` per chunk, in the same transaction that
+   advances the run's cursor (`last_submission_id`).
+
+So a run interrupted at any point resumes after the last committed chunk.
+Chunks are read and graded ahead while earlier results are written. The exam
+statistics are rebuilt once the run finishes (they lag behind while it runs).
+"""
+import logging
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, FloatField, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from .answer_keys import build_answer_keys
+from .models import Answer, ExamQuestion, RegradeRun, Submission
+from .services import TEXT_SIMILARITY_THRESHOLD
+from .similarity import TextSimilarityEngine
+from .stats import rebuild_exam_stats
+
+logger = logging.getLogger(__name__)
+
+BULK_UPDATE_BATCH_SIZE = 1000
+
+
+class RegradeError(Exception):
+    pass
+
+
+def grade_rows(mcq, text, rows, threshold):
+    """
+    Process-pool entry point. `rows` are (answer_id, submission_id, question_id,
+    selected_option_id, text_answer, is_correct) tuples; returns
+    [(answer_id, submission_id, verdict)] for the verdicts that changed.
+    Same rules as `MockGradingService.grade_submissions`.
+    """
+    verdicts, text_rows, text_pairs = [], [], []
+    for row in rows:
+        expected = text.get(row[2])
+        if expected is not None:
+            text_rows.append(row)
+            text_pairs.append((row[4], expected))
+        else:
+            verdicts.append((row, row[3] is not None and row[3] in mcq.get(row[2], ())))
+    verdicts += zip(text_rows, TextSimilarityEngine(threshold).match_many(text_pairs))
+    return [(row[0], row[1], verdict) for row, verdict in verdicts if verdict != row[5]]
+
+
+def start_regrade(exam_id, question_ids=(), requested_by_id=None):
+    """Create a PENDING run; raises RegradeError for questions that are not on the exam."""
+    question_ids = sorted(set(question_ids))
+    on_exam = set(ExamQuestion.objects.filter(exam_id=exam_id, question_id__in=question_ids)
+                  .values_list('question_id', flat=True))
+    unknown = [question_id for question_id in question_ids if question_id not in on_exam]
+    if unknown:
+        raise RegradeError(f"Question(s) {unknown} are not part of exam {exam_id}")
+    return RegradeRun.objects.create(exam_id=exam_id, question_ids=question_ids, requested_by_id=requested_by_id)
+
+
+def claim_pending_run():
+    """Atomically move the oldest PENDING run to RUNNING and return it (or None)."""
+    with transaction.atomic():
+        run = (
+            RegradeRun.objects.select_for_update(skip_locked=True)
+            .filter(status='PENDING').order_by('id').first()
+        )
+        if run is not None:
+            run.status = 'RUNNING'
+            run.save(update_fields=['status', 'updated_at'])
+    return run
+
+
+class ExamRegrader:
+    """
+    Executes (or resumes) a RegradeRun. `workers` > 0 grades on that many
+    processes; 0 grades inline. `progress(run)` is called after every chunk.
+    """
+
+    def __init__(self, run, workers=None, chunk_size=None, progress=None):
+        self.run = run
+        self.workers = settings.REGRADE_WORKERS if workers is None else workers
+        self.chunk_size = chunk_size or settings.REGRADE_CHUNK_SIZE
+        self.progress = progress
+        self.question_ids = set(run.question_ids)
+
+    def execute(self):
+        run = self.run
+        if run.status == 'DONE':
+            raise RegradeError(f"Regrade run {run.id} has already finished.")
+        run.status = 'RUNNING'
+        run.last_error = ''
+        run.total_submissions = self._submissions().count()
+        run.save(update_fields=['status', 'last_error', 'total_submissions', 'updated_at'])
+
+        # Straight from the database: the cached key may predate the fix being re-graded
+        answer_key = build_answer_keys([run.exam_id])[run.exam_id]
+        mcq = {question_id: options for question_id, options in answer_key.mcq.items() if self._selected(question_id)}
+        text = {question_id: expected for question_id, expected in answer_key.text.items() if self._selected(question_id)}
+        try:
+            for submission_ids, changes in self._graded_chunks(mcq, text):
+                self._write(submission_ids, changes, answer_key.total_questions)
+                if self.progress:
+                    self.progress(run)
+            rebuild_exam_stats(run.exam_id)
+        except Exception:
+            logger.exception("Regrade run %s failed", run.id)
+            RegradeRun.objects.filter(id=run.id).update(
+                status='FAILED', last_error=traceback.format_exc(limit=5), updated_at=timezone.now()
+            )
+            raise
+
+        run.status = 'DONE'
+        run.finished_at = timezone.now()
+        run.save(update_fields=['status', 'finished_at', 'updated_at'])
+        return run
+
+    def _selected(self, question_id):
+        return not self.question_ids or question_id in self.question_ids
+
+    def _submissions(self):
+        return Submission.objects.filter(exam_id=self.run.exam_id, status='GRADED')
+
+    def _chunks(self):
+        """(submission_ids, answer rows) per chunk, after the run's cursor."""
+        cursor = self.run.last_submission_id
+        while True:
+            submission_ids = list(
+                self._submissions().filter(id__gt=cursor).order_by('id').values_list('id', flat=True)[:self.chunk_size]
+            )
+            if not submission_ids:
+                return
+            answers = Answer.objects.filter(submission_id__in=submission_ids)
+            if self.question_ids:
+                answers = answers.filter(question_id__in=self.question_ids)
+            rows = list(answers.values_list(
+                'id', 'submission_id', 'question_id', 'selected_option_id', 'text_answer', 'is_correct'
+            ))
+            yield submission_ids, rows
+            cursor = submission_ids[-1]
+
+    def _graded_chunks(self, mcq, text):
+        """(submission_ids, changes) per chunk, in cursor order."""
+        if self.workers <= 0:
+            for submission_ids, rows in self._chunks():
+                yield submission_ids, grade_rows(mcq, text, rows, TEXT_SIMILARITY_THRESHOLD)
+            return
+
+        # Spawned workers need the app registry to unpickle `grade_rows`; forked ones already have it.
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=django.setup) as pool:
+            pending = deque()
+            for submission_ids, rows in self._chunks():
+                pending.append((submission_ids, pool.submit(grade_rows, mcq, text, rows, TEXT_SIMILARITY_THRESHOLD)))
+                # Keep every worker busy plus one chunk queued; results are written in order
+                if len(pending) > self.workers:
+                    submission_ids, future = pending.popleft()
+                    yield submission_ids, future.result()
+            while pending:
+                submission_ids, future = pending.popleft()
+                yield submission_ids, future.result()
+
+    def _write(self, submission_ids, changes, total_questions):
+        run = self.run
+        if self.question_ids:
+            # Only submissions with a flipped verdict can have a different score
+            rescore_ids = sorted({submission_id for _, submission_id, _ in changes})
+        else:
+            # Whole-exam runs also pick up questions added to or removed from the exam
+            rescore_ids = submission_ids
+
+        with transaction.atomic():
+            if changes:
+                Answer.objects.bulk_update(
+                    [Answer(id=answer_id, is_correct=verdict) for answer_id, _, verdict in changes],
+                    ['is_correct'], batch_size=BULK_UPDATE_BATCH_SIZE,
+                )
+            if rescore_ids:
+                Submission.objects.filter(id__in=rescore_ids).update(score=_score_expression(total_questions))
+            RegradeRun.objects.filter(id=run.id).update(
+                last_submission_id=submission_ids[-1],
+                processed_submissions=F('processed_submissions') + len(submission_ids),
+                changed_answers=F('changed_answers') + len(changes),
+                rescored_submissions=F('rescored_submissions') + len(rescore_ids),
+                updated_at=timezone.now(),
+            )
+
+        run.last_submission_id = submission_ids[-1]
+        run.processed_submissions += len(submission_ids)
+        run.changed_answers += len(changes)
+        run.rescored_submissions += len(rescore_ids)
+
+
+def _score_expression(total_questions):
+    """score = correct / total * 100, evaluated in the database (same operation order as the grader)."""
+    if not total_questions:
+        return Value(0.0)
+    correct = (
+        Answer.objects.filter(submission_id=OuterRef('pk'), is_correct=True)
+        .order_by().values('submission_id').annotate(count=Count('id')).values('count')
+    )
+    correct = Cast(Coalesce(Subquery(correct, output_field=IntegerField()), Value(0)), FloatField())
+    return correct / Value(float(total_questions)) * Value(100.0)
@@ -0,0 +1,78 @@
+"""
+Primary / replica database routing.
+
+Writes, grading, workers and management commands always use the primary
+(`default`). Read-only API views opt in to the `replica` alias for the
+duration of a request (see `ReplicaReadMixin` in core/views.py) via a
+context variable, so nothing outside those views can read stale data by
+accident.
+
+Read-your-writes: after a student's submission is stored they are pinned to
+the primary for `REPLICA_STICKY_SECONDS`, longer than the expected replication
+lag, so their own history never appears to lose the submission they just made.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_DB_ALIAS = 'replica'
+PRIMARY_PIN_KEY = 'db-primary-pin:{}'
+
+_read_alias = contextvars.ContextVar('read_alias', default=None)
+
+
+def replica_alias():
+    return REPLICA_DB_ALIAS if REPLICA_DB_ALIAS in settings.DATABASES else DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def read_from(alias):
+    """Route reads in this context to `alias` (None: the primary)."""
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def use_replica():
+    """Switch the current `read_from` context to the replica."""
+    _read_alias.set(replica_alias())
+
+
+def pin_to_primary(*user_ids):
+    """Send these users' reads to the primary until their writes have replicated."""
+    if user_ids:
+        cache.set_many({PRIMARY_PIN_KEY.format(user_id): 1 for user_id in user_ids}, settings.REPLICA_STICKY_SECONDS)
+
+
+async def apin_to_primary(*user_ids):
+    if user_ids:
+        await cache.aset_many({PRIMARY_PIN_KEY.format(user_id): 1 for user_id in user_ids}, settings.REPLICA_STICKY_SECONDS)
+
+
+def is_pinned_to_primary(user_id):
+    return user_id is not None and cache.get(PRIMARY_PIN_KEY.format(user_id)) is not None
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # Related lookups and prefetches follow the instance they start from, so a
+        # queryset pinned with .using() reads its whole tree from the same database.
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return _read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
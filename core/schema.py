@@ -0,0 +1,7 @@
+"""OpenAPI (drf-spectacular) extensions for the project's own classes."""
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+
+
+class StatelessJWTScheme(SimpleJWTScheme):
+    # Same bearer scheme as simplejwt's JWTAuthentication, which it extends
+    target_class = 'core.authentication.StatelessJWTAuthentication'
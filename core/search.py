@@ -0,0 +1,83 @@
+"""
+Question-bank and exam search.
+
+On PostgreSQL, `Question.search_vector` / `Exam.search_vector` are kept up
+to date by triggers (migration 0010) and GIN-indexed, so a search is an index
+probe (`search_vector @@ websearch_to_tsquery(...)`) ranked with `ts_rank`
+instead of an `icontains` scan over every row. Exam metadata filters are
+combined into one jsonb containment test (`metadata @> {...}`) served by the
+`jsonb_path_ops` GIN index; `course` uses its own btree index.
+
+Other backends (SQLite in local tests) fall back to `icontains` and JSON key
+lookups with a constant rank: same API and results, no index support.
+"""
+import json
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import Cast
+from django.db.models.fields.json import KT
+
+from .models import Exam, Question
+
+# Must match the configuration used by the triggers in migration 0010
+SEARCH_CONFIG = 'english'
+
+
+def _full_text():
+    return connection.vendor == 'postgresql'
+
+
+def _ranked(queryset, query, fallback_fields):
+    """Filter `queryset` to rows matching `query`, annotated with `rank`."""
+    if not query:
+        return queryset.annotate(rank=Value(0.0, output_field=FloatField()))
+    if _full_text():
+        search = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+        # ts_rank is a float4; as float8 it survives the round trip through pagination cursors exactly
+        rank = Cast(SearchRank(F('search_vector'), search), FloatField())
+        return queryset.filter(search_vector=search).annotate(rank=rank)
+    matches = Q()
+    for field in fallback_fields:
+        matches |= Q(**{f'{field}__icontains': query})
+    return queryset.filter(matches).annotate(rank=Value(0.0, output_field=FloatField()))
+
+
+def search_questions(query='', question_type=None):
+    """Questions matching the text query (text, then expected answer), best match first."""
+    questions = Question.objects.defer('search_vector')
+    if question_type:
+        questions = questions.filter(question_type=question_type)
+    return _ranked(questions, query, ('text', 'expected_answer')).order_by('-rank', '-id')
+
+
+def search_exams(query='', tags=(), difficulty=None, course=None):
+    """
+    Exams matching the text query (title, course, tags, description) that carry
+    every tag in `tags` and the given difficulty / course, best match first.
+    """
+    exams = Exam.objects.defer('search_vector')
+    if course:
+        exams = exams.filter(course=course)
+    containment = {}
+    if tags:
+        containment['tags'] = list(tags)
+    if difficulty:
+        containment['difficulty'] = difficulty
+    if containment:
+        exams = _metadata_contains(exams, containment)
+    return _ranked(exams, query, ('title', 'course', 'description')).order_by('-rank', '-id')
+
+
+def _metadata_contains(exams, containment):
+    if _full_text():
+        return exams.filter(metadata__contains=containment)
+    # No jsonb containment: compare scalars by key, find tags in the serialized array
+    if 'difficulty' in containment:
+        exams = exams.filter(metadata__difficulty=containment['difficulty'])
+    if 'tags' in containment:
+        exams = exams.annotate(tags_json=KT('metadata__tags'))
+        for tag in containment['tags']:
+            exams = exams.filter(tags_json__contains=json.dumps(tag, ensure_ascii=False))
+    return exams
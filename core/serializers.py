@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Exam, Question, QuestionOption, Submission, Answer, ExamQuestion
+from .models import Exam, Question, QuestionOption, Submission, Answer, ExamQuestion, RegradeRun
+from .stats import percentile_rank
 
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
@@ -33,11 +34,39 @@ class ExamSerializer(serializers.ModelSerializer):
         fields = ('id', 'title', 'course', 'description', 'duration_minutes', 'questions', 'created_at')
         
     def get_questions(self, obj):
-        # Fetch via through-model to respect order
-        exam_questions = ExamQuestion.objects.filter(exam=obj).select_related('question').prefetch_related('question__options')
+        # Read the through-model (ordered) from the prefetch cache when the view
+        # loaded it (see ExamViewSet.get_queryset); otherwise fetch it for this exam.
+        if 'exam_questions' in getattr(obj, '_prefetched_objects_cache', {}):
+            exam_questions = obj.exam_questions.all()
+        else:
+            exam_questions = (
+                ExamQuestion.objects.filter(exam=obj).select_related('question').defer('question__search_vector')
+                .prefetch_related('question__options')
+            )
         questions = [eq.question for eq in exam_questions]
         return QuestionSerializer(questions, many=True).data
 
+class ExamSummarySerializer(serializers.ModelSerializer):
+    """Catalogue view of an exam: no question tree."""
+    class Meta:
+        model = Exam
+        fields = ('id', 'title', 'course', 'description', 'duration_minutes', 'created_at')
+
+class ExamSearchResultSerializer(serializers.ModelSerializer):
+    rank = serializers.FloatField(read_only=True, help_text="Relevance (0 without a text query)")
+
+    class Meta:
+        model = Exam
+        fields = ('id', 'title', 'course', 'description', 'duration_minutes', 'metadata', 'created_at', 'rank')
+
+class QuestionSearchResultSerializer(serializers.ModelSerializer):
+    """Question bank entry for exam authors (staff only: includes the expected answer)."""
+    rank = serializers.FloatField(read_only=True, help_text="Relevance (0 without a text query)")
+
+    class Meta:
+        model = Question
+        fields = ('id', 'text', 'question_type', 'expected_answer', 'rank')
+
 class AnswerInputSerializer(serializers.Serializer):
     question_id = serializers.IntegerField()
     selected_option_id = serializers.IntegerField(required=False, allow_null=True)
@@ -47,7 +76,49 @@ class SubmissionCreateSerializer(serializers.Serializer):
     exam_id = serializers.IntegerField()
     answers = AnswerInputSerializer(many=True)
 
+class DraftSaveSerializer(serializers.Serializer):
+    answers = AnswerInputSerializer(many=True)
+
+class DraftSerializer(serializers.Serializer):
+    """An autosaved draft: the IN_PROGRESS submission and every answer saved so far."""
+    submission_id = serializers.IntegerField()
+    answers = AnswerInputSerializer(many=True)
+
+class BulkSubmissionItemSerializer(SubmissionCreateSerializer):
+    """One submission in a bulk upload, made on behalf of `student_id`."""
+    student_id = serializers.IntegerField()
+    submitted_at = serializers.DateTimeField(required=False, help_text="When the answers were collected (offline)")
+
 class SubmissionSerializer(serializers.ModelSerializer):
+    percentile = serializers.SerializerMethodField(
+        help_text="Percentile rank within the exam (with `?include=percentile`; null until graded)."
+    )
+
     class Meta:
         model = Submission
-        fields = ('id', 'exam', 'score', 'status', 'started_at', 'submitted_at')
+        fields = ('id', 'exam', 'score', 'status', 'started_at', 'submitted_at', 'percentile')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Only when the view loaded the exams' score histograms (see MySubmissionsView)
+        if 'score_histograms' not in self.context:
+            self.fields.pop('percentile')
+
+    def get_percentile(self, submission):
+        if submission.status != 'GRADED':
+            return None
+        return percentile_rank(self.context['score_histograms'].get(submission.exam_id), submission.score)
+
+class RegradeRequestSerializer(serializers.Serializer):
+    question_ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, default=list,
+        help_text="Questions whose key changed; omit to re-grade every question.",
+    )
+
+class RegradeRunSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RegradeRun
+        fields = (
+            'id', 'exam', 'question_ids', 'status', 'total_submissions', 'processed_submissions',
+            'changed_answers', 'rescored_submissions', 'last_error', 'created_at', 'updated_at', 'finished_at',
+        )
@@ -1,49 +1,395 @@
-from difflib import SequenceMatcher
+import logging
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
 from django.utils import timezone
-from .models import Submission, Answer, QuestionOption
+from .answer_keys import get_answer_keys
+from .drafts import (
+    DraftClosed, discard_draft, draft_answers, find_draft, get_cached_draft, is_expired, upsert_answers,
+)
+from .models import Submission, Answer, GradingJob, QuestionOption
+from .similarity import TextSimilarityEngine
+from .stats import StatsDelta, apply_delta
+
+logger = logging.getLogger(__name__)
+
+TEXT_SIMILARITY_THRESHOLD = 0.8
+
+_text_engine = None
+
+
+def get_text_engine():
+    """Process-wide TEXT similarity engine configured from settings."""
+    global _text_engine
+    if _text_engine is None:
+        _text_engine = TextSimilarityEngine(
+            threshold=TEXT_SIMILARITY_THRESHOLD,
+            max_workers=settings.TEXT_GRADING_WORKERS,
+            parallel_min_batch=settings.TEXT_GRADING_PARALLEL_MIN_BATCH,
+        )
+    return _text_engine
+
 
 class MockGradingService:
     @staticmethod
     def grade_submission(submission_id):
-        submission = Submission.objects.get(id=submission_id)
-        
-        # Ensure we are linking via the new junction table if needed, 
-        # but for grading we just check the Submission->Answer relations.
-        answers = submission.answers.all()
-        # Correctly counting total questions from the junction table
-        total_questions = submission.exam.exam_questions.count()
-        correct_count = 0
-        
-        for answer in answers:
-            question = answer.question
-            is_correct = False
-            
-            if question.question_type == 'MCQ':
-                # Senior-level logic: Check the boolean flag on the Foreign Key
-                if answer.selected_option and answer.selected_option.is_correct:
-                    is_correct = True
-                    
-            elif question.question_type == 'TEXT':
-                # Fuzzy match for Text
-                # Compare student input vs expected_answer text on Question model
-                similarity = SequenceMatcher(None, answer.text_answer.lower(), question.expected_answer.lower()).ratio()
-                if similarity > 0.8: 
-                    is_correct = True
-            
-            answer.is_correct = is_correct
-            answer.save()
-            
-            if is_correct:
-                correct_count += 1
-        
-        # Calculate Score
-        if total_questions > 0:
-            score = (correct_count / total_questions) * 100
-        else:
-            score = 0
-            
-        submission.score = score
-        submission.status = 'GRADED'
-        submission.submitted_at = timezone.now()
-        submission.save()
-        return score
+        """Grade a single submission. See `grade_submissions`."""
+        scores = MockGradingService.grade_submissions([submission_id])
+        if submission_id not in scores:
+            raise Submission.DoesNotExist(f"Submission {submission_id} does not exist.")
+        return scores[submission_id]
+
+    @staticmethod
+    def grade_submissions(submission_ids):
+        """
+        Set-based grading: a fixed number of queries regardless of how many
+        submissions are in the batch or how many questions each exam has.
+
+        Everything runs in one transaction that first locks the submission rows.
+
+        1. Lock and load the submissions (exam id and previous result only).
+        2. Fetch each exam's compiled answer key (cache; two queries on a miss).
+        3. Load every answer's raw input in one query - no joins.
+        4. Write all verdicts back with a single bulk_update.
+        5. Write score/status with a single bulk_update.
+        6. Apply the batch's ExamStats/QuestionStats deltas (core/stats.py).
+
+        Returns a {submission_id: score} mapping.
+        """
+        with transaction.atomic():
+            # Lock the rows (in id order, so concurrent batches cannot deadlock) before reading the
+            # previous results: a second grader of the same submission - a requeued stale job, a
+            # deadline sweep - waits and then sees it as already graded instead of counting it twice.
+            submissions = list(
+                Submission.objects.select_for_update().filter(id__in=submission_ids)
+                .only('id', 'exam_id', 'status', 'score', 'submitted_at').order_by('id')
+            )
+            if not submissions:
+                return {}
+
+            answer_keys = get_answer_keys([s.exam_id for s in submissions])
+            exam_by_submission = {s.id: s.exam_id for s in submissions}
+            # Re-grading only contributes the difference to the running statistics
+            previously_graded = {s.id for s in submissions if s.status == 'GRADED'}
+
+            answers = list(
+                Answer.objects.filter(submission_id__in=list(exam_by_submission))
+                .only('id', 'submission_id', 'question_id', 'selected_option_id', 'text_answer', 'is_correct')
+            )
+
+            previous_verdicts = {answer.id: answer.is_correct for answer in answers}
+            # MCQ: the selected option must be one of the key's correct options.
+            # TEXT: graded as one batch so the engine can share work per question
+            # and fan large batches out to its process pool.
+            text_answers, text_pairs = [], []
+            for answer in answers:
+                answer_key = answer_keys[exam_by_submission[answer.submission_id]]
+                expected = answer_key.text.get(answer.question_id)
+                if expected is not None:
+                    text_answers.append(answer)
+                    text_pairs.append((answer.text_answer, expected))
+                else:
+                    # Also covers questions no longer on the exam: never correct.
+                    answer.is_correct = answer_key.is_option_correct(answer.question_id, answer.selected_option_id)
+
+            for answer, verdict in zip(text_answers, get_text_engine().match_many(text_pairs)):
+                answer.is_correct = verdict
+
+            delta = StatsDelta()
+            correct_counts = {s.id: 0 for s in submissions}
+            for answer in answers:
+                if answer.is_correct:
+                    correct_counts[answer.submission_id] += 1
+                delta.add_answer(
+                    exam_by_submission[answer.submission_id], answer.question_id, answer.is_correct,
+                    was_correct=previous_verdicts[answer.id], was_graded=answer.submission_id in previously_graded,
+                )
+
+            now = timezone.now()
+            scores = {}
+            for submission in submissions:
+                total_questions = answer_keys[submission.exam_id].total_questions
+                # Calculate Score
+                if total_questions > 0:
+                    score = (correct_counts[submission.id] / total_questions) * 100
+                else:
+                    score = 0
+                delta.add_submission(
+                    submission.exam_id, score, old_score=submission.score, was_graded=submission.id in previously_graded
+                )
+                submission.score = score
+                submission.status = 'GRADED'
+                # Keep the original submission time if the view already stamped it (async mode)
+                submission.submitted_at = submission.submitted_at or now
+                scores[submission.id] = score
+
+            if answers:
+                Answer.objects.bulk_update(answers, ['is_correct'])
+            Submission.objects.bulk_update(submissions, ['score', 'status', 'submitted_at'])
+            apply_delta(delta)
+        return scores
+
+
+class SubmissionValidationError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+    @property
+    def data(self):
+        """Response body: a 404 keeps the `{"detail": ...}` shape of DRF's Http404 handling."""
+        if self.status_code == 404:
+            return {"detail": self.message}
+        return {"error": self.message}
+
+
+class SubmissionService:
+    @staticmethod
+    def load_option_questions(answer_lists):
+        """{option_id: question_id} for every option referenced in `answer_lists`, in one query."""
+        option_ids = {
+            ans['selected_option_id']
+            for answers_data in answer_lists for ans in answers_data
+            if ans.get('selected_option_id')
+        }
+        if not option_ids:
+            return {}
+        return dict(QuestionOption.objects.filter(id__in=option_ids).values_list('id', 'question_id'))
+
+    @staticmethod
+    async def aload_option_questions(answer_lists):
+        """Async `load_option_questions` (same single query)."""
+        option_ids = {
+            ans['selected_option_id']
+            for answers_data in answer_lists for ans in answers_data
+            if ans.get('selected_option_id')
+        }
+        if not option_ids:
+            return {}
+        return {
+            option_id: question_id
+            async for option_id, question_id in QuestionOption.objects.filter(id__in=option_ids).values_list('id', 'question_id')
+        }
+
+    @staticmethod
+    def store_submission(student_id, exam_id, answers, enqueue=False):
+        """
+        Insert a submission, its answers (and queue entry) in one transaction.
+        Duplicates surface as IntegrityError from the unique (student, exam) constraint.
+
+        A student with an autosaved draft (core/drafts.py) submits that draft instead:
+        see `submit_draft`.
+        """
+        draft = get_cached_draft(student_id, exam_id)
+        if draft is None:
+            try:
+                with transaction.atomic():
+                    submission = Submission.objects.create(
+                        student_id=student_id,
+                        exam_id=exam_id,
+                        status='SUBMITTED',
+                        submitted_at=timezone.now(),
+                    )
+                    for answer in answers:
+                        answer.submission = submission
+                    Answer.objects.bulk_create(answers)
+                    if enqueue:
+                        GradingQueue.enqueue(submission.id)
+                return submission
+            except IntegrityError:
+                # Either a real duplicate or a draft the cache no longer holds
+                draft = find_draft(student_id, exam_id)
+                if draft is None:
+                    raise
+        return SubmissionService.submit_draft(student_id, exam_id, draft, answers, enqueue)
+
+    @staticmethod
+    def submit_draft(student_id, exam_id, draft, answers, enqueue=False):
+        """
+        Flip an IN_PROGRESS submission to SUBMITTED. Under the submission's row lock the
+        latest cached draft and the posted `answers` (which win) are upserted in the same
+        transaction: a draft flush either committed before or skips the submitted row.
+        Raises IntegrityError if the draft was submitted meanwhile (also by the
+        deadline sweeper) and DraftClosed once it is past its deadline.
+        """
+        if is_expired(draft):
+            raise DraftClosed("The time for this exam is over.")
+        submission_id = draft['submission']
+        now = timezone.now()
+        open_until = Q(deadline_at__isnull=True) | Q(
+            deadline_at__gte=now - timedelta(seconds=settings.DEADLINE_GRACE_SECONDS)
+        )
+        with transaction.atomic():
+            locked = list(
+                Submission.objects.select_for_update()
+                .filter(open_until, id=submission_id, status='IN_PROGRESS').values_list('id', flat=True)
+            )
+            if not locked:
+                if is_expired(draft):
+                    raise DraftClosed("The time for this exam is over.")
+                raise IntegrityError(f"Submission {submission_id} has already been submitted.")
+            # Re-read under the lock: saves made since `draft` was fetched are included
+            draft = get_cached_draft(student_id, exam_id) or draft
+            by_question = {answer.question_id: answer for answer in draft_answers(draft)}
+            for answer in answers:
+                answer.submission_id = submission_id
+                by_question[answer.question_id] = answer
+
+            Submission.objects.filter(id=submission_id).update(status='SUBMITTED', submitted_at=now)
+            if by_question:
+                upsert_answers(list(by_question.values()))
+            if enqueue:
+                GradingQueue.enqueue(submission_id)
+        discard_draft(student_id, exam_id)
+        return Submission.objects.get(id=submission_id)
+
+    @staticmethod
+    def build_answers(exam_id, answers_data, answer_key=None, option_questions=None):
+        """
+        Validate submitted answers against the exam and return unsaved `Answer`s
+        (without `submission`) in payload order.
+
+        Exam membership comes from the cached answer key and every referenced
+        option is fetched in a single `id__in` query (id + question_id only),
+        so the cost does not grow with the number of answers. Batch callers
+        pass `answer_key`/`option_questions` they already loaded.
+
+        Raises SubmissionValidationError: 400 for a question outside the exam, answered
+        twice or an option belonging to another question, 404 for an unknown option, checked
+        in payload order like the original per-answer lookups.
+        """
+        if answer_key is None:
+            answer_key = get_answer_keys([exam_id])[exam_id]
+        if option_questions is None:
+            option_questions = SubmissionService.load_option_questions([answers_data])
+
+        answers = []
+        seen = set()
+        for ans in answers_data:
+            q_id = ans['question_id']
+            if q_id not in answer_key.mcq and q_id not in answer_key.text:
+                raise SubmissionValidationError(f"Question {q_id} is not part of this exam")
+            if q_id in seen:
+                raise SubmissionValidationError(f"Question {q_id} is answered more than once")
+            seen.add(q_id)
+
+            option_id = ans.get('selected_option_id') or None
+            if option_id is not None:
+                if option_id not in option_questions:
+                    raise SubmissionValidationError("No QuestionOption matches the given query.", status_code=404)
+                # Verify option belongs to question
+                if option_questions[option_id] != q_id:
+                    raise SubmissionValidationError(f"Option {option_id} does not belong to Question {q_id}")
+
+            answers.append(Answer(
+                question_id=q_id,
+                selected_option_id=option_id,
+                text_answer=ans.get('text_answer', ''),
+            ))
+        return answers
+
+
+class GradingQueue:
+    """
+    Database-backed grading queue (see `GradingJob`).
+
+    The submit view enqueues, `manage.py grade_worker` claims and grades.
+    Claiming uses SELECT ... FOR UPDATE SKIP LOCKED so any number of workers
+    can poll the same table without handing out a job twice.
+    """
+
+    @staticmethod
+    def enqueue(submission_id):
+        return GradingJob.objects.create(submission_id=submission_id)
+
+    @staticmethod
+    def claim(batch_size, worker_id=''):
+        """Atomically move up to `batch_size` due PENDING jobs to RUNNING and return them."""
+        now = timezone.now()
+        with transaction.atomic():
+            jobs = list(
+                GradingJob.objects.select_for_update(skip_locked=True)
+                .filter(status='PENDING', run_after__lte=now)
+                .order_by('run_after', 'id')[:batch_size]
+            )
+            if jobs:
+                GradingJob.objects.filter(id__in=[job.id for job in jobs]).update(
+                    status='RUNNING',
+                    locked_at=now,
+                    locked_by=worker_id,
+                    attempts=F('attempts') + 1,
+                )
+        for job in jobs:
+            job.attempts += 1
+        return jobs
+
+    @staticmethod
+    def process(jobs, max_attempts=None, backoff_seconds=None):
+        """
+        Grade a claimed batch. The whole batch is graded set-based in one go;
+        if that fails, jobs are retried one by one so a single bad submission
+        cannot hold back the rest of the batch.
+        Returns (done_count, failed_count).
+        """
+        if not jobs:
+            return 0, 0
+        max_attempts = max_attempts or settings.GRADING_WORKER_MAX_ATTEMPTS
+        backoff_seconds = backoff_seconds or settings.GRADING_WORKER_BACKOFF_SECONDS
+
+        try:
+            MockGradingService.grade_submissions([job.submission_id for job in jobs])
+            GradingQueue._mark_done(jobs)
+            return len(jobs), 0
+        except Exception:
+            if len(jobs) == 1:
+                GradingQueue._mark_failed(jobs[0], max_attempts, backoff_seconds)
+                return 0, 1
+            logger.exception("Batch grading failed for %d jobs; retrying individually", len(jobs))
+
+        done = failed = 0
+        for job in jobs:
+            try:
+                MockGradingService.grade_submission(job.submission_id)
+                GradingQueue._mark_done([job])
+                done += 1
+            except Exception:
+                GradingQueue._mark_failed(job, max_attempts, backoff_seconds)
+                failed += 1
+        return done, failed
+
+    @staticmethod
+    def requeue_stale(stale_after_seconds):
+        """Return jobs whose worker died mid-batch (RUNNING for too long) to the queue."""
+        cutoff = timezone.now() - timedelta(seconds=stale_after_seconds)
+        return GradingJob.objects.filter(status='RUNNING', locked_at__lt=cutoff).update(
+            status='PENDING', locked_at=None, locked_by=''
+        )
+
+    @staticmethod
+    def _mark_done(jobs):
+        GradingJob.objects.filter(id__in=[job.id for job in jobs]).update(
+            status='DONE', locked_at=None, last_error='', updated_at=timezone.now()
+        )
+
+    @staticmethod
+    def _mark_failed(job, max_attempts, backoff_seconds):
+        logger.exception("Grading job %s failed (attempt %s/%s)", job.id, job.attempts, max_attempts)
+        error = traceback.format_exc(limit=5)
+        if job.attempts >= max_attempts:
+            GradingJob.objects.filter(id=job.id).update(
+                status='FAILED', locked_at=None, last_error=error, updated_at=timezone.now()
+            )
+            return
+        # Exponential backoff: base, 2*base, 4*base, ...
+        delay = backoff_seconds * (2 ** (job.attempts - 1))
+        GradingJob.objects.filter(id=job.id).update(
+            status='PENDING',
+            run_after=timezone.now() + timedelta(seconds=delay),
+            locked_at=None,
+            locked_by='',
+            last_error=error,
+            updated_at=timezone.now(),
+        )
@@ -0,0 +1,70 @@
+"""
+Cache invalidation for derived exam content (answer keys, rendered payloads).
+Any change to Exam, ExamQuestion, Question or QuestionOption bumps the
+version of every exam it belongs to.
+
+Versions are bumped immediately and again once the surrounding transaction
+commits: the first bump stops other processes from reusing the old entries,
+the second discards anything they rebuilt from not-yet-committed data.
+
+User changes likewise drop the user's cached auth status (`core.authentication`).
+
+Note: queryset.update()/bulk_create() bypass these signals; code paths that use
+them must call `core.caching.bump_exam_versions` (or
+`core.authentication.invalidate_user_status`) themselves.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_user_status
+from .caching import bump_exam_versions, forget_exam_versions
+from .models import Exam, ExamQuestion, Question, QuestionOption
+
+
+def _invalidate(exam_ids):
+    exam_ids = set(exam_ids)
+    if not exam_ids:
+        return
+    bump_exam_versions(exam_ids)
+    transaction.on_commit(lambda: bump_exam_versions(exam_ids))
+
+
+def _exam_ids_for_question(question_id):
+    return ExamQuestion.objects.filter(question_id=question_id).values_list('exam_id', flat=True)
+
+
+@receiver(post_save, sender=Exam)
+def exam_changed(sender, instance, **kwargs):
+    _invalidate([instance.id])
+
+
+@receiver(post_delete, sender=Exam)
+def exam_deleted(sender, instance, **kwargs):
+    # No version left behind: a deleted exam must not answer If-None-Match with 304
+    exam_ids = [instance.id]
+    forget_exam_versions(exam_ids)
+    transaction.on_commit(lambda: forget_exam_versions(exam_ids))
+
+
+@receiver([post_save, post_delete], sender=ExamQuestion)
+def exam_question_changed(sender, instance, **kwargs):
+    _invalidate([instance.exam_id])
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, **kwargs):
+    _invalidate(_exam_ids_for_question(instance.id))
+
+
+@receiver([post_save, post_delete], sender=QuestionOption)
+def question_option_changed(sender, instance, **kwargs):
+    _invalidate(_exam_ids_for_question(instance.question_id))
+
+
+@receiver([post_save, post_delete], sender=get_user_model())
+def user_changed(sender, instance, **kwargs):
+    # Cached auth status (core.authentication): drop it now and again after commit, as for exams
+    invalidate_user_status(instance.pk)
+    transaction.on_commit(lambda: invalidate_user_status(instance.pk))
@@ -0,0 +1,139 @@
+"""
+Text similarity engine used to grade TEXT answers.
+
+The verdict is exactly the original rule:
+
+    SequenceMatcher(None, answer.lower(), expected.lower()).ratio() > threshold
+
+but cheap upper bounds are checked first so answers that cannot possibly
+reach the threshold never pay for the quadratic `ratio()`:
+
+1. length bound  - 2 * min(len) / (len_a + len_b), no allocation at all
+2. quick_ratio   - multiset character overlap, O(n)
+3. ratio         - the real (expensive) longest-matching-blocks computation
+
+Each bound is >= ratio() and computed with the same formula, so rejecting on
+a bound can never change a verdict. Pairs are grouped by expected answer so
+the matcher's index of the expected text is built once per question rather
+than once per answer. Large batches are fanned out to a process pool.
+
+Deliberately free of Django imports so pool workers stay light.
+"""
+import atexit
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
+
+DEFAULT_THRESHOLD = 0.8
+
+
+def _ratio(matches, length):
+    # Same arithmetic as difflib._calculate_ratio so bounds compare exactly with ratio().
+    if length:
+        return 2.0 * matches / length
+    return 1.0
+
+
+def match_group(expected, answers, threshold=DEFAULT_THRESHOLD):
+    """Verdicts for many answers against a single (already lowercased) expected answer."""
+    matcher = SequenceMatcher(None)
+    matcher.set_seq2(expected)
+    len_expected = len(expected)
+    verdicts = []
+    for answer in answers:
+        len_answer = len(answer)
+        if _ratio(min(len_answer, len_expected), len_answer + len_expected) <= threshold:
+            verdicts.append(False)
+            continue
+        if answer == expected:
+            verdicts.append(True)
+            continue
+        matcher.set_seq1(answer)
+        verdicts.append(matcher.quick_ratio() > threshold and matcher.ratio() > threshold)
+    return verdicts
+
+
+def _match_chunk(chunk, threshold):
+    # Process-pool entry point: [(expected, [answers...]), ...] -> [[verdicts...], ...]
+    return [match_group(expected, answers, threshold) for expected, answers in chunk]
+
+
+_pool = None
+_pool_workers = 0
+
+
+def _get_pool(max_workers):
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != max_workers:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = ProcessPoolExecutor(max_workers=max_workers)
+        _pool_workers = max_workers
+    return _pool
+
+
+@atexit.register
+def _shutdown_pool():
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+
+
+class TextSimilarityEngine:
+    """
+    Grades (answer, expected) pairs. Inputs are raw strings; lowercasing is done here.
+
+    `max_workers` > 1 enables the process pool for batches of at least
+    `parallel_min_batch` pairs; smaller batches are cheaper to grade inline
+    than to pickle across processes.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, max_workers=0, parallel_min_batch=200):
+        self.threshold = threshold
+        self.max_workers = max_workers
+        self.parallel_min_batch = parallel_min_batch
+
+    def is_match(self, answer, expected):
+        return match_group(expected.lower(), [answer.lower()], self.threshold)[0]
+
+    def match_many(self, pairs):
+        """Return a list of verdicts aligned with `pairs` ([(answer, expected), ...])."""
+        groups = {}
+        for index, (answer, expected) in enumerate(pairs):
+            indexes, answers = groups.setdefault(expected.lower(), ([], []))
+            indexes.append(index)
+            answers.append(answer.lower())
+
+        verdicts = [False] * len(pairs)
+        items = list(groups.items())
+        if self.max_workers > 1 and len(pairs) >= self.parallel_min_batch:
+            results = self._match_parallel(items)
+        else:
+            results = [match_group(expected, answers, self.threshold) for expected, (_, answers) in items]
+
+        for (_, (indexes, _)), group_verdicts in zip(items, results):
+            for index, verdict in zip(indexes, group_verdicts):
+                verdicts[index] = verdict
+        return verdicts
+
+    def _match_parallel(self, items):
+        # Split into roughly equal chunks by answer count; big groups are split too.
+        target = max(1, sum(len(answers) for _, (_, answers) in items) // (self.max_workers * 4))
+        chunks, chunk, size, owners = [], [], 0, []
+        for group_index, (expected, (_, answers)) in enumerate(items):
+            for start in range(0, len(answers), target):
+                part = answers[start:start + target]
+                chunk.append((expected, part))
+                owners.append(group_index)
+                size += len(part)
+                if size >= target:
+                    chunks.append(chunk)
+                    chunk, size = [], 0
+        if chunk:
+            chunks.append(chunk)
+
+        pool = _get_pool(self.max_workers)
+        results = [[] for _ in items]
+        flat = (part for chunk_result in pool.map(_match_chunk, chunks, [self.threshold] * len(chunks))
+                for part in chunk_result)
+        for group_index, part in zip(owners, flat):
+            results[group_index].extend(part)
+        return results
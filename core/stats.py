@@ -0,0 +1,275 @@
+"""
+Incrementally maintained exam / question statistics.
+
+The grading service hands over per-exam and per-question deltas for every
+batch it grades; they are applied with atomic `F()` increments (one UPDATE
+per table, using CASE for the per-row amounts), so dashboards read a single
+row instead of aggregating over every submission and answer.
+
+Re-grading an already GRADED submission contributes only the difference
+between its new and previous results, so counters stay exact.
+
+`ExamStats.score_histogram` counts graded submissions per fixed-width score
+bucket (`HISTOGRAM_BUCKETS` over 0-100). Batches merge their bucket deltas
+into the locked row in the same UPDATE, so a score distribution or a
+percentile rank costs O(buckets) instead of a scan of the exam's submissions.
+"""
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, IntegerField, JSONField, Q, Sum, Value, When
+
+from .models import Answer, ExamQuestion, ExamStats, QuestionStats, Submission
+
+EXAM_COUNTERS = ('graded_count', 'score_sum', 'score_sq_sum', 'pass_count')
+QUESTION_COUNTERS = ('answered_count', 'correct_count')
+FLOAT_COUNTERS = {'score_sum', 'score_sq_sum'}
+# Fixed-width buckets over 0-100: bucket i holds scores in [i, i + 1), the last one also 100
+HISTOGRAM_BUCKETS = 100
+
+
+def is_pass(score):
+    return score is not None and score >= settings.PASS_MARK
+
+
+def score_bucket(score):
+    return max(0, min(int(score * HISTOGRAM_BUCKETS // 100), HISTOGRAM_BUCKETS - 1))
+
+
+def build_histogram(scores):
+    histogram = [0] * HISTOGRAM_BUCKETS
+    for score in scores:
+        histogram[score_bucket(score)] += 1
+    return histogram
+
+
+def merge_histogram(histogram, delta):
+    """`histogram` (stored list, possibly empty) plus a {bucket: amount} delta."""
+    merged = list(histogram) or [0] * HISTOGRAM_BUCKETS
+    for bucket, amount in delta.items():
+        merged[bucket] += amount
+    return merged
+
+
+def percentile_rank(histogram, score):
+    """
+    Share of graded submissions scoring below `score`, counting half of its own
+    bucket (mid-rank, so the top and bottom scorers are not pinned to 100 / 0).
+    None without graded submissions.
+    """
+    total = sum(histogram or ())
+    if not total or score is None:
+        return None
+    bucket = score_bucket(score)
+    return round((sum(histogram[:bucket]) + histogram[bucket] / 2) / total * 100, 1)
+
+
+class StatsDelta:
+    """Accumulates the change a grading batch makes to the aggregates."""
+
+    def __init__(self):
+        self.exams = defaultdict(lambda: dict.fromkeys(EXAM_COUNTERS, 0))
+        self.questions = defaultdict(lambda: dict.fromkeys(QUESTION_COUNTERS, 0))
+        self.histograms = defaultdict(Counter)
+
+    def add_submission(self, exam_id, new_score, old_score=None, was_graded=False):
+        delta = self.exams[exam_id]
+        histogram = self.histograms[exam_id]
+        histogram[score_bucket(new_score)] += 1
+        if was_graded:
+            if old_score is not None:
+                histogram[score_bucket(old_score)] -= 1
+            delta['score_sum'] += new_score - (old_score or 0)
+            delta['score_sq_sum'] += new_score ** 2 - (old_score or 0) ** 2
+            delta['pass_count'] += int(is_pass(new_score)) - int(is_pass(old_score))
+        else:
+            delta['graded_count'] += 1
+            delta['score_sum'] += new_score
+            delta['score_sq_sum'] += new_score ** 2
+            delta['pass_count'] += int(is_pass(new_score))
+
+    def add_answer(self, exam_id, question_id, is_correct, was_correct=None, was_graded=False):
+        delta = self.questions[(exam_id, question_id)]
+        if was_graded:
+            delta['correct_count'] += int(bool(is_correct)) - int(bool(was_correct))
+        else:
+            delta['answered_count'] += 1
+            delta['correct_count'] += int(bool(is_correct))
+
+
+def _case(field, amounts, key_fields):
+    """F(field) + CASE WHEN <row key> THEN <amount> ... ELSE 0 END"""
+    output = FloatField() if field in FLOAT_COUNTERS else IntegerField()
+    whens = [
+        When(Q(**dict(zip(key_fields, key if isinstance(key, tuple) else (key,)))), then=Value(amount))
+        for key, amount in amounts.items()
+    ]
+    return F(field) + Case(*whens, default=Value(0), output_field=output)
+
+
+def apply_delta(delta):
+    """
+    Write a StatsDelta with at most five queries (ensure rows, lock the exam rows
+    whose histogram changes, one UPDATE per table). Call inside a transaction.
+    """
+    histograms = {
+        exam_id: {bucket: amount for bucket, amount in counts.items() if amount}
+        for exam_id, counts in delta.histograms.items()
+    }
+    histograms = {exam_id: counts for exam_id, counts in histograms.items() if counts}
+    exams = {exam_id: d for exam_id, d in delta.exams.items() if any(d.values()) or exam_id in histograms}
+    questions = {key: d for key, d in delta.questions.items() if any(d.values())}
+    if exams:
+        ExamStats.objects.bulk_create([ExamStats(exam_id=exam_id) for exam_id in exams], ignore_conflicts=True)
+        updates = {
+            field: _case(field, {exam_id: d[field] for exam_id, d in exams.items() if d[field]}, ('exam_id',))
+            for field in EXAM_COUNTERS if any(d[field] for d in exams.values())
+        }
+        if histograms:
+            # A JSON list cannot be incremented in place: read it under the row lock (ordered, so
+            # concurrent batches lock in the same order) and write the merged list in the same UPDATE.
+            stored = ExamStats.objects.select_for_update().filter(exam_id__in=list(histograms)).order_by('exam_id')
+            whens = [
+                When(exam_id=exam_id, then=Value(merge_histogram(histogram, histograms[exam_id]), JSONField()))
+                for exam_id, histogram in stored.values_list('exam_id', 'score_histogram')
+            ]
+            updates['score_histogram'] = Case(*whens, default=F('score_histogram'), output_field=JSONField())
+        ExamStats.objects.filter(exam_id__in=list(exams)).update(**updates)
+    if questions:
+        QuestionStats.objects.bulk_create(
+            [QuestionStats(exam_id=exam_id, question_id=question_id) for exam_id, question_id in questions],
+            ignore_conflicts=True,
+        )
+        updates = {
+            field: _case(field, {key: d[field] for key, d in questions.items() if d[field]}, ('exam_id', 'question_id'))
+            for field in QUESTION_COUNTERS if any(d[field] for d in questions.values())
+        }
+        QuestionStats.objects.filter(
+            exam_id__in={exam_id for exam_id, _ in questions},
+            question_id__in={question_id for _, question_id in questions},
+        ).update(**updates)
+
+
+def compute_exam_stats(exam_id):
+    """Recompute an exam's aggregates from scratch (full scans; used by rebuild/verify)."""
+    graded = Submission.objects.filter(exam_id=exam_id, status='GRADED')
+    totals = graded.aggregate(
+        graded_count=Count('id'),
+        score_sum=Sum('score'),
+        score_sq_sum=Sum(F('score') * F('score')),
+        pass_count=Count('id', filter=Q(score__gte=settings.PASS_MARK)),
+    )
+    exam = {field: totals[field] or 0 for field in EXAM_COUNTERS}
+    exam['score_histogram'] = build_histogram(graded.exclude(score=None).values_list('score', flat=True).iterator())
+    questions = {
+        row['question_id']: {'answered_count': row['answered_count'], 'correct_count': row['correct_count']}
+        for row in Answer.objects.filter(submission__exam_id=exam_id, submission__status='GRADED')
+        .values('question_id')
+        .annotate(answered_count=Count('id'), correct_count=Count('id', filter=Q(is_correct=True)))
+    }
+    return exam, questions
+
+
+def stored_exam_stats(exam_id):
+    stats = ExamStats.objects.filter(exam_id=exam_id).values(*EXAM_COUNTERS, 'score_histogram').first()
+    exam = stats or dict.fromkeys(EXAM_COUNTERS, 0)
+    exam['score_histogram'] = (stats and stats['score_histogram']) or [0] * HISTOGRAM_BUCKETS
+    questions = {
+        row['question_id']: {'answered_count': row['answered_count'], 'correct_count': row['correct_count']}
+        for row in QuestionStats.objects.filter(exam_id=exam_id).values('question_id', *QUESTION_COUNTERS)
+        if row['answered_count'] or row['correct_count']
+    }
+    return exam, questions
+
+
+def diff_exam_stats(exam_id, tolerance=1e-6):
+    """List of human-readable mismatches between stored and recomputed stats."""
+    expected_exam, expected_questions = compute_exam_stats(exam_id)
+    stored_exam, stored_questions = stored_exam_stats(exam_id)
+    problems = [
+        f"exam {exam_id} {field}: stored {stored_exam[field]}, expected {expected_exam[field]}"
+        for field in EXAM_COUNTERS
+        if abs((stored_exam[field] or 0) - expected_exam[field]) > tolerance
+    ]
+    if stored_exam['score_histogram'] != expected_exam['score_histogram']:
+        problems.append(f"exam {exam_id} score_histogram: stored {stored_exam['score_histogram']}, "
+                        f"expected {expected_exam['score_histogram']}")
+    empty = dict.fromkeys(QUESTION_COUNTERS, 0)
+    for question_id in sorted(set(expected_questions) | set(stored_questions)):
+        stored = stored_questions.get(question_id, empty)
+        expected = expected_questions.get(question_id, empty)
+        problems += [
+            f"exam {exam_id} question {question_id} {field}: stored {stored[field]}, expected {expected[field]}"
+            for field in QUESTION_COUNTERS if stored[field] != expected[field]
+        ]
+    return problems
+
+
+def rebuild_exam_stats(exam_id):
+    """Replace an exam's stats with values recomputed from scratch."""
+    with transaction.atomic():
+        ExamStats.objects.bulk_create([ExamStats(exam_id=exam_id)], ignore_conflicts=True)
+        # Hold the row so concurrent incremental updates queue behind the rebuild
+        stats = ExamStats.objects.select_for_update().get(exam_id=exam_id)
+        exam, questions = compute_exam_stats(exam_id)
+        for field, value in exam.items():
+            setattr(stats, field, value)
+        stats.save()
+        QuestionStats.objects.filter(exam_id=exam_id).delete()
+        QuestionStats.objects.bulk_create(
+            QuestionStats(exam_id=exam_id, question_id=question_id, **counters)
+            for question_id, counters in questions.items()
+        )
+    return stats
+
+
+def exam_stats_payload(exam_id):
+    """Dashboard view of the stored aggregates (three small, indexed reads)."""
+    stats = ExamStats.objects.filter(exam_id=exam_id).first() or ExamStats(exam_id=exam_id)
+    graded = stats.graded_count
+    mean = stats.score_sum / graded if graded else None
+    variance = max(stats.score_sq_sum / graded - mean ** 2, 0.0) if graded else None
+    question_stats = {
+        row['question_id']: row
+        for row in QuestionStats.objects.filter(exam_id=exam_id).values('question_id', *QUESTION_COUNTERS)
+    }
+    questions = []
+    for order, question_id in ExamQuestion.objects.filter(exam_id=exam_id).values_list('order', 'question_id'):
+        counters = question_stats.get(question_id, {'answered_count': 0, 'correct_count': 0})
+        questions.append({
+            'question_id': question_id,
+            'order': order,
+            'answered_count': counters['answered_count'],
+            'correct_count': counters['correct_count'],
+            # Classical difficulty index: share of graded students who answered correctly
+            'difficulty': counters['correct_count'] / graded if graded else None,
+        })
+    return {
+        'exam_id': exam_id,
+        'graded_count': graded,
+        'mean_score': mean,
+        'score_stddev': variance ** 0.5 if variance is not None else None,
+        'pass_mark': settings.PASS_MARK,
+        'pass_rate': stats.pass_count / graded if graded else None,
+        'updated_at': stats.updated_at,
+        'questions': questions,
+    }
+
+
+def load_score_histograms(exam_ids):
+    """{exam_id: histogram} for these exams (one query)."""
+    return dict(ExamStats.objects.filter(exam_id__in=list(exam_ids)).values_list('exam_id', 'score_histogram'))
+
+
+def score_distribution_payload(exam_id, score=None):
+    """Score histogram of an exam plus the percentile rank of `score` (one indexed read)."""
+    histogram = load_score_histograms([exam_id]).get(exam_id) or [0] * HISTOGRAM_BUCKETS
+    return {
+        'exam_id': exam_id,
+        'graded_count': sum(histogram),
+        'bucket_width': 100 / HISTOGRAM_BUCKETS,
+        'buckets': histogram,
+        'score': score,
+        'percentile': percentile_rank(histogram, score),
+    }
@@ -1,8 +1,60 @@
+import csv
+import gzip
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import timedelta
+from difflib import SequenceMatcher
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase as BaseAPITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.models import User
-from core.models import Exam, Question, QuestionOption, ExamQuestion, Submission
+from django.db import DatabaseError, connection, connections
+from django.test.utils import CaptureQueriesContext
+from core.models import (
+    Exam, Question, QuestionOption, ExamQuestion, Submission, Answer, GradingJob, ExamStats, QuestionStats, RegradeRun,
+)
+from core.answer_keys import get_answer_key
+from core.authentication import invalidate_user_status
+from core.bulk import BulkPayloadError, BulkSubmissionProcessor, iter_json_items
+from core.checks import check_cache_is_shared, check_draft_cache_is_shared
+from core.deadlines import sweep_expired
+from core.drafts import flush_drafts
+from core.exam_io import ExamImporter, ExamImportError
+from core.regrade import ExamRegrader, start_regrade
+from core.routers import PrimaryReplicaRouter, read_from
+from core.search import search_exams, search_questions
+from core.item_analysis import analyse, load_response_matrix
+from core.services import MockGradingService, GradingQueue
+from core.similarity import TextSimilarityEngine
+from core.stats import diff_exam_stats
+
+
+class APITestCase(BaseAPITestCase):
+    # Read-only views query the 'replica' alias (core/routers.py). Its test mirror would be a second
+    # connection that cannot see the test's uncommitted data, so it shares the primary's connection.
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpClass(cls):
+        cls._replica_connection = connections['replica']
+        connections['replica'] = connections['default']
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'] = cls._replica_connection
+
 
 class AuthTests(APITestCase):
     def test_register_user(self):
@@ -10,6 +62,73 @@ class AuthTests(APITestCase):
         response = self.client.post(reverse('register'), data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
+class StatelessAuthTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='stateless', password='password123')
+        self.exam = Exam.objects.create(title="Auth", course="AU100", duration_minutes=10)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def _get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        return response, [q['sql'] for q in ctx.captured_queries if 'auth_user' in q['sql']]
+
+    def test_warm_requests_make_no_auth_queries(self):
+        for url in (reverse('exam-detail', args=[self.exam.id]), reverse('async_exam_detail', args=[self.exam.id])):
+            invalidate_user_status(self.user.id)
+            response, user_queries = self._get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(user_queries), 1)
+
+            response, user_queries = self._get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(user_queries, [])
+
+    def test_request_user_is_token_backed(self):
+        Submission.objects.create(student=self.user, exam=self.exam)
+        response, user_queries = self._get(reverse('my_submissions'))
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(len(user_queries), 1)
+
+    def test_deactivation_takes_effect_immediately(self):
+        url = reverse('exam-detail', args=[self.exam.id])
+        self.assertEqual(self._get(url)[0].status_code, status.HTTP_200_OK)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self._get(url)[0].status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self._get(reverse('async_exam_detail', args=[self.exam.id]))[0].status_code, 401)
+
+    def test_staff_flag_comes_from_current_status(self):
+        self.user.is_staff = True
+        self.user.save()
+        url = reverse('exam-stats', args=[self.exam.id])
+        self.assertEqual(self._get(url)[0].status_code, status.HTTP_200_OK)
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self._get(url)[0].status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_bulk_update_needs_explicit_invalidation(self):
+        url = reverse('exam-detail', args=[self.exam.id])
+        self.assertEqual(self._get(url)[0].status_code, status.HTTP_200_OK)
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        invalidate_user_status(self.user.id)
+        self.assertEqual(self._get(url)[0].status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_user_is_rejected(self):
+        self.user.delete()
+        self.assertEqual(self._get(reverse('exam-list'))[0].status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_per_process_cache_is_not_trusted_across_processes(self):
+        url = reverse('exam-detail', args=[self.exam.id])
+        self.assertEqual(self._get(url)[0].status_code, status.HTTP_200_OK)
+        # Deactivated by another process: its invalidation never reaches this process's LocMemCache
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        with mock.patch('core.authentication.time.monotonic', return_value=time.monotonic() + 3600):
+            response, user_queries = self._get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(len(user_queries), 1)
+
 class SeniorArchitectureTests(APITestCase):
     def setUp(self):
         # User
@@ -35,8 +154,8 @@ class SeniorArchitectureTests(APITestCase):
     def test_exam_list_structure(self):
         response = self.client.get(reverse('exam-list'))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        # Check nested structure
-        data = response.data[0]
+        # Check nested structure (pre-rendered JSON, see core/payloads.py)
+        data = response.json()['results'][0]
         self.assertEqual(data['title'], "Advanced DB")
         self.assertEqual(len(data['questions']), 2)
         # Check Q1 options
@@ -81,3 +200,1592 @@ class SeniorArchitectureTests(APITestCase):
         data = {'exam_id': self.exam.id, 'answers': []}
         response = self.client.post(reverse('submit_exam'), data, format='json')
         self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+class GradingQueryCountTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='grader', password='password123')
+
+    def _build_submission(self, num_questions):
+        exam = Exam.objects.create(title=f"Exam {num_questions}", course="CS101", duration_minutes=30)
+        submission = Submission.objects.create(student=self.user, exam=exam, status='SUBMITTED')
+        answers = []
+        for i in range(num_questions):
+            if i % 2 == 0:
+                q = Question.objects.create(text=f"MCQ {i}", question_type='MCQ')
+                opt = QuestionOption.objects.create(question=q, text="Right", is_correct=True)
+                answers.append(Answer(submission=submission, question=q, selected_option=opt))
+            else:
+                q = Question.objects.create(text=f"Text {i}", question_type='TEXT', expected_answer="Normalization")
+                answers.append(Answer(submission=submission, question=q, text_answer="normalization"))
+            ExamQuestion.objects.create(exam=exam, question=q, order=i + 1)
+        Answer.objects.bulk_create(answers)
+        return submission
+
+    def _count_grading_queries(self, num_questions):
+        submission = self._build_submission(num_questions)
+        with CaptureQueriesContext(connection) as cold:
+            score = MockGradingService.grade_submission(submission.id)
+        self.assertEqual(score, 100.0)
+        self.assertTrue(all(a.is_correct for a in submission.answers.all()))
+        # Second run grades against the cached answer key
+        with CaptureQueriesContext(connection) as warm:
+            MockGradingService.grade_submission(submission.id)
+        return len(cold.captured_queries), len(warm.captured_queries)
+
+    def test_grading_query_count_is_constant(self):
+        small = self._count_grading_queries(2)
+        self.user = User.objects.create_user(username='grader2', password='password123')
+        large = self._count_grading_queries(100)
+        self.assertEqual(small, large)
+        cold, warm = large
+        # submission + answer key (2) + answers + bulk_update x2 + stats (2 row inserts, histogram lock,
+        # 2 UPDATEs) (+ savepoint pair)
+        self.assertLessEqual(cold, 13)
+        # answer key served from cache; an unchanged re-grade leaves the stats untouched
+        self.assertEqual(warm, cold - 7)
+
+
+class AnswerKeyCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.exam = Exam.objects.create(title="Keys", course="CS200", duration_minutes=30)
+        self.q1 = Question.objects.create(text="Pick", question_type='MCQ')
+        self.right = QuestionOption.objects.create(question=self.q1, text="Right", is_correct=True)
+        self.wrong = QuestionOption.objects.create(question=self.q1, text="Wrong", is_correct=False)
+        self.q2 = Question.objects.create(text="Say", question_type='TEXT', expected_answer="Hello World")
+        ExamQuestion.objects.create(exam=self.exam, question=self.q1, order=1)
+        ExamQuestion.objects.create(exam=self.exam, question=self.q2, order=2)
+
+    def test_key_is_compiled_and_cached(self):
+        key = get_answer_key(self.exam.id)
+        self.assertEqual(key.mcq, {self.q1.id: frozenset({self.right.id})})
+        self.assertEqual(key.text, {self.q2.id: "hello world"})
+        self.assertEqual(key.total_questions, 2)
+        with self.assertNumQueries(0):
+            get_answer_key(self.exam.id)
+
+    def test_key_invalidated_by_model_changes(self):
+        get_answer_key(self.exam.id)
+        self.wrong.is_correct = True
+        self.wrong.save()
+        self.assertEqual(get_answer_key(self.exam.id).mcq[self.q1.id], frozenset({self.right.id, self.wrong.id}))
+
+        self.q2.expected_answer = "Goodbye"
+        self.q2.save()
+        self.assertEqual(get_answer_key(self.exam.id).text[self.q2.id], "goodbye")
+
+        ExamQuestion.objects.filter(exam=self.exam, question=self.q2).get().delete()
+        self.assertEqual(get_answer_key(self.exam.id).total_questions, 1)
+
+
+@override_settings(GRADING_MODE='async')
+class AsyncGradingQueueTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='queued', password='password123')
+        self.client.force_authenticate(self.user)
+        self.exam = Exam.objects.create(title="Queues", course="CS300", duration_minutes=30)
+        self.q1 = Question.objects.create(text="Pick one", question_type='MCQ')
+        self.opt = QuestionOption.objects.create(question=self.q1, text="Yes", is_correct=True)
+        ExamQuestion.objects.create(exam=self.exam, question=self.q1, order=1)
+
+    def _submit(self):
+        data = {'exam_id': self.exam.id, 'answers': [{'question_id': self.q1.id, 'selected_option_id': self.opt.id}]}
+        return self.client.post(reverse('submit_exam'), data, format='json')
+
+    def test_submit_enqueues_and_worker_grades(self):
+        response = self._submit()
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'SUBMITTED')
+        self.assertIsNone(response.data['score'])
+        job = GradingJob.objects.get(submission_id=response.data['id'])
+        self.assertEqual(job.status, 'PENDING')
+
+        call_command('grade_worker', '--once', stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'DONE')
+        sub = Submission.objects.get(id=response.data['id'])
+        self.assertEqual(sub.status, 'GRADED')
+        self.assertEqual(sub.score, 100.0)
+
+    def test_failed_job_backs_off_then_fails(self):
+        submission_id = self._submit().data['id']
+        with mock.patch.object(MockGradingService, 'grade_submissions', side_effect=RuntimeError("boom")), \
+                self.assertLogs('core.services', level='ERROR'):
+            jobs = GradingQueue.claim(10)
+            GradingQueue.process(jobs, max_attempts=2, backoff_seconds=60)
+            job = GradingJob.objects.get(submission_id=submission_id)
+            self.assertEqual((job.status, job.attempts), ('PENDING', 1))
+            self.assertGreater(job.run_after, timezone.now())
+            # Not due yet, so nothing to claim
+            self.assertEqual(GradingQueue.claim(10), [])
+
+            GradingJob.objects.filter(id=job.id).update(run_after=timezone.now())
+            GradingQueue.process(GradingQueue.claim(10), max_attempts=2, backoff_seconds=60)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ('FAILED', 2))
+            self.assertIn("boom", job.last_error)
+
+class TextSimilarityEngineTests(SimpleTestCase):
+    def setUp(self):
+        rng = random.Random(7)
+        words = "index table query planner scan join cache page row column".split()
+        keys = [" ".join(rng.choice(words) for _ in range(rng.randint(3, 40))) for _ in range(5)]
+        self.pairs = [("", ""), ("", "x"), ("Same Text", "same text")]
+        for _ in range(300):
+            key = rng.choice(keys)
+            if rng.random() < 0.5:
+                tokens = key.split()
+                tokens[rng.randrange(len(tokens))] = rng.choice(words)
+                answer = " ".join(tokens)
+            else:
+                answer = " ".join(rng.choice(words) for _ in range(rng.randint(0, 60)))
+            self.pairs.append((answer, key))
+        self.expected = [
+            SequenceMatcher(None, a.lower(), b.lower()).ratio() > 0.8 for a, b in self.pairs
+        ]
+
+    def test_verdicts_match_difflib_ratio_rule(self):
+        engine = TextSimilarityEngine()
+        self.assertEqual(engine.match_many(self.pairs), self.expected)
+        self.assertEqual([engine.is_match(a, b) for a, b in self.pairs], self.expected)
+
+    def test_process_pool_verdicts_match(self):
+        engine = TextSimilarityEngine(max_workers=2, parallel_min_batch=1)
+        self.assertEqual(engine.match_many(self.pairs), self.expected)
+
+
+class ExamPayloadCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='password123')
+        self.client.force_authenticate(self.user)
+        self.exam = Exam.objects.create(title="Caching", course="CS400", duration_minutes=45)
+        self.q1 = Question.objects.create(text="Pick", question_type='MCQ')
+        self.opt = QuestionOption.objects.create(question=self.q1, text="Option A")
+        ExamQuestion.objects.create(exam=self.exam, question=self.q1, order=1)
+        self.url = reverse('exam-detail', args=[self.exam.id])
+
+    def test_retrieve_etag_and_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['questions'][0]['options'][0]['text'], "Option A")
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url)
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Any content change bumps the version
+        self.opt.text = "Option B"
+        self.opt.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['questions'][0]['options'][0]['text'], "Option B")
+
+    def test_retrieve_missing_exam(self):
+        response = self.client.get(reverse('exam-detail', args=[self.exam.id + 1000]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_unknown_and_deleted_exams_are_404_for_any_etag(self):
+        # The async view authenticates the bearer token itself
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        exam_id, unknown = self.exam.id, self.exam.id + 1000
+        for name in ('exam-detail', 'async_exam_detail'):
+            response = self.client.get(reverse(name, args=[unknown]), HTTP_IF_NONE_MATCH='*')
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertIsNone(cache.get(f'exam-version:{unknown}'))
+
+        self.exam.delete()
+        for name in ('exam-detail', 'async_exam_detail'):
+            response = self.client.get(reverse(name, args=[exam_id]), HTTP_IF_NONE_MATCH='*')
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_assembles_cached_fragments(self):
+        Exam.objects.create(title="Second", course="CS401", duration_minutes=10)
+        response = self.client.get(reverse('exam-list'))
+        self.assertEqual([e['title'] for e in response.json()['results']], ["Caching", "Second"])
+
+        # Warm: only the id scan, no serialization queries
+        with self.assertNumQueries(1):
+            warm = self.client.get(reverse('exam-list'))
+        self.assertEqual(warm.content, response.content)
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(reverse('exam-list'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class ExamListPrefetchTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='browser', password='password123')
+        self.client.force_authenticate(self.user)
+
+    def _create_exams(self, count):
+        for i in range(count):
+            exam = Exam.objects.create(title=f"Exam {i}", course="CS", duration_minutes=30)
+            for order in (2, 1):
+                q = Question.objects.create(text=f"Q{i}-{order}", question_type='MCQ')
+                QuestionOption.objects.create(question=q, text="A")
+                QuestionOption.objects.create(question=q, text="B")
+                ExamQuestion.objects.create(exam=exam, question=q, order=order)
+
+    def _cold_list_queries(self, **params):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('exam-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(ctx.captured_queries), response.json()['results']
+
+    def test_query_count_independent_of_exam_count(self):
+        self._create_exams(2)
+        few, _ = self._cold_list_queries()
+        self._create_exams(8)
+        many, data = self._cold_list_queries()
+        self.assertEqual(few, many)
+        # id page + exams + exam questions/questions + options
+        self.assertEqual(many, 4)
+        self.assertEqual(len(data), 10)
+        # Question order follows ExamQuestion.order
+        self.assertEqual([q['text'] for q in data[0]['questions']], ["Q0-1", "Q0-2"])
+        self.assertEqual(len(data[0]['questions'][0]['options']), 2)
+
+    def test_summary_mode_skips_question_tree(self):
+        self._create_exams(3)
+        queries, data = self._cold_list_queries(view='summary')
+        self.assertEqual(queries, 2)
+        self.assertEqual(len(data), 3)
+        self.assertNotIn('questions', data[0])
+        # Full and summary renderings are cached separately
+        full = self.client.get(reverse('exam-list')).json()['results']
+        self.assertIn('questions', full[0])
+
+
+@override_settings(EXAM_PAGE_SIZE=3, SUBMISSION_PAGE_SIZE=2)
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='pager', password='password123')
+        self.client.force_authenticate(self.user)
+
+    def _walk(self, url, key='next'):
+        pages = []
+        while url:
+            data = self.client.get(url).json()
+            pages.append(data['results'])
+            url = data[key]
+        return pages
+
+    def test_exam_pages_cover_everything_in_order(self):
+        same_time = timezone.now()
+        exams = [Exam.objects.create(title=f"E{i}", course="C", duration_minutes=5) for i in range(8)]
+        # Ties on created_at are broken by id
+        Exam.objects.filter(id__in=[e.id for e in exams[2:6]]).update(created_at=same_time)
+        expected = [e.id for e in sorted(Exam.objects.all(), key=lambda e: (e.created_at, e.id))]
+
+        pages = self._walk(reverse('exam-list'))
+        self.assertEqual([len(p) for p in pages], [3, 3, 2])
+        self.assertEqual([e['id'] for page in pages for e in page], expected)
+
+        # And back again from the last page
+        last = self.client.get(reverse('exam-list'))
+        while last.json()['next']:
+            last = self.client.get(last.json()['next'])
+        backwards = self._walk(last.json()['previous'], key='previous')
+        self.assertEqual([e['id'] for page in reversed(backwards) for e in page], expected[:6])
+
+    def test_my_submissions_newest_first(self):
+        subs = []
+        for i in range(5):
+            exam = Exam.objects.create(title=f"S{i}", course="C", duration_minutes=5)
+            subs.append(Submission.objects.create(student=self.user, exam=exam, status='GRADED', score=i))
+        pages = self._walk(reverse('my_submissions') + '?page_size=2')
+        self.assertEqual([len(p) for p in pages], [2, 2, 1])
+        self.assertEqual([s['id'] for page in pages for s in page], [s.id for s in reversed(subs)])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('exam-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@skipUnless(connection.vendor == 'postgresql', "Query plans are only checked on PostgreSQL")
+class QueryPlanTests(TestCase):
+    """
+    Seeds a synthetic dataset large enough that the planner prefers indexes,
+    then checks EXPLAIN for every hot query. A plan that regresses to a
+    sequential scan on the queried table fails the test.
+    """
+    NUM_EXAMS = 2000
+    QUESTIONS_PER_EXAM = 5
+    NUM_STUDENTS = 1000
+    EXAMS_PER_STUDENT = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        exams = Exam.objects.bulk_create(
+            Exam(title=f"Exam {i}", course=f"C{i % 20}", duration_minutes=60) for i in range(cls.NUM_EXAMS)
+        )
+        questions = Question.objects.bulk_create(
+            Question(text=f"Q{i}", question_type='MCQ') for i in range(cls.NUM_EXAMS * cls.QUESTIONS_PER_EXAM)
+        )
+        QuestionOption.objects.bulk_create(
+            QuestionOption(question=q, text=str(k), is_correct=(k == 0)) for q in questions for k in range(4)
+        )
+        ExamQuestion.objects.bulk_create(
+            ExamQuestion(exam=exams[i // cls.QUESTIONS_PER_EXAM], question=q, order=i % cls.QUESTIONS_PER_EXAM + 1)
+            for i, q in enumerate(questions)
+        )
+        students = User.objects.bulk_create(User(username=f"s{i}") for i in range(cls.NUM_STUDENTS))
+        submissions = Submission.objects.bulk_create(
+            Submission(student=student, exam=exams[(i * 7 + k) % cls.NUM_EXAMS], status='GRADED', score=50)
+            for i, student in enumerate(students) for k in range(cls.EXAMS_PER_STUDENT)
+        )
+        exam_questions = {}
+        for i, q in enumerate(questions):
+            exam_questions.setdefault(exams[i // cls.QUESTIONS_PER_EXAM].id, []).append(q)
+        Answer.objects.bulk_create(
+            Answer(submission=sub, question=q)
+            for sub in submissions for q in exam_questions[sub.exam_id][:5]
+        )
+        GradingJob.objects.bulk_create(
+            GradingJob(submission=sub, status='DONE') for sub in submissions
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+        cls.exam = exams[len(exams) // 2]
+        cls.student = students[len(students) // 2]
+        cls.submission = Submission.objects.filter(student=cls.student).first()
+        cls.question = exam_questions[cls.submission.exam_id][0]
+
+    def assertIndexed(self, queryset, table):
+        plan = queryset.explain()
+        self.assertNotIn(f"Seq Scan on {table}", plan, msg=f"\n{queryset.query}\n{plan}")
+
+    def test_submission_lookup_by_student_and_exam(self):
+        self.assertIndexed(Submission.objects.filter(student=self.student, exam=self.exam), 'core_submission')
+
+    def test_submission_by_exam_and_status(self):
+        self.assertIndexed(Submission.objects.filter(exam=self.exam, status='GRADED').only('id', 'score'), 'core_submission')
+
+    def test_my_submissions_keyset_page(self):
+        queryset = Submission.objects.filter(student=self.student).order_by('-started_at', '-id')[:21]
+        self.assertIndexed(queryset, 'core_submission')
+
+    def test_exam_list_keyset_page(self):
+        self.assertIndexed(Exam.objects.only('id', 'created_at').order_by('created_at', 'id')[:21], 'core_exam')
+
+    def test_answers_for_grading(self):
+        self.assertIndexed(Answer.objects.filter(submission_id__in=[self.submission.id]), 'core_answer')
+        self.assertIndexed(Answer.objects.filter(submission=self.submission, question=self.question), 'core_answer')
+
+    def test_exam_questions_in_order(self):
+        self.assertIndexed(ExamQuestion.objects.filter(exam=self.exam).order_by('order'), 'core_examquestion')
+        self.assertIndexed(ExamQuestion.objects.filter(question=self.question), 'core_examquestion')
+
+    def test_correct_options_for_answer_key(self):
+        self.assertIndexed(
+            QuestionOption.objects.filter(is_correct=True, question_id__in=[self.question.id]), 'core_questionoption'
+        )
+
+    def test_grading_queue_claim(self):
+        queryset = GradingJob.objects.filter(status='PENDING', run_after__lte=timezone.now()).order_by('run_after', 'id')[:50]
+        self.assertIndexed(queryset, 'core_gradingjob')
+
+    def test_question_bank_search(self):
+        self.assertIndexed(search_questions("Q42")[:21], 'core_question')
+
+    def test_exam_metadata_containment(self):
+        self.assertIndexed(search_exams(tags=['algebra'], difficulty='hard')[:21], 'core_exam')
+
+
+class SubmissionValidationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='validator', password='password123')
+        self.client.force_authenticate(self.user)
+
+    def _exam_with_mcqs(self, count):
+        exam = Exam.objects.create(title=f"MCQ x{count}", course="CS", duration_minutes=30)
+        answers = []
+        for i in range(count):
+            q = Question.objects.create(text=f"Q{i}", question_type='MCQ')
+            opt = QuestionOption.objects.create(question=q, text="A", is_correct=True)
+            ExamQuestion.objects.create(exam=exam, question=q, order=i + 1)
+            answers.append({'question_id': q.id, 'selected_option_id': opt.id})
+        return exam, answers
+
+    def test_option_validation_is_batched(self):
+        counts = []
+        for size in (2, 40):
+            exam, answers = self._exam_with_mcqs(size)
+            get_answer_key(exam.id)  # warm, as it would be after the first submission
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post(
+                    reverse('submit_exam'), {'exam_id': exam.id, 'answers': answers}, format='json'
+                )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(response.data['score'], 100.0)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_unknown_option_is_404(self):
+        exam, answers = self._exam_with_mcqs(2)
+        answers[1]['selected_option_id'] = 999999
+        response = self.client.post(reverse('submit_exam'), {'exam_id': exam.id, 'answers': answers}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.data, {'detail': "No QuestionOption matches the given query."})
+
+    def test_question_outside_exam_is_400(self):
+        exam, answers = self._exam_with_mcqs(1)
+        stray = Question.objects.create(text="Stray", question_type='TEXT')
+        answers.append({'question_id': stray.id, 'text_answer': "x"})
+        response = self.client.post(reverse('submit_exam'), {'exam_id': exam.id, 'answers': answers}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(f"Question {stray.id} is not part of this exam", response.data['error'])
+
+
+class AtomicSubmitTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='atomic', password='password123')
+        self.client.force_authenticate(self.user)
+        self.exam = Exam.objects.create(title="Atomic", course="CS", duration_minutes=30)
+        self.q1 = Question.objects.create(text="Pick", question_type='MCQ')
+        self.opt = QuestionOption.objects.create(question=self.q1, text="A", is_correct=True)
+        ExamQuestion.objects.create(exam=self.exam, question=self.q1, order=1)
+
+    def test_validation_error_leaves_no_orphan_submission(self):
+        other = QuestionOption.objects.create(question=Question.objects.create(text="X", question_type='MCQ'), text="B")
+        data = {'exam_id': self.exam.id, 'answers': [{'question_id': self.q1.id, 'selected_option_id': other.id}]}
+        response = self.client.post(reverse('submit_exam'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Submission.objects.exists())
+
+    def test_concurrent_duplicate_hits_constraint_not_500(self):
+        # The other request won the race after our validation: the INSERT conflicts.
+        Submission.objects.create(student=self.user, exam=self.exam, status='SUBMITTED')
+        data = {'exam_id': self.exam.id, 'answers': [{'question_id': self.q1.id, 'selected_option_id': self.opt.id}]}
+        response = self.client.post(reverse('submit_exam'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Submission.objects.count(), 1)
+        self.assertFalse(Answer.objects.exists())
+
+    def test_submit_round_trips(self):
+        get_answer_key(self.exam.id)
+        data = {'exam_id': self.exam.id, 'answers': [{'question_id': self.q1.id, 'selected_option_id': self.opt.id}]}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('submit_exam'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['status'], 'GRADED')
+        sql = [q['sql'] for q in ctx.captured_queries]
+        insert_at = next(i for i, q in enumerate(sql) if q.startswith('INSERT INTO "core_submission"'))
+        # No racy existence pre-check before the INSERT, and no refresh_from_db after grading
+        self.assertFalse(any('FROM "core_submission"' in q for q in sql[:insert_at]))
+        self.assertEqual(sum('FROM "core_submission"' in q for q in sql[insert_at:]), 1)
+
+
+class BulkSubmitTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user(username='proctor', password='password123', is_staff=True)
+        self.client.force_authenticate(self.staff)
+        self.students = [User.objects.create_user(username=f'offline{i}', password='password123') for i in range(5)]
+        self.exam = Exam.objects.create(title="Offline", course="CS", duration_minutes=30)
+        self.q1 = Question.objects.create(text="Pick", question_type='MCQ')
+        self.right = QuestionOption.objects.create(question=self.q1, text="A", is_correct=True)
+        self.wrong = QuestionOption.objects.create(question=self.q1, text="B")
+        self.q2 = Question.objects.create(text="Say", question_type='TEXT', expected_answer="hello")
+        ExamQuestion.objects.create(exam=self.exam, question=self.q1, order=1)
+        ExamQuestion.objects.create(exam=self.exam, question=self.q2, order=2)
+
+    def _item(self, student, option):
+        return {
+            'student_id': student.id, 'exam_id': self.exam.id,
+            'answers': [{'question_id': self.q1.id, 'selected_option_id': option.id},
+                        {'question_id': self.q2.id, 'text_answer': "Hello"}],
+        }
+
+    def _post(self, body, content_type):
+        response = self.client.post(reverse('bulk_submit'), body, content_type=content_type)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        return lines[:-1], lines[-1]['summary']
+
+    def test_ndjson_upload_is_inserted_and_graded(self):
+        items = [self._item(s, self.right if i % 2 == 0 else self.wrong) for i, s in enumerate(self.students)]
+        items.append(self._item(self.students[0], self.right))  # duplicate within the upload
+        latecomer = User.objects.create_user(username='latecomer', password='password123')
+        items.append({'student_id': latecomer.id, 'exam_id': self.exam.id,
+                      'answers': [{'question_id': self.q1.id, 'selected_option_id': 999999}]})
+        body = '\n'.join(json.dumps(item) for item in items)
+        with override_settings(BULK_SUBMIT_CHUNK_SIZE=2):
+            results, summary = self._post(body, 'application/x-ndjson')
+
+        self.assertEqual([r['status'] for r in results], ['created'] * 5 + ['duplicate', 'invalid'])
+        self.assertEqual([r['score'] for r in results[:5]], [100.0, 50.0, 100.0, 50.0, 100.0])
+        self.assertEqual(summary, {'created': 5, 'duplicate': 1, 'invalid': 1, 'error': 0})
+        self.assertEqual(Submission.objects.filter(status='GRADED').count(), 5)
+        self.assertEqual(Answer.objects.count(), 10)
+
+    def test_json_array_with_existing_submission_and_bad_items(self):
+        Submission.objects.create(student=self.students[0], exam=self.exam, status='GRADED')
+        items = [self._item(self.students[0], self.right), self._item(self.students[1], self.right), "oops"]
+        results, summary = self._post(json.dumps(items), 'application/json')
+        self.assertEqual([r['status'] for r in results], ['duplicate', 'created', 'invalid'])
+        self.assertEqual(summary['created'], 1)
+
+    def test_malformed_tail_keeps_earlier_items(self):
+        body = json.dumps(self._item(self.students[0], self.right)) + '\n{"student_id": '
+        results, summary = self._post(body, 'application/x-ndjson')
+        self.assertEqual([r['status'] for r in results], ['created', 'invalid'])
+        self.assertIsNone(results[1]['index'])
+
+    def test_grading_failure_mid_stream_stays_queued(self):
+        grade_submissions = MockGradingService.grade_submissions
+        calls = []
+
+        def fail_second_chunk(submission_ids):
+            calls.append(submission_ids)
+            if len(calls) == 2:
+                raise DatabaseError("connection lost")
+            return grade_submissions(submission_ids)
+
+        body = '\n'.join(json.dumps(self._item(s, self.right)) for s in self.students)
+        with override_settings(BULK_SUBMIT_CHUNK_SIZE=2), \
+                mock.patch('core.services.MockGradingService.grade_submissions', side_effect=fail_second_chunk), \
+                mock.patch('core.services.MockGradingService.grade_submission', side_effect=DatabaseError), \
+                self.assertLogs('core.services', level='ERROR'):
+            results, summary = self._post(body, 'application/x-ndjson')
+
+        self.assertEqual(summary, {'created': 5, 'duplicate': 0, 'invalid': 0, 'error': 0})
+        self.assertEqual([r['submission_status'] for r in results], ['GRADED', 'GRADED', 'SUBMITTED', 'SUBMITTED', 'GRADED'])
+        # The failed chunk's jobs were committed with its submissions and are retried by the worker
+        self.assertEqual(GradingJob.objects.filter(status='PENDING').count(), 2)
+        GradingJob.objects.update(run_after=timezone.now())
+        self.assertEqual(GradingQueue.process(GradingQueue.claim(10)), (2, 0))
+        self.assertEqual(Submission.objects.filter(status='GRADED').count(), 5)
+
+    def test_failed_chunk_is_reported_and_the_stream_completes(self):
+        bulk_insert = BulkSubmissionProcessor._bulk_insert
+        calls = []
+
+        def fail_second_chunk(processor, pending):
+            calls.append(pending)
+            if len(calls) == 2:
+                raise DatabaseError("connection lost")
+            return bulk_insert(processor, pending)
+
+        body = '\n'.join(json.dumps(self._item(s, self.right)) for s in self.students)
+        with override_settings(BULK_SUBMIT_CHUNK_SIZE=2), \
+                mock.patch.object(BulkSubmissionProcessor, '_bulk_insert', autospec=True, side_effect=fail_second_chunk), \
+                self.assertLogs('core.bulk', level='ERROR'):
+            results, summary = self._post(body, 'application/x-ndjson')
+
+        self.assertEqual([r['status'] for r in results], ['created', 'created', 'error', 'error', 'created'])
+        self.assertEqual(summary, {'created': 3, 'duplicate': 0, 'invalid': 0, 'error': 2})
+        self.assertEqual(Submission.objects.filter(status='GRADED').count(), 3)
+        self.assertEqual(set(GradingJob.objects.values_list('status', flat=True)), {'DONE'})
+
+    def test_staff_only(self):
+        self.client.force_authenticate(self.students[0])
+        response = self.client.post(reverse('bulk_submit'), '[]', content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_stream_parser_reads_in_blocks(self):
+        items = [{'n': i, 'text': 'é' * 50} for i in range(200)]
+        stream = BytesIO(json.dumps(items).encode())
+        self.assertEqual(list(iter_json_items(stream, read_size=7)), items)
+
+    def test_stream_parser_decodes_each_item_once(self):
+        items = [{'n': i, 'text': 'é"]}' * 2000} for i in range(3)]
+        raw_decode = json.JSONDecoder.raw_decode
+        with mock.patch.object(json.JSONDecoder, 'raw_decode', autospec=True, side_effect=raw_decode) as decode:
+            self.assertEqual(list(iter_json_items(BytesIO(json.dumps(items).encode()), read_size=64)), items)
+        self.assertEqual(decode.call_count, len(items))
+
+    def test_stream_parser_requires_commas_in_arrays(self):
+        for body in ('[{"a": 1} {"b": 2}]', '[{"a": 1},]', '[{"a": 1}', '{"a": 1}}'):
+            with self.subTest(body=body), self.assertRaises(BulkPayloadError):
+                list(iter_json_items(BytesIO(body.encode()), read_size=3))
+        self.assertEqual(list(iter_json_items(BytesIO(b'{"a": 1}\n{"b": 2}'))), [{'a': 1}, {'b': 2}])
+
+
+class ResultsExportTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user(username='instructor', password='password123', is_staff=True)
+        self.client.force_authenticate(self.staff)
+        self.exam = Exam.objects.create(title="Export", course="CS", duration_minutes=30)
+        self.q1 = Question.objects.create(text="Pick", question_type='MCQ')
+        opt = QuestionOption.objects.create(question=self.q1, text="A", is_correct=True)
+        ExamQuestion.objects.create(exam=self.exam, question=self.q1, order=1)
+        for i in range(3):
+            student = User.objects.create_user(username=f'exported{i}', password='password123')
+            sub = Submission.objects.create(student=student, exam=self.exam, status='GRADED', score=100.0 * (i % 2))
+            Answer.objects.create(submission=sub, question=self.q1, selected_option=opt, is_correct=bool(i % 2))
+        self.url = reverse('exam-export', args=[self.exam.id])
+
+    def test_csv_submissions(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('exam-%d-submissions.csv' % self.exam.id, response['Content-Disposition'])
+        rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([r['username'] for r in rows], ['exported0', 'exported1', 'exported2'])
+        self.assertEqual([float(r['score']) for r in rows], [0.0, 100.0, 0.0])
+
+    def test_gzipped_ndjson_answers(self):
+        response = self.client.get(self.url, {'output': 'ndjson', 'level': 'answers', 'compress': 'gzip'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[1]['question_type'], 'MCQ')
+        self.assertIs(rows[1]['is_correct'], True)
+
+    def test_staff_only(self):
+        self.client.force_authenticate(User.objects.get(username='exported0'))
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_management_command(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'out.csv.gz')
+            call_command('export_results', self.exam.id, '--gzip', '--output', path, stderr=StringIO())
+            with gzip.open(path, 'rt') as fh:
+                self.assertEqual(len(list(csv.DictReader(fh))), 3)
+
+
+class ExamStatsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.exam = Exam.objects.create(title="Stats", course="CS", duration_minutes=30)
+        self.q1 = Question.objects.create(text="Pick", question_type='MCQ')
+        self.right = QuestionOption.objects.create(question=self.q1, text="A", is_correct=True)
+        self.wrong = QuestionOption.objects.create(question=self.q1, text="B", is_correct=False)
+        self.q2 = Question.objects.create(text="Say", question_type='TEXT', expected_answer="Hello World")
+        ExamQuestion.objects.create(exam=self.exam, question=self.q1, order=1)
+        ExamQuestion.objects.create(exam=self.exam, question=self.q2, order=2)
+
+    def _submit(self, username, option, text):
+        student = User.objects.create_user(username=username, password='password123')
+        submission = Submission.objects.create(student=student, exam=self.exam, status='SUBMITTED')
+        Answer.objects.create(submission=submission, question=self.q1, selected_option=option)
+        Answer.objects.create(submission=submission, question=self.q2, text_answer=text)
+        return submission
+
+    def test_grading_maintains_counters(self):
+        ids = [
+            self._submit('s1', self.right, "hello world").id,  # 100
+            self._submit('s2', self.wrong, "hello world").id,  # 50
+            self._submit('s3', self.wrong, "nope").id,  # 0
+        ]
+        MockGradingService.grade_submissions(ids[:2])
+        MockGradingService.grade_submission(ids[2])
+
+        stats = ExamStats.objects.get(exam=self.exam)
+        self.assertEqual((stats.graded_count, stats.score_sum, stats.score_sq_sum, stats.pass_count), (3, 150.0, 12500.0, 2))
+        q1 = QuestionStats.objects.get(exam=self.exam, question=self.q1)
+        self.assertEqual((q1.answered_count, q1.correct_count), (3, 1))
+        self.assertEqual(diff_exam_stats(self.exam.id), [])
+
+    def test_regrade_applies_only_the_difference(self):
+        submission = self._submit('s1', self.wrong, "hello world")
+        MockGradingService.grade_submission(submission.id)
+        # Answer key changes: B becomes correct as well
+        self.wrong.is_correct = True
+        self.wrong.save()
+        self.assertEqual(MockGradingService.grade_submission(submission.id), 100.0)
+
+        stats = ExamStats.objects.get(exam=self.exam)
+        self.assertEqual((stats.graded_count, stats.score_sum, stats.pass_count), (1, 100.0, 1))
+        self.assertEqual(QuestionStats.objects.get(question=self.q1).correct_count, 1)
+        self.assertEqual(diff_exam_stats(self.exam.id), [])
+
+    def test_rebuild_and_verify_command(self):
+        MockGradingService.grade_submission(self._submit('s1', self.right, "hello world").id)
+        ExamStats.objects.filter(exam=self.exam).update(graded_count=7)
+        QuestionStats.objects.filter(question=self.q2).delete()
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_stats', '--verify', stderr=StringIO())
+        out = StringIO()
+        call_command('rebuild_stats', '--exam', self.exam.id, stdout=out)
+        self.assertIn("Rebuilt statistics for 1 exam(s)", out.getvalue())
+        self.assertEqual(ExamStats.objects.get(exam=self.exam).graded_count, 1)
+        call_command('rebuild_stats', '--verify', stdout=StringIO())
+
+    def test_endpoint_is_staff_only(self):
+        MockGradingService.grade_submission(self._submit('s1', self.right, "hello world").id)
+        MockGradingService.grade_submission(self._submit('s2', self.wrong, "nope").id)
+        url = reverse('exam-stats', args=[self.exam.id])
+
+        self.client.force_authenticate(User.objects.get(username='s1'))
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(User.objects.create_user(username='staff', password='password123', is_staff=True))
+        with self.assertNumQueries(4):
+            data = self.client.get(url).json()
+        self.assertEqual(data['graded_count'], 2)
+        self.assertEqual(data['mean_score'], 50.0)
+        self.assertEqual(data['score_stddev'], 50.0)
+        self.assertEqual(data['pass_rate'], 0.5)
+        self.assertEqual([q['difficulty'] for q in data['questions']], [0.5, 0.5])
+
+    def test_score_histogram_and_percentiles(self):
+        ids = [
+            self._submit('s1', self.right, "hello world").id,  # 100
+            self._submit('s2', self.wrong, "hello world").id,  # 50
+            self._submit('s3', self.wrong, "nope").id,  # 0
+        ]
+        MockGradingService.grade_submissions(ids)
+        histogram = ExamStats.objects.get(exam=self.exam).score_histogram
+        self.assertEqual((len(histogram), histogram[0], histogram[50], histogram[99], sum(histogram)), (100, 1, 1, 1, 3))
+        # A re-grade moves the submission between buckets
+        self.wrong.is_correct = True
+        self.wrong.save()
+        MockGradingService.grade_submission(ids[2])
+        histogram = ExamStats.objects.get(exam=self.exam).score_histogram
+        self.assertEqual((histogram[0], histogram[50], histogram[99]), (0, 2, 1))
+        self.assertEqual(diff_exam_stats(self.exam.id), [])
+
+        url = reverse('exam-distribution', args=[self.exam.id])
+        self.client.force_authenticate(User.objects.get(username='s2'))
+        with self.assertNumQueries(3):
+            data = self.client.get(url + '?score=100').json()
+        # Students only get their own score ranked: half of the two 50s below the 100
+        self.assertEqual((data['graded_count'], data['score'], data['percentile']), (3, 50.0, 33.3))
+
+        self.client.force_authenticate(User.objects.create_user(username='staff', password='password123', is_staff=True))
+        self.assertEqual(self.client.get(url + '?score=100').json()['percentile'], 83.3)
+        for invalid in ('x', 'nan', 'inf', '-1', '100.5'):
+            self.assertEqual(self.client.get(url + f'?score={invalid}').status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(User.objects.get(username='s1'))
+        plain = self.client.get(reverse('my_submissions')).json()['results'][0]
+        self.assertNotIn('percentile', plain)
+        ranked = self.client.get(reverse('my_submissions') + '?include=percentile').json()['results'][0]
+        self.assertEqual(ranked['percentile'], 83.3)
+
+
+class ItemAnalysisTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.exam = Exam.objects.create(title="Items", course="CS", duration_minutes=30)
+        self.q1 = Question.objects.create(text="Pick", question_type='MCQ')
+        self.a = QuestionOption.objects.create(question=self.q1, text="A", is_correct=True)
+        self.b = QuestionOption.objects.create(question=self.q1, text="B", is_correct=False)
+        self.c = QuestionOption.objects.create(question=self.q1, text="C", is_correct=False)
+        self.q2 = Question.objects.create(text="Say", question_type='TEXT', expected_answer="Hello World")
+        self.q3 = Question.objects.create(text="Pick again", question_type='MCQ')
+        self.yes = QuestionOption.objects.create(question=self.q3, text="Yes", is_correct=True)
+        self.no = QuestionOption.objects.create(question=self.q3, text="No", is_correct=False)
+        for order, question in enumerate([self.q1, self.q2, self.q3], start=1):
+            ExamQuestion.objects.create(exam=self.exam, question=question, order=order)
+
+        # (q1 option, q2 text, q3 option); None = left blank
+        responses = [
+            (self.a, "hello world", self.yes),
+            (self.a, "hello world", self.no),
+            (self.b, "hello world", None),
+            (self.a, "wrong", self.no),
+            (self.b, "", self.yes),
+            (None, "wrong", self.no),
+        ]
+        ids = []
+        for i, (q1, q2, q3) in enumerate(responses):
+            student = User.objects.create_user(username=f'item{i}', password='password123')
+            submission = Submission.objects.create(student=student, exam=self.exam, status='SUBMITTED')
+            answers = [Answer(submission=submission, question=self.q2, text_answer=q2)]
+            for question, option in ((self.q1, q1), (self.q3, q3)):
+                if option is not None:
+                    answers.append(Answer(submission=submission, question=question, selected_option=option))
+            Answer.objects.bulk_create(answers)
+            ids.append(submission.id)
+        MockGradingService.grade_submissions(ids)
+        # Not graded yet: left out of the analysis
+        pending = User.objects.create_user(username='pending', password='password123')
+        Submission.objects.create(student=pending, exam=self.exam, status='SUBMITTED')
+
+    def test_matches_reference_statistics(self):
+        matrix = load_response_matrix(self.exam.id, chunk_size=4)
+        expected = [[1, 1, 1], [1, 1, 0], [0, 1, 0], [1, 0, 0], [0, 0, 1], [0, 0, 0]]
+        self.assertEqual(matrix.correct.tolist(), expected)
+        stats = analyse(matrix)
+
+        scores = [sum(row) / 3 * 100 for row in expected]
+        for column in range(3):
+            item = [row[column] for row in expected]
+            rest = [sum(row) - row[column] for row in expected]
+            self.assertAlmostEqual(stats['difficulty'][column], sum(item) / 6)
+            self.assertAlmostEqual(stats['discrimination'][column], _pearson(item, scores))
+            self.assertAlmostEqual(stats['item_rest_correlation'][column], _pearson(item, rest))
+        item_variances = sum(_variance([row[c] for row in expected]) for c in range(3))
+        alpha = 3 / 2 * (1 - item_variances / _variance([sum(row) for row in expected]))
+        self.assertAlmostEqual(stats['cronbach_alpha'], alpha)
+
+    def test_endpoint_reports_distractors(self):
+        url = reverse('exam-item-analysis', args=[self.exam.id])
+        self.client.force_authenticate(User.objects.get(username='item0'))
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(User.objects.create_user(username='staff', password='password123', is_staff=True))
+        data = self.client.get(url).json()
+        self.assertEqual((data['students'], data['items']), (6, 3))
+        q1, q2, _ = data['questions']
+        self.assertNotIn('options', q2)
+        options = {option['option_id']: option for option in q1['options']}
+        self.assertEqual([options[o.id]['count'] for o in (self.a, self.b, self.c)], [3, 2, 0])
+        self.assertAlmostEqual(options[self.a.id]['mean_score'], (100 + 200 / 3 + 100 / 3) / 3, places=4)
+        self.assertIsNone(options[self.c.id]['mean_score'])
+
+    def test_management_command(self):
+        out = StringIO()
+        call_command('item_analysis', self.exam.id, '--indent', '0', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['students'], 6)
+
+
+def _variance(values):
+    mean = sum(values) / len(values)
+    return sum((v - mean) ** 2 for v in values) / len(values)
+
+
+def _pearson(a, b):
+    mean_a, mean_b = sum(a) / len(a), sum(b) / len(b)
+    covariance = sum((x - mean_a) * (y - mean_b) for x, y in zip(a, b)) / len(a)
+    return covariance / (_variance(a) * _variance(b)) ** 0.5
+
+
+class ExamImportExportTests(APITestCase):
+    HEADER = '{"format": "mini-assessment-exams", "version": 1}\n'
+
+    def _exam_line(self, title, questions):
+        return json.dumps({'title': title, 'course': 'CS', 'duration_minutes': 30, 'questions': questions}) + '\n'
+
+    def _import(self, body, **kwargs):
+        return ExamImporter(method='bulk', **kwargs).run(BytesIO(body.encode()))
+
+    def test_round_trip_keeps_shared_questions(self):
+        shared = Question.objects.create(text="Shared", question_type='MCQ')
+        QuestionOption.objects.create(question=shared, text="Yes", is_correct=True)
+        QuestionOption.objects.create(question=shared, text="No", is_correct=False)
+        text = Question.objects.create(text="Explain", question_type='TEXT', expected_answer="Because")
+        first = Exam.objects.create(title="First", course="CS", duration_minutes=30, metadata={'tags': ['a']})
+        second = Exam.objects.create(title="Second", course="CS", duration_minutes=45)
+        ExamQuestion.objects.create(exam=first, question=shared, order=1)
+        ExamQuestion.objects.create(exam=first, question=text, order=2)
+        ExamQuestion.objects.create(exam=second, question=shared, order=1)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'exams.jsonl.gz')
+            call_command('export_exams', '--output', path, '--chunk-size', '1', stderr=StringIO())
+            Exam.objects.all().delete()
+            Question.objects.all().delete()
+            out = StringIO()
+            call_command('import_exams', path, '--method', 'bulk', '--chunk-size', '1', stdout=out, stderr=StringIO())
+
+        self.assertIn("Imported 2 exams, 2 questions and 2 options", out.getvalue())
+        first, second = Exam.objects.order_by('id')
+        self.assertEqual(first.metadata, {'tags': ['a']})
+        self.assertEqual(
+            list(first.exam_questions.values_list('question__text', 'order')), [("Shared", 1), ("Explain", 2)]
+        )
+        self.assertEqual(second.exam_questions.get().question_id, first.exam_questions.get(order=1).question_id)
+        self.assertEqual(get_answer_key(first.id).text, {first.exam_questions.get(order=2).question_id: "because"})
+
+    def test_query_count_does_not_grow_with_questions(self):
+        def body(count):
+            questions = [
+                {'text': f"Q{i}", 'question_type': 'MCQ', 'options': [{'text': 'A', 'is_correct': True}]}
+                for i in range(count)
+            ]
+            return self.HEADER + self._exam_line(f"Bank {count}", questions)
+
+        with CaptureQueriesContext(connection) as small:
+            self._import(body(2))
+        with CaptureQueriesContext(connection) as large:
+            self._import(body(200))
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+        self.assertEqual(QuestionOption.objects.count(), 202)
+
+    def test_invalid_input_is_rejected(self):
+        cases = [
+            ('{"format": "other"}\n', "header"),
+            ('{"format": "mini-assessment-exams", "version": 9}\n', "version"),
+            (self.HEADER + self._exam_line("Bad", [{'ref': 'nope', 'order': 1}]), "unknown question ref"),
+            (self.HEADER + self._exam_line("Bad", [{'text': 'Q', 'question_type': 'ESSAY'}]), "question_type"),
+        ]
+        for body, message in cases:
+            with self.subTest(message=message), self.assertRaisesMessage(ExamImportError, message):
+                self._import(body)
+        self.assertFalse(Exam.objects.exists())
+
+    def test_invalid_line_imports_nothing(self):
+        good = self._exam_line("Good", [{'text': 'Q', 'question_type': 'MCQ'}])
+        body = self.HEADER + good + good + self._exam_line("Bad", [{'text': 'Q', 'question_type': 'ESSAY'}])
+        with self.assertRaisesMessage(ExamImportError, "Exam #3 (line 4)"):
+            ExamImporter(method='bulk', chunk_size=1).run(BytesIO(body.encode()))
+        self.assertFalse(Exam.objects.exists())
+
+        # Unseekable input (stdin) is spooled and validated the same way
+        read, write = os.pipe()
+        with open(write, 'wb') as pipe:
+            pipe.write((self.HEADER + good).encode())
+        with open(read, 'rb') as pipe:
+            self.assertEqual(ExamImporter(method='bulk', chunk_size=1).run(pipe)['exams'], 1)
+
+
+class ReplicaRoutingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='password123')
+        self.client.force_authenticate(self.user)
+        self.exam = Exam.objects.create(title="Routed", course="CS", duration_minutes=30)
+        self.question = Question.objects.create(text="Pick", question_type='MCQ')
+        self.option = QuestionOption.objects.create(question=self.question, text="A", is_correct=True)
+        ExamQuestion.objects.create(exam=self.exam, question=self.question, order=1)
+
+    def _read_aliases(self, fn, by_model=False):
+        """
+        Run fn and return (its result, the set of aliases the router picked for reads),
+        or {model name: aliases} with `by_model`.
+        """
+        aliases = {}
+        original = PrimaryReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            alias = original(router, model, **hints)
+            aliases.setdefault(model.__name__, set()).add(alias)
+            return alias
+
+        with mock.patch.object(PrimaryReplicaRouter, 'db_for_read', spy):
+            result = fn()
+        return result, aliases if by_model else set().union(*aliases.values())
+
+    def test_router_defaults_to_primary(self):
+        router = PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(Exam), 'default')
+        with read_from('replica'):
+            self.assertEqual(router.db_for_read(Exam), 'replica')
+            self.assertEqual(router.db_for_write(Exam), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'core'))
+
+    def test_read_only_views_use_the_replica(self):
+        response, aliases = self._read_aliases(lambda: self.client.get(reverse('my_submissions')))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(aliases, {'replica'})
+        # The exam list pages over the replica; payload cache misses render from the primary
+        response, aliases = self._read_aliases(lambda: self.client.get(reverse('exam-list')), by_model=True)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(aliases['Exam'], {'replica'})
+        self.assertEqual(aliases['ExamQuestion'] | aliases['QuestionOption'], {'default'})
+
+    def test_cold_exam_retrieve_renders_from_the_primary(self):
+        url = reverse('exam-detail', args=[self.exam.id])
+        # (The exam row itself is read with .using('default'), which bypasses the router.)
+        response, aliases = self._read_aliases(lambda: self.client.get(url), by_model=True)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['questions'][0]['options'][0]['id'], self.option.id)
+        self.assertEqual(set(aliases), {'ExamQuestion', 'QuestionOption'})
+        self.assertEqual(set().union(*aliases.values()), {'default'}, aliases)
+
+    def test_student_reads_their_own_write(self):
+        data = {'exam_id': self.exam.id, 'answers': [{'question_id': self.question.id, 'selected_option_id': self.option.id}]}
+        response, aliases = self._read_aliases(lambda: self.client.post(reverse('submit_exam'), data, format='json'))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('replica', aliases)
+
+        response, aliases = self._read_aliases(lambda: self.client.get(reverse('my_submissions')))
+        self.assertEqual(aliases, {'default'})
+        self.assertEqual(len(response.json()['results']), 1)
+
+        cache.clear()  # pin expired
+        _, aliases = self._read_aliases(lambda: self.client.get(reverse('my_submissions')))
+        self.assertEqual(aliases, {'replica'})
+
+
+class QueryInstrumentationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='measured', password='password123')
+        self.client.force_authenticate(self.user)
+        Exam.objects.create(title="Measured", course="CS", duration_minutes=30)
+
+    def test_headers_and_log_line(self):
+        with CaptureQueriesContext(connection) as queries, self.assertLogs('core.requests', level='INFO') as logs:
+            response = self.client.get(reverse('exam-list'))
+        self.assertEqual(int(response['X-DB-Query-Count']), len(queries.captured_queries))
+        self.assertGreaterEqual(float(response['X-DB-Time-Ms']), 0)
+        self.assertEqual(response['X-DB-Connections-Opened'], '0')
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'exam-list')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['queries'], len(queries.captured_queries))
+
+    @override_settings(REQUEST_QUERY_COUNT_WARNING=0, REQUEST_DB_HEADERS=False)
+    def test_query_heavy_requests_warn(self):
+        with self.assertLogs('core.requests', level='WARNING'):
+            response = self.client.get(reverse('exam-list'))
+        self.assertNotIn('X-DB-Query-Count', response)
+
+
+@override_settings(ASYNC_GRADING_THREADS=0)  # grading pool threads cannot see the test transaction
+class AsyncViewTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user(username='async', password='password123')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.student).access_token}'}
+        self.exam = Exam.objects.create(title="Async", course="CS", duration_minutes=30)
+        self.question = Question.objects.create(text="Pick", question_type='MCQ')
+        self.right = QuestionOption.objects.create(question=self.question, text="A", is_correct=True)
+        ExamQuestion.objects.create(exam=self.exam, question=self.question, order=1)
+        self.submit_url = reverse('async_submit_exam')
+
+    def _submit(self, answers):
+        return self.client.generic(
+            'POST', self.submit_url, json.dumps({'exam_id': self.exam.id, 'answers': answers}),
+            content_type='application/json', **self.auth,
+        )
+
+    def test_retrieve_matches_sync_view(self):
+        url = reverse('async_exam_detail', args=[self.exam.id])
+        self.assertEqual(self.client.get(url).status_code, 401)
+        response = self.client.get(url, **self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.client.force_authenticate(self.student)
+        sync_response = self.client.get(reverse('exam-detail', args=[self.exam.id]))
+        self.assertEqual(response.content, sync_response.content)
+        self.assertEqual(response['ETag'], sync_response['ETag'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'], **self.auth).status_code, 304)
+        self.assertEqual(self.client.get(reverse('async_exam_detail', args=[999]), **self.auth).status_code, 404)
+
+    def test_submit_grades_and_rejects_duplicates(self):
+        response = self._submit([{'question_id': self.question.id, 'selected_option_id': self.right.id}])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['score'], 100.0)
+        self.assertEqual(Submission.objects.get(student=self.student).status, 'GRADED')
+        self.assertEqual(self._submit([]).status_code, 409)
+
+    def test_submit_validation(self):
+        self.assertEqual(self._submit([{'question_id': 999}]).status_code, 400)
+        unknown_option = self._submit([{'question_id': self.question.id, 'selected_option_id': 999}])
+        self.assertEqual(unknown_option.status_code, 404)
+        self.assertIn('detail', unknown_option.json())
+        self.assertEqual(self.client.post(self.submit_url, {}, format='json').status_code, 401)
+        self.assertFalse(Submission.objects.exists())
+
+    @override_settings(GRADING_MODE='async')
+    def test_submit_enqueues_in_async_mode(self):
+        response = self._submit([{'question_id': self.question.id, 'selected_option_id': self.right.id}])
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(GradingJob.objects.filter(submission_id=response.json()['id']).exists())
+
+
+class AsyncGradingPoolTests(TransactionTestCase):
+    def test_grades_on_the_pool(self):
+        student = User.objects.create_user(username='pooled', password='password123')
+        exam = Exam.objects.create(title="Pool", course="CS", duration_minutes=30)
+        question = Question.objects.create(text="Say", question_type='TEXT', expected_answer="Hello")
+        ExamQuestion.objects.create(exam=exam, question=question, order=1)
+        token = RefreshToken.for_user(student).access_token
+        response = self.client.post(
+            reverse('async_submit_exam'),
+            json.dumps({'exam_id': exam.id, 'answers': [{'question_id': question.id, 'text_answer': 'hello'}]}),
+            content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['score'], 100.0)
+
+
+class RegradeTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.exam = Exam.objects.create(title="Regrade", course="CS", duration_minutes=30)
+        self.q1 = Question.objects.create(text="Pick", question_type='MCQ')
+        self.right = QuestionOption.objects.create(question=self.q1, text="A", is_correct=True)
+        self.wrong = QuestionOption.objects.create(question=self.q1, text="B", is_correct=False)
+        self.q2 = Question.objects.create(text="Say", question_type='TEXT', expected_answer="Hello World")
+        self.q3 = Question.objects.create(text="Pick again", question_type='MCQ')
+        self.q3_right = QuestionOption.objects.create(question=self.q3, text="C", is_correct=True)
+        for order, question in enumerate((self.q1, self.q2, self.q3), start=1):
+            ExamQuestion.objects.create(exam=self.exam, question=question, order=order)
+
+        choices = [(self.right, "hello world"), (self.wrong, "hello world"), (self.wrong, "goodbye"), (None, "")]
+        self.submissions = []
+        for i in range(7):
+            option, text = choices[i % len(choices)]
+            student = User.objects.create_user(username=f'r{i}', password='password123')
+            submission = Submission.objects.create(student=student, exam=self.exam, status='SUBMITTED')
+            Answer.objects.create(submission=submission, question=self.q1, selected_option=option)
+            Answer.objects.create(submission=submission, question=self.q2, text_answer=text)
+            Answer.objects.create(submission=submission, question=self.q3, selected_option=self.q3_right if i % 2 else None)
+            self.submissions.append(submission.id)
+        # One submission that was never graded stays untouched
+        self.ungraded = self.submissions.pop()
+        MockGradingService.grade_submissions(self.submissions)
+
+        # The key was wrong: B is also correct, and the TEXT answer should have been "goodbye"
+        self.wrong.is_correct = True
+        self.wrong.save()
+        self.q2.expected_answer = "Goodbye"
+        self.q2.save()
+
+    def _state(self):
+        scores = dict(Submission.objects.filter(exam=self.exam).values_list('id', 'score'))
+        verdicts = dict(Answer.objects.filter(submission__exam=self.exam).values_list('id', 'is_correct'))
+        return scores, verdicts
+
+    def assertMatchesFullGrading(self):
+        after_regrade = self._state()
+        MockGradingService.grade_submissions(self.submissions)
+        self.assertEqual(after_regrade, self._state())
+        self.assertEqual(diff_exam_stats(self.exam.id), [])
+
+    def test_command_regrades_only_changed_questions(self):
+        out = StringIO()
+        call_command('regrade_exam', self.exam.id, '--question', self.q1.id, '--question', self.q2.id,
+                     '--workers', '0', '--chunk-size', '2', stdout=out, stderr=StringIO())
+        run = RegradeRun.objects.get()
+        self.assertEqual(run.status, 'DONE')
+        self.assertEqual((run.total_submissions, run.processed_submissions), (6, 6))
+        # r0/r4: q2 now wrong; r1/r5: q1 now right, q2 now wrong; r2: both now right; r3: unchanged
+        self.assertEqual((run.changed_answers, run.rescored_submissions), (8, 5))
+        self.assertIn("8 answers changed", out.getvalue())
+        self.assertIsNone(Submission.objects.get(id=self.ungraded).score)
+        self.assertMatchesFullGrading()
+
+    def test_score_update_is_one_statement_per_chunk(self):
+        run = start_regrade(self.exam.id)
+        regrader = ExamRegrader(run, workers=0, chunk_size=10)
+        with CaptureQueriesContext(connection) as ctx:
+            regrader.execute()
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "core_submission"')]
+        self.assertEqual(len(updates), 1)
+        self.assertMatchesFullGrading()
+
+    def test_whole_exam_on_process_pool(self):
+        call_command('regrade_exam', self.exam.id, '--workers', '2', '--chunk-size', '2',
+                     stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(RegradeRun.objects.get().status, 'DONE')
+        self.assertMatchesFullGrading()
+
+    def test_interrupted_run_resumes_after_last_chunk(self):
+        original_write = ExamRegrader._write
+        calls = []
+
+        def failing_write(regrader, *args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError("worker killed")
+            return original_write(regrader, *args)
+
+        with mock.patch.object(ExamRegrader, '_write', failing_write):
+            with self.assertRaises(RuntimeError):
+                call_command('regrade_exam', self.exam.id, '--workers', '0', '--chunk-size', '2',
+                             stdout=StringIO(), stderr=StringIO())
+        run = RegradeRun.objects.get()
+        self.assertEqual(run.status, 'FAILED')
+        self.assertEqual(run.last_submission_id, self.submissions[1])
+        self.assertEqual(run.processed_submissions, 2)
+        self.assertIn("worker killed", run.last_error)
+
+        call_command('regrade_exam', '--resume', run.id, '--workers', '0', stdout=StringIO(), stderr=StringIO())
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.processed_submissions), ('DONE', 6))
+        self.assertMatchesFullGrading()
+        with self.assertRaises(CommandError):
+            call_command('regrade_exam', '--resume', run.id, stdout=StringIO())
+
+    def test_endpoint_queues_run_for_worker(self):
+        url = reverse('exam-regrade', args=[self.exam.id])
+        self.client.force_authenticate(User.objects.get(username='r0'))
+        self.assertEqual(self.client.post(url, {}, format='json').status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(User.objects.create_user(username='staff', password='password123', is_staff=True))
+        other = Question.objects.create(text="Elsewhere", question_type='MCQ')
+        response = self.client.post(url, {'question_ids': [other.id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(url, {'question_ids': [self.q1.id, self.q2.id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'PENDING')
+
+        with override_settings(REGRADE_WORKERS=0):
+            call_command('grade_worker', '--once', stdout=StringIO())
+        runs = self.client.get(url).json()
+        self.assertEqual([(r['status'], r['changed_answers']) for r in runs], [('DONE', 8)])
+        self.assertMatchesFullGrading()
+
+
+@override_settings(DRAFT_FLUSH_INTERVAL=10)
+class DraftAutosaveTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.exam = Exam.objects.create(title="Drafts", course="CS", duration_minutes=30)
+        self.q1 = Question.objects.create(text="Pick", question_type='MCQ')
+        self.right = QuestionOption.objects.create(question=self.q1, text="A", is_correct=True)
+        self.wrong = QuestionOption.objects.create(question=self.q1, text="B", is_correct=False)
+        self.q2 = Question.objects.create(text="Say", question_type='TEXT', expected_answer="Hello World")
+        ExamQuestion.objects.create(exam=self.exam, question=self.q1, order=1)
+        ExamQuestion.objects.create(exam=self.exam, question=self.q2, order=2)
+        self.user = User.objects.create_user(username='drafter', password='password123')
+        self.client.force_authenticate(self.user)
+        self.url = reverse('exam_draft', args=[self.exam.id])
+        self.now = 1_000_000.0
+
+    def _save(self, *answers, user=None):
+        if user is not None:
+            self.client.force_authenticate(user)
+        # Draft time buckets are DRAFT_FLUSH_INTERVAL seconds wide
+        with mock.patch('core.drafts._bucket', return_value=int(self.now // 10)):
+            return self.client.put(self.url, {'answers': list(answers)}, format='json')
+
+    def _submit(self, *answers):
+        self.client.force_authenticate(self.user)
+        return self.client.post(reverse('submit_exam'), {'exam_id': self.exam.id, 'answers': list(answers)}, format='json')
+
+    def _sweep(self):
+        # One round of the sweep_deadlines loop, which flushes the finished draft buckets
+        with mock.patch('core.drafts._bucket', return_value=int(self.now // 10)):
+            call_command('sweep_deadlines', '--once', stdout=StringIO(), stderr=StringIO())
+
+    def test_saves_are_coalesced_and_flushed_in_one_batch(self):
+        self.assertEqual(self._save({'question_id': self.q1.id, 'selected_option_id': self.wrong.id}).status_code, 200)
+        submission = Submission.objects.get(student=self.user, exam=self.exam)
+        self.assertEqual(submission.status, 'IN_PROGRESS')
+
+        with CaptureQueriesContext(connection) as ctx:
+            for option in (self.right, self.wrong, self.right):
+                response = self._save({'question_id': self.q1.id, 'selected_option_id': option.id},
+                                      {'question_id': self.q2.id, 'text_answer': "hello world"})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if not q['sql'].startswith('SELECT')])
+        self.assertFalse(Answer.objects.exists())
+        self.assertEqual(self.client.get(self.url).json()['answers'], [
+            {'question_id': self.q1.id, 'selected_option_id': self.right.id, 'text_answer': ''},
+            {'question_id': self.q2.id, 'selected_option_id': None, 'text_answer': "hello world"},
+        ])
+        other = User.objects.create_user(username='other', password='password123')
+        self._save({'question_id': self.q2.id, 'text_answer': "hi"}, user=other)
+
+        # Saves never flush, however late
+        self.now += 25
+        late = User.objects.create_user(username='late', password='password123')
+        self._save({'question_id': self.q1.id, 'selected_option_id': self.wrong.id}, user=late)
+        self.assertFalse(Answer.objects.exists())
+
+        # Two buckets later the sweeper flushes everyone's drafts with a single upsert
+        with CaptureQueriesContext(connection) as ctx:
+            self._sweep()
+        inserts = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "core_answer"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertIn('ON CONFLICT', inserts[0])
+        self.assertEqual(
+            sorted(Answer.objects.values_list('submission__student__username', 'question_id', 'selected_option_id')),
+            [('drafter', self.q1.id, self.right.id), ('drafter', self.q2.id, None), ('other', self.q2.id, None)],
+        )
+        # The late draft is in the current bucket; it goes out with the next round
+        self._save({'question_id': self.q2.id, 'text_answer': "hello"}, user=late)
+        self.now += 25
+        self._sweep()
+        self.assertEqual(Answer.objects.filter(submission__student=late).count(), 2)
+        self.assertEqual(Answer.objects.filter(submission__student=self.user).count(), 2)
+
+    def _during_flush(self, action):
+        """Patch the cache so that `action` runs right after the flush has read the drafts."""
+        get_many, calls = cache.get_many, []
+
+        def read_then_act(keys, *args, **kwargs):
+            drafts = get_many(keys, *args, **kwargs)
+            if not calls:
+                calls.append(1)
+                action()
+            return drafts
+        return mock.patch.object(cache, 'get_many', side_effect=read_then_act)
+
+    def test_flush_racing_a_submit_keeps_the_submitted_answers(self):
+        self._save({'question_id': self.q1.id, 'selected_option_id': self.wrong.id},
+                   {'question_id': self.q2.id, 'text_answer': "hello world"})
+        responses = []
+        submit = lambda: responses.append(self._submit({'question_id': self.q1.id, 'selected_option_id': self.right.id}))
+
+        with self.captureOnCommitCallbacks(execute=True), self._during_flush(submit):
+            self.assertEqual(flush_drafts([(self.user.id, self.exam.id)]), 0)
+        self.assertEqual(responses[0].data['score'], 100.0)
+        self.assertEqual(Submission.objects.get(student=self.user).status, 'GRADED')
+        self.assertEqual(Answer.objects.get(question=self.q1).selected_option_id, self.right.id)
+        self.assertFalse(Answer.objects.filter(is_correct__isnull=True).exists())
+
+    def test_submit_during_a_flush_includes_the_buffered_answers(self):
+        self._save({'question_id': self.q1.id, 'selected_option_id': self.right.id},
+                   {'question_id': self.q2.id, 'text_answer': "hello world"})
+        responses = []
+        with self._during_flush(lambda: responses.append(self._submit())):
+            flush_drafts([(self.user.id, self.exam.id)])
+        self.assertEqual(responses[0].data['score'], 100.0)
+        self.assertEqual(Answer.objects.filter(is_correct=True).count(), 2)
+
+    def test_save_racing_a_flush_is_flushed_later(self):
+        self._save({'question_id': self.q1.id, 'selected_option_id': self.wrong.id})
+        save = lambda: self._save({'question_id': self.q2.id, 'text_answer': "hello world"})
+
+        with self.captureOnCommitCallbacks(execute=True), self._during_flush(save):
+            self.assertEqual(flush_drafts([(self.user.id, self.exam.id)]), 1)
+        self.assertEqual(list(Answer.objects.values_list('question_id', flat=True)), [self.q1.id])
+        # The racing save is registered again and goes out with the next round
+        self.now += 25
+        with self.captureOnCommitCallbacks(execute=True):
+            self._sweep()
+        self.assertEqual(Answer.objects.count(), 2)
+
+    def test_deploy_check_requires_a_shared_cache(self):
+        self.assertEqual([error.id for error in check_draft_cache_is_shared(None)], ['core.E002'])
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                              'LOCATION': tempfile.gettempdir()}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(check_draft_cache_is_shared(None), [])
+
+    def test_submit_with_no_answers_submits_the_draft(self):
+        self._save({'question_id': self.q1.id, 'selected_option_id': self.right.id},
+                   {'question_id': self.q2.id, 'text_answer': "hello world"})
+        response = self._submit()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['score'], 100.0)
+        self.assertEqual(Submission.objects.get(student=self.user).status, 'GRADED')
+        self.assertEqual(Answer.objects.filter(is_correct=True).count(), 2)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_submitted_answers_override_the_draft(self):
+        self._save({'question_id': self.q1.id, 'selected_option_id': self.right.id},
+                   {'question_id': self.q2.id, 'text_answer': "hello world"})
+        response = self._submit({'question_id': self.q1.id, 'selected_option_id': self.wrong.id})
+        self.assertEqual(response.data['score'], 50.0)
+        self.assertEqual(Answer.objects.get(question=self.q1).selected_option_id, self.wrong.id)
+
+    def test_submit_after_the_cache_lost_the_draft(self):
+        self._save({'question_id': self.q1.id, 'selected_option_id': self.right.id})
+        self.now += 25
+        self._sweep()
+        cache.clear()
+
+        response = self._submit({'question_id': self.q2.id, 'text_answer': "hello world"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['score'], 100.0)
+        self.assertEqual(Submission.objects.filter(student=self.user).count(), 1)
+
+    def test_conflicts_and_validation(self):
+        self.assertEqual(self._save({'question_id': 999999}).status_code, status.HTTP_400_BAD_REQUEST)
+        twice = {'question_id': self.q2.id, 'text_answer': "a"}
+        self.assertEqual(self._save(twice, twice).status_code, status.HTTP_400_BAD_REQUEST)
+        missing = self.client.put(reverse('exam_draft', args=[999999]), {'answers': []}, format='json')
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+
+        self._save({'question_id': self.q1.id, 'selected_option_id': self.right.id})
+        self.assertEqual(self._submit().status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self._submit().status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self._save(twice).status_code, status.HTTP_409_CONFLICT)
+
+
+@override_settings(DEADLINE_GRACE_SECONDS=30)
+class DeadlineSweepTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.exam = Exam.objects.create(title="Timed", course="CS", duration_minutes=30)
+        self.q1 = Question.objects.create(text="Pick", question_type='MCQ')
+        self.right = QuestionOption.objects.create(question=self.q1, text="A", is_correct=True)
+        self.wrong = QuestionOption.objects.create(question=self.q1, text="B", is_correct=False)
+        ExamQuestion.objects.create(exam=self.exam, question=self.q1, order=1)
+        self.url = reverse('exam_draft', args=[self.exam.id])
+
+    def _start(self, username, option):
+        user = User.objects.create_user(username=username, password='password123')
+        self.client.force_authenticate(user)
+        response = self.client.put(self.url, {'answers': [{'question_id': self.q1.id, 'selected_option_id': option.id}]},
+                                   format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return user
+
+    def _expire(self, *users, seconds=60):
+        # Past the deadline plus grace; the cached drafts keep their (buffered) answers
+        deadline = timezone.now() - timedelta(seconds=seconds)
+        Submission.objects.filter(student__in=users).update(deadline_at=deadline)
+        for user in users:
+            key = f'draft:{user.id}:{self.exam.id}'
+            cache.set(key, {**cache.get(key), 'deadline': deadline.timestamp()})
+        return deadline
+
+    def test_first_save_sets_the_deadline(self):
+        before = timezone.now()
+        user = self._start('student', self.right)
+        deadline = Submission.objects.get(student=user).deadline_at
+        self.assertGreaterEqual(deadline, before + timedelta(minutes=30))
+        self.assertLessEqual(deadline, timezone.now() + timedelta(minutes=30))
+
+    def test_expired_cohort_is_closed_in_batches_and_graded(self):
+        cohort = [self._start(f'student{i}', self.right if i % 2 else self.wrong) for i in range(5)]
+        on_time = self._start('on-time', self.right)
+        within_grace = self._start('grace', self.right)
+        deadline = self._expire(*cohort)
+        self._expire(within_grace, seconds=10)
+        self.assertFalse(Answer.objects.exists())  # still buffered in the cache
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(sweep_expired(batch_size=2), 5)
+        # Three batches of lock + upsert + update + grading, independent of the cohort size per batch
+        self.assertLess(len(ctx.captured_queries), 60)
+
+        closed = Submission.objects.filter(student__in=cohort)
+        self.assertEqual(set(closed.values_list('status', flat=True)), {'GRADED'})
+        self.assertEqual(sorted(closed.values_list('score', flat=True)), [0.0, 0.0, 0.0, 100.0, 100.0])
+        self.assertEqual(set(closed.values_list('submitted_at', flat=True)), {deadline})
+        self.assertEqual(Answer.objects.filter(submission__in=closed).count(), 5)
+        self.assertIsNone(cache.get(f'draft:{cohort[0].id}:{self.exam.id}'))
+        self.assertEqual(
+            set(Submission.objects.filter(student__in=[on_time, within_grace]).values_list('status', flat=True)),
+            {'IN_PROGRESS'},
+        )
+        self.assertEqual(ExamStats.objects.get(exam=self.exam).graded_count, 5)
+        self.assertEqual(set(GradingJob.objects.values_list('status', flat=True)), {'DONE'})
+        self.assertEqual(sweep_expired(), 0)
+
+    def test_grading_failures_stay_queued(self):
+        users = [self._start(f'student{i}', self.right) for i in range(2)]
+        self._expire(*users)
+        with mock.patch('core.services.MockGradingService.grade_submissions', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                sweep_expired()
+        # The status flip and the jobs were committed together; the interrupted batch is left RUNNING
+        closed = Submission.objects.filter(student__in=users)
+        self.assertEqual(set(closed.values_list('status', flat=True)), {'SUBMITTED'})
+        self.assertEqual(set(GradingJob.objects.values_list('status', flat=True)), {'RUNNING'})
+
+        self.assertEqual(GradingQueue.requeue_stale(stale_after_seconds=-1), 2)
+        self.assertEqual(GradingQueue.process(GradingQueue.claim(10)), (2, 0))
+        self.assertEqual(set(closed.values_list('status', flat=True)), {'GRADED'})
+
+    def test_saves_and_submits_after_the_deadline_are_refused(self):
+        user = self._start('student', self.right)
+        self._expire(user)
+        answer = {'question_id': self.q1.id, 'selected_option_id': self.wrong.id}
+        response = self.client.put(self.url, {'answers': [answer]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertIn("time", response.data['error'])
+        submit = self.client.post(reverse('submit_exam'), {'exam_id': self.exam.id, 'answers': [answer]}, format='json')
+        self.assertEqual(submit.status_code, status.HTTP_409_CONFLICT)
+
+        sweep_expired()
+        submission = Submission.objects.get(student=user)
+        self.assertEqual((submission.status, submission.score), ('GRADED', 100.0))
+        submit = self.client.post(reverse('submit_exam'), {'exam_id': self.exam.id, 'answers': [answer]}, format='json')
+        self.assertEqual(submit.data['error'], "You have already submitted this exam.")
+
+    @override_settings(GRADING_MODE='async')
+    def test_command_queues_grading_in_async_mode(self):
+        user = self._start('student', self.right)
+        self._expire(user)
+        out = StringIO()
+        call_command('sweep_deadlines', '--once', stdout=out, stderr=StringIO())
+        self.assertIn("Closed 1 expired attempt(s).", out.getvalue())
+        submission = Submission.objects.get(student=user)
+        self.assertEqual(submission.status, 'SUBMITTED')
+        self.assertEqual(GradingJob.objects.get().submission_id, submission.id)
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        self.algebra = Exam.objects.create(
+            title="Linear algebra midterm", course="MATH101", duration_minutes=60,
+            metadata={'difficulty': 'hard', 'tags': ['algebra', 'matrices']},
+        )
+        self.intro = Exam.objects.create(
+            title="Intro quiz", course="MATH101", duration_minutes=20, description="Covers basic algebra",
+            metadata={'difficulty': 'easy', 'tags': ['algebra']},
+        )
+        self.history = Exam.objects.create(
+            title="Modern history", course="HIST200", duration_minutes=45, metadata={'tags': ['europe']},
+        )
+        self.user = User.objects.create_user(username='searcher', password='password123')
+        self.client.force_authenticate(self.user)
+
+    def _exam_ids(self, query):
+        response = self.client.get(reverse('exam_search') + query)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [exam['id'] for exam in response.json()['results']]
+
+    def test_exam_rendering_does_not_load_search_vectors(self):
+        cache.clear()
+        question = Question.objects.create(text="Invert the matrix", question_type='TEXT', expected_answer="A^-1")
+        ExamQuestion.objects.create(exam=self.algebra, question=question, order=1)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        for url in (reverse('exam-list'), reverse('exam-detail', args=[self.algebra.id]),
+                    reverse('async_exam_detail', args=[self.algebra.id])):
+            cache.clear()
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+            self.assertFalse([q['sql'] for q in ctx.captured_queries if 'search_vector' in q['sql']])
+
+    def test_exam_text_search_and_metadata_filters(self):
+        found = self._exam_ids('?q=algebra')
+        self.assertEqual(set(found), {self.algebra.id, self.intro.id})
+        if connection.vendor == 'postgresql':
+            # Title matches (weight A) outrank description matches (weight C)
+            self.assertEqual(found, [self.algebra.id, self.intro.id])
+
+        self.assertEqual(set(self._exam_ids('?tag=algebra')), {self.algebra.id, self.intro.id})
+        self.assertEqual(self._exam_ids('?tag=algebra&tag=matrices'), [self.algebra.id])
+        self.assertEqual(self._exam_ids('?tag=algebra&difficulty=easy'), [self.intro.id])
+        self.assertEqual(self._exam_ids('?course=HIST200'), [self.history.id])
+        self.assertEqual(self._exam_ids('?q=history&course=MATH101'), [])
+
+        # The search vector follows edits (trigger on PostgreSQL)
+        self.history.title = "Modern algebra history"
+        self.history.save()
+        self.assertIn(self.history.id, self._exam_ids('?q=algebra'))
+
+    def test_results_are_paginated_without_gaps(self):
+        Exam.objects.bulk_create(
+            Exam(title=f"Algebra drill {i}", course="MATH101", duration_minutes=10, metadata={'tags': ['algebra']})
+            for i in range(5)
+        )
+        url, seen = reverse('exam_search') + '?q=algebra&page_size=2', []
+        while url:
+            page = self.client.get(url).json()
+            self.assertLessEqual(len(page['results']), 2)
+            seen += [exam['id'] for exam in page['results']]
+            url = page['next']
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len(set(seen)), 7)
+        self.assertEqual(self.client.get(reverse('exam_search') + '?cursor=bad').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_question_bank_search_is_staff_only(self):
+        mcq = Question.objects.create(text="Which matrix is invertible?", question_type='MCQ')
+        text = Question.objects.create(text="Define a matrix rank", question_type='TEXT', expected_answer="dimension")
+        Question.objects.create(text="Who crowned Charlemagne?", question_type='TEXT')
+        url = reverse('question_search')
+        self.assertEqual(self.client.get(url + '?q=matrix').status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(User.objects.create_user(username='author', password='password123', is_staff=True))
+        results = self.client.get(url + '?q=matrix').json()['results']
+        self.assertEqual({question['id'] for question in results}, {mcq.id, text.id})
+        self.assertEqual([question['id'] for question in self.client.get(url + '?q=matrix&type=TEXT').json()['results']],
+                         [text.id])
+        self.assertEqual([question['id'] for question in self.client.get(url + '?q=dimension').json()['results']],
+                         [text.id])
+
+
+class CacheCheckTests(SimpleTestCase):
+    def test_per_process_cache_fails_with_several_workers(self):
+        with override_settings(WEB_CONCURRENCY=1):
+            self.assertEqual(check_cache_is_shared(None), [])
+        with override_settings(WEB_CONCURRENCY=4):
+            self.assertEqual([error.id for error in check_cache_is_shared(None)], ['core.E001'])
+
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                              'LOCATION': tempfile.gettempdir()}}
+        with override_settings(WEB_CONCURRENCY=4, CACHES=shared):
+            self.assertEqual(check_cache_is_shared(None), [])
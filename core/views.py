@@ -1,12 +1,36 @@
+import io
+import json
+import math
 from rest_framework import viewsets, generics, status, permissions
+from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import UnsupportedMediaType
 from rest_framework.views import APIView
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, IntegrityError
+from django.db.models import Prefetch
+from django.http import Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from .models import Exam, Question, Submission, Answer, QuestionOption, ExamQuestion
-from .serializers import UserSerializer, ExamSerializer, SubmissionCreateSerializer, SubmissionSerializer
-from .services import MockGradingService
-from drf_spectacular.utils import extend_schema
+from .models import Exam, Question, Submission, ExamQuestion, RegradeRun
+from .serializers import (
+    UserSerializer, ExamSerializer, ExamSummarySerializer, SubmissionCreateSerializer, SubmissionSerializer,
+    BulkSubmissionItemSerializer, RegradeRequestSerializer, RegradeRunSerializer, DraftSaveSerializer, DraftSerializer,
+    ExamSearchResultSerializer, QuestionSearchResultSerializer,
+)
+from .bulk import BulkSubmissionProcessor, iter_json_items
+from .drafts import DraftClosed, find_draft, get_cached_draft, save_draft
+from .exports import FORMATS as EXPORT_FORMATS, LEVELS as EXPORT_LEVELS, export_filename, export_results
+from .caching import get_exam_version, get_exam_versions, peek_exam_version
+from .pagination import ExamPagination, SearchPagination, SubmissionPagination
+from .routers import is_pinned_to_primary, pin_to_primary, read_from, use_replica
+from .payloads import exam_etag, exam_list_etag, get_exam_payloads, join_payloads
+from .item_analysis import item_analysis_payload
+from .regrade import RegradeError, start_regrade
+from .search import search_exams, search_questions
+from .stats import exam_stats_payload, load_score_histograms, score_distribution_payload
+from .services import MockGradingService, SubmissionService, SubmissionValidationError
+from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiResponse
 
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -17,84 +41,439 @@ class RegisterView(generics.CreateAPIView):
     def post(self, request, *args, **kwargs):
         return super().post(request, *args, **kwargs)
 
-class ExamViewSet(viewsets.ReadOnlyModelViewSet):
-    # Prefetch through the junction table to get questions + options
-    queryset = Exam.objects.all() # Optimization handled in Serializer get_questions via specific query
+def exam_question_prefetches():
+    """Ordered exam questions (+ question) and their options, as read by ExamSerializer."""
+    exam_questions = (
+        # The search vector (core/search.py) is never rendered; don't ship it with every question
+        ExamQuestion.objects.select_related('question').defer('question__search_vector').order_by('order', 'id')
+    )
+    return (
+        Prefetch('exam_questions', queryset=exam_questions),
+        'exam_questions__question__options',
+    )
+
+class ReplicaReadMixin:
+    """
+    Serve safe requests from the read replica (core/routers.py), except for
+    users pinned to the primary after a recent write of their own.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with read_from(None):
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)  # authenticates (on the primary)
+        if request.method in permissions.SAFE_METHODS and not is_pinned_to_primary(request.user.id):
+            use_replica()
+
+class ExamViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
+    # Rendered JSON is cached per exam content version (core/payloads.py);
+    # the queryset is only hit to render cache misses.
+    queryset = Exam.objects.defer('search_vector')
     serializer_class = ExamSerializer
     permission_classes = [permissions.IsAuthenticated]
-    
-    @extend_schema(summary="List available exams")
+    pagination_class = ExamPagination
+
+    def is_summary(self):
+        return self.action == 'list' and self.request.query_params.get('view') == 'summary'
+
+    def get_queryset(self):
+        # Cache misses render from the primary: a lagging replica could otherwise store
+        # old content under a freshly bumped exam version.
+        queryset = super().get_queryset().using(DEFAULT_DB_ALIAS)
+        if self.is_summary():
+            return queryset
+        # Exams, ordered exam questions (+ question) and options in three queries total,
+        # however many exams are rendered. ExamSerializer reads from this prefetch cache.
+        return queryset.prefetch_related(*exam_question_prefetches())
+
+    def get_serializer_class(self):
+        if self.is_summary():
+            return ExamSummarySerializer
+        return super().get_serializer_class()
+
+    @extend_schema(
+        summary="List available exams",
+        parameters=[OpenApiParameter(
+            'view', str, enum=['summary'],
+            description="`summary` leaves out the question tree (catalogue pages).",
+        )],
+    )
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
-        
+        kind = 'summary' if self.is_summary() else 'full'
+        # Keyset-paginate over the narrow (created_at, id) index, then fill the page from the cache.
+        page = self.paginate_queryset(self.filter_queryset(Exam.objects.only('id', 'created_at')))
+        exam_ids = [exam.id for exam in page]
+        next_link, previous_link = self.paginator.get_next_link(), self.paginator.get_previous_link()
+
+        versions = get_exam_versions(exam_ids)
+        etag = exam_list_etag(versions, kind, links=(next_link, previous_link))
+        if _etag_matches(request, etag):
+            return _not_modified(etag)
+
+        payloads, _ = get_exam_payloads(exam_ids, self.get_queryset(), self.get_serializer_class(), versions, kind)
+        results = join_payloads(payloads[exam_id] for exam_id in exam_ids if exam_id in payloads)
+        body = b'{"next":%s,"previous":%s,"results":%s}' % (
+            json.dumps(next_link).encode(), json.dumps(previous_link).encode(), results
+        )
+        return _cached_json_response(body, etag)
+
     @extend_schema(summary="Retrieve exam details")
     def retrieve(self, request, *args, **kwargs):
-        return super().retrieve(request, *args, **kwargs)
+        try:
+            exam_id = int(kwargs[self.lookup_field])
+        except (TypeError, ValueError):
+            raise Http404
+        version = peek_exam_version(exam_id)
+        if version is None:
+            # Only existing exams get a version: an unknown id is a 404 (even for If-None-Match: *)
+            # and leaves nothing behind in the cache
+            if not Exam.objects.filter(id=exam_id).exists():
+                raise Http404
+            version = get_exam_version(exam_id)
+        etag = exam_etag(exam_id, version)
+        if _etag_matches(request, etag):
+            return _not_modified(etag)
+
+        payloads, _ = get_exam_payloads([exam_id], self.get_queryset(), self.get_serializer_class(), {exam_id: version})
+        if exam_id not in payloads:
+            raise Http404
+        return _cached_json_response(payloads[exam_id], etag)
+
+    @extend_schema(
+        summary="Export exam results (staff)",
+        description="Streams every submission (or every answer) of the exam as CSV or NDJSON, optionally gzipped.",
+        parameters=[
+            OpenApiParameter('output', str, enum=EXPORT_FORMATS, description="Default `csv`."),
+            OpenApiParameter('level', str, enum=EXPORT_LEVELS, description="Default `submissions`."),
+            OpenApiParameter('compress', str, enum=['gzip']),
+        ],
+        responses={200: OpenApiResponse(description="CSV / NDJSON file stream")},
+    )
+    @action(detail=True, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def export(self, request, pk=None):
+        exam = get_object_or_404(Exam.objects.only('id'), pk=pk)
+        output = request.query_params.get('output', 'csv')
+        level = request.query_params.get('level', 'submissions')
+        compress = request.query_params.get('compress') == 'gzip'
+        if output not in EXPORT_FORMATS or level not in EXPORT_LEVELS:
+            return Response(
+                {"error": f"output must be one of {EXPORT_FORMATS}, level one of {EXPORT_LEVELS}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        content_type = 'application/gzip' if compress else ('text/csv' if output == 'csv' else 'application/x-ndjson')
+        response = StreamingHttpResponse(export_results(exam.id, output, level, compress), content_type=content_type)
+        filename = export_filename(exam.id, output, level, compress)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    @extend_schema(
+        summary="Exam statistics (staff)",
+        description=(
+            "Graded count, mean / standard deviation, pass rate and per-question difficulty, read from the "
+            "incrementally maintained ExamStats / QuestionStats rows (no scan of submissions)."
+        ),
+        responses={200: OpenApiResponse(description="Exam and per-question statistics")},
+    )
+    @action(detail=True, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def stats(self, request, pk=None):
+        exam = get_object_or_404(Exam.objects.only('id'), pk=pk)
+        return Response(exam_stats_payload(exam.id))
+
+    @extend_schema(
+        summary="Score distribution and percentile rank",
+        description=(
+            "Graded submissions per score bucket (`bucket_width` points wide, from 0) and the percentile rank of "
+            "the caller's own graded score, read from the incrementally maintained histogram (no scan of "
+            "submissions). Staff may pass `score` to rank any score."
+        ),
+        parameters=[OpenApiParameter('score', float, description="Staff only: score to rank (0-100).")],
+        responses={200: OpenApiResponse(description="Histogram, score and percentile")},
+    )
+    @action(detail=True, methods=['get'])
+    def distribution(self, request, pk=None):
+        exam = get_object_or_404(Exam.objects.only('id'), pk=pk)
+        if request.user.is_staff and 'score' in request.query_params:
+            try:
+                score = float(request.query_params['score'])
+            except ValueError:
+                score = math.nan
+            # float() also accepts 'nan' and 'inf', which have no bucket
+            if not (math.isfinite(score) and 0 <= score <= 100):
+                return Response({"error": "score must be a number from 0 to 100"}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            score = (
+                Submission.objects.filter(student_id=request.user.id, exam_id=exam.id, status='GRADED')
+                .values_list('score', flat=True).first()
+            )
+        return Response(score_distribution_payload(exam.id, score))
+
+    @extend_schema(
+        summary="Item analysis (staff)",
+        description=(
+            "Per-question difficulty, point-biserial discrimination, item-rest correlation and MCQ distractor "
+            "frequencies, plus Cronbach's alpha, computed over all graded submissions."
+        ),
+        responses={200: OpenApiResponse(description="Item statistics")},
+    )
+    @action(detail=True, methods=['get'], url_path='item-analysis', permission_classes=[permissions.IsAdminUser])
+    def item_analysis(self, request, pk=None):
+        exam = get_object_or_404(Exam.objects.only('id'), pk=pk)
+        return Response(item_analysis_payload(exam.id))
+
+    @extend_schema(
+        summary="Re-grade exam submissions (staff)",
+        description=(
+            "POST queues a re-grade of every graded submission against the current answer key, limited to "
+            "`question_ids` when given; `manage.py grade_worker` (or `manage.py regrade_exam --pending`) runs it. "
+            "GET lists the exam's recent runs with their progress."
+        ),
+        request=RegradeRequestSerializer,
+        responses={200: RegradeRunSerializer(many=True), 202: RegradeRunSerializer},
+    )
+    @action(detail=True, methods=['get', 'post'], permission_classes=[permissions.IsAdminUser])
+    def regrade(self, request, pk=None):
+        exam = get_object_or_404(Exam.objects.only('id'), pk=pk)
+        if request.method == 'GET':
+            runs = RegradeRun.objects.filter(exam_id=exam.id).order_by('-created_at', '-id')[:20]
+            return Response(RegradeRunSerializer(runs, many=True).data)
+
+        serializer = RegradeRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            run = start_regrade(exam.id, serializer.validated_data['question_ids'], requested_by_id=request.user.id)
+        except RegradeError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(RegradeRunSerializer(run).data, status=status.HTTP_202_ACCEPTED)
+
+
+def _etag_matches(request, etag):
+    if_none_match = request.headers.get('If-None-Match', '')
+    return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+
+
+def _not_modified(etag):
+    response = HttpResponseNotModified()
+    response['ETag'] = etag
+    return response
+
+
+def _cached_json_response(body, etag):
+    response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    # Clients must revalidate; an unchanged exam costs a 304 and no DB work.
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
 class SubmitExamView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     @extend_schema(
         summary="Submit an exam",
-        description="Submit answers. For MCQ, provide `selected_option_id`. For Text, provide `text_answer`.",
+        description=(
+            "Submit answers. For MCQ, provide `selected_option_id`. For Text, provide `text_answer`. "
+            "When `GRADING_MODE=async` the submission is queued for grading and 202 is returned immediately. "
+            "An autosaved draft (`PUT /api/exams/{id}/draft/`) is submitted with it; posted answers win."
+        ),
         request=SubmissionCreateSerializer, 
-        responses={201: SubmissionSerializer}
+        responses={201: SubmissionSerializer, 202: SubmissionSerializer}
     )
     def post(self, request):
         serializer = SubmissionCreateSerializer(data=request.data)
         if serializer.is_valid():
             data = serializer.validated_data
-            exam = get_object_or_404(Exam, id=data['exam_id'])
-            
-            # Check for existing submission to enforce constraints
-            if Submission.objects.filter(student=request.user, exam=exam).exists():
-                return Response({"error": "You have already submitted this exam."}, status=status.HTTP_409_CONFLICT)
-            
-            # Create Submission (IN_PROGRESS)
-            submission = Submission.objects.create(
-                student=request.user,
-                exam=exam,
-                status='SUBMITTED' # Immediately submitted in this flow
-            )
-            
-            answers_data = data['answers']
-            new_answers = []
-            
-            # Fetch valid questions for this exam
-            valid_questions = ExamQuestion.objects.filter(exam=exam).values_list('question_id', flat=True)
-            valid_q_set = set(valid_questions)
-
-            for ans in answers_data:
-                q_id = ans['question_id']
-                if q_id not in valid_q_set:
-                     return Response({"error": f"Question {q_id} is not part of this exam"}, status=400)
-                
-                selected_opt = None
-                if ans.get('selected_option_id'):
-                    selected_opt = get_object_or_404(QuestionOption, id=ans['selected_option_id'])
-                    # Verify option belongs to question
-                    if selected_opt.question_id != q_id:
-                        return Response({"error": f"Option {selected_opt.id} does not belong to Question {q_id}"}, status=400)
-
-                new_answers.append(Answer(
-                    submission=submission,
-                    question_id=q_id,
-                    selected_option=selected_opt,
-                    text_answer=ans.get('text_answer', '')
-                ))
-            
-            Answer.objects.bulk_create(new_answers)
-            
-            # Grade
-            MockGradingService.grade_submission(submission.id)
-            submission.refresh_from_db()
-            
+            exam = get_object_or_404(Exam.objects.only('id'), id=data['exam_id'])
+
+            # Validate everything before any write (one batched option query, see SubmissionService)
+            try:
+                new_answers = SubmissionService.build_answers(exam.id, data['answers'])
+            except SubmissionValidationError as exc:
+                return Response(exc.data, status=exc.status_code)
+
+            grading_async = settings.GRADING_MODE == 'async'
+            # One transaction: submission + answers (+ queue entry) land together or not at all.
+            # Duplicates are caught by the unique (student, exam) constraint instead of a racy pre-check.
+            try:
+                submission = SubmissionService.store_submission(
+                    request.user.id, exam.id, new_answers, enqueue=grading_async
+                )
+            except IntegrityError:
+                if Submission.objects.filter(student_id=request.user.id, exam=exam).exists():
+                    return Response({"error": "You have already submitted this exam."}, status=status.HTTP_409_CONFLICT)
+                raise
+            except DraftClosed as exc:
+                # Past the deadline: `manage.py sweep_deadlines` submits the saved draft
+                return Response({"error": exc.message}, status=status.HTTP_409_CONFLICT)
+            # Read-your-writes: keep this student's history on the primary until the replica catches up
+            pin_to_primary(request.user.id)
+
+            if grading_async:
+                # Hand off to `manage.py grade_worker`; the client polls my-submissions for the score.
+                return Response(SubmissionSerializer(submission).data, status=status.HTTP_202_ACCEPTED)
+
+            # Grade (committed first, so a grading failure never loses the student's answers)
+            submission.score = MockGradingService.grade_submission(submission.id)
+            submission.status = 'GRADED'
+
             return Response(SubmissionSerializer(submission).data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class MySubmissionsView(generics.ListAPIView):
+class ExamDraftView(APIView):
+    """
+    Autosave (core/drafts.py): saves are merged in the cache and flushed to Answer rows
+    in periodic batches; `POST /api/submit/` then submits the draft.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(summary="Get the autosaved draft of an exam", responses={200: DraftSerializer})
+    def get(self, request, exam_id):
+        draft = find_draft(request.user.id, exam_id)
+        if draft is None:
+            return Response({"error": "No draft for this exam."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(_draft_payload(draft))
+
+    @extend_schema(
+        summary="Autosave answers",
+        description=(
+            "Upsert the student's current answers while the exam is in progress (same answer format as submit). "
+            "Answers replace earlier ones for the same question. Submit with `POST /api/submit/`; answers sent "
+            "there override the draft, and an empty list submits the draft as saved."
+        ),
+        request=DraftSaveSerializer,
+        responses={200: DraftSerializer},
+    )
+    def put(self, request, exam_id):
+        serializer = DraftSaveSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        if get_cached_draft(request.user.id, exam_id) is None:
+            get_object_or_404(Exam.objects.only('id'), id=exam_id)
+        try:
+            answers = SubmissionService.build_answers(exam_id, serializer.validated_data['answers'])
+            draft = save_draft(request.user.id, exam_id, answers)
+        except SubmissionValidationError as exc:
+            return Response(exc.data, status=exc.status_code)
+        except DraftClosed as exc:
+            return Response({"error": exc.message}, status=status.HTTP_409_CONFLICT)
+        return Response(_draft_payload(draft))
+
+
+def _draft_payload(draft):
+    return {
+        'submission_id': draft['submission'],
+        'answers': [
+            {'question_id': question_id, 'selected_option_id': option_id, 'text_answer': text}
+            for question_id, (option_id, text) in sorted(draft['answers'].items())
+        ],
+    }
+
+class BulkSubmitView(APIView):
+    """Bulk upload for proctored centres: many students' submissions in one streamed body."""
+    permission_classes = [permissions.IsAdminUser]
+    content_types = ('application/json', 'application/x-ndjson', 'application/jsonl')
+
+    @extend_schema(
+        summary="Bulk submit exams (staff)",
+        description=(
+            "Body: a JSON array of submissions or NDJSON (`application/x-ndjson`, one per line), each with "
+            "`student_id`, `exam_id`, `answers` and optionally `submitted_at`. Items are validated, inserted and "
+            "graded in chunks. The response streams one NDJSON line per item "
+            "(`created` / `duplicate` / `invalid` / `error`) followed by a `summary` line."
+        ),
+        request=BulkSubmissionItemSerializer(many=True),
+        responses={200: OpenApiResponse(description="NDJSON stream of per-item results")},
+    )
+    def post(self, request):
+        if request.content_type.split(';')[0].strip() not in self.content_types:
+            raise UnsupportedMediaType(request.content_type)
+
+        processor = BulkSubmissionProcessor()
+        # Read the body directly so it is never buffered whole (request.data would parse it all at once)
+        items = iter_json_items(request.stream or io.BytesIO())
+
+        def lines():
+            for result in processor.process(items):
+                yield json.dumps(result, default=str) + '\n'
+            yield json.dumps({'summary': processor.totals}) + '\n'
+
+        return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+
+class MySubmissionsView(ReplicaReadMixin, generics.ListAPIView):
     serializer_class = SubmissionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = SubmissionPagination
+
+    def get_queryset(self):
+        return Submission.objects.filter(student_id=self.request.user.id)
+
+    @extend_schema(
+        parameters=[OpenApiParameter(
+            'include', str, enum=['percentile'],
+            description="`percentile` adds each graded submission's percentile rank within its exam.",
+        )],
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def get_serializer(self, *args, **kwargs):
+        if args and self.request.query_params.get('include') == 'percentile':
+            # One histogram read for every exam on the page
+            histograms = load_score_histograms({submission.exam_id for submission in args[0]})
+            kwargs['context'] = {**self.get_serializer_context(), 'score_histograms': histograms}
+        return super().get_serializer(*args, **kwargs)
+
+class ExamSearchView(ReplicaReadMixin, generics.ListAPIView):
+    """Full-text exam search with metadata filters (core/search.py)."""
+    serializer_class = ExamSearchResultSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = SearchPagination
+
+    @extend_schema(
+        summary="Search exams",
+        description=(
+            "Ranked full-text search over title, course, tags and description (`q`, web-search syntax: "
+            "quotes, `or`, `-exclude`), filtered by metadata tags (repeat `tag` to require several), "
+            "difficulty and course. Served by GIN indexes on PostgreSQL."
+        ),
+        parameters=[
+            OpenApiParameter('q', str),
+            OpenApiParameter('tag', str, many=True),
+            OpenApiParameter('difficulty', str),
+            OpenApiParameter('course', str),
+        ],
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        params = self.request.query_params
+        return search_exams(
+            params.get('q', '').strip(), tags=params.getlist('tag'),
+            difficulty=params.get('difficulty'), course=params.get('course'),
+        )
+
+class QuestionSearchView(ReplicaReadMixin, generics.ListAPIView):
+    """Question bank search for exam authors (core/search.py)."""
+    serializer_class = QuestionSearchResultSerializer
+    permission_classes = [permissions.IsAdminUser]
+    pagination_class = SearchPagination
+
+    @extend_schema(
+        summary="Search the question bank (staff)",
+        description=(
+            "Ranked full-text search over question text and expected answers (`q`, web-search syntax), "
+            "optionally limited to one question `type`. Served by a GIN index on PostgreSQL."
+        ),
+        parameters=[
+            OpenApiParameter('q', str),
+            OpenApiParameter('type', str, enum=[code for code, _ in Question.QUESTION_TYPES]),
+        ],
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
 
     def get_queryset(self):
-        return Submission.objects.filter(student=self.request.user)
+        params = self.request.query_params
+        return search_questions(params.get('q', '').strip(), question_type=params.get('type'))